@@ -0,0 +1,162 @@
+import os
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Union
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Total number of images downloading at once
+MAX_WORKERS = 16
+
+# Max number of images downloading from the same host at once
+MAX_PER_HOST = 8
+
+# Retries (with exponential backoff) for connection errors and these status codes
+RETRIES = 3
+RETRY_BACKOFF = 0.5
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+
+TIMEOUT = 30
+CHUNK_SIZE = 1024 * 1024
+
+
+class ArtworkDownloader:
+    # Shared download engine for the artwork of all the game DBs.
+    #
+    # A single pooled requests.Session is reused for every image (so connections get
+    # kept alive instead of paying a new TCP/TLS handshake per image) and the images
+    # are downloaded from a thread pool, with a limit on how many can hit the same
+    # host at once. Files are streamed to a temporary ".part" file (unique per
+    # download) and only renamed into place once complete, so an interrupted download
+    # never looks like a finished image. A path already being downloaded shares the
+    # download in flight instead of starting another one.
+    def __init__(
+        self,
+        max_workers: int = MAX_WORKERS,
+        max_per_host: int = MAX_PER_HOST,
+    ) -> None:
+        retry = Retry(
+            total=RETRIES,
+            backoff_factor=RETRY_BACKOFF,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=["GET"],
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=max_workers,
+            pool_maxsize=max_workers,
+            max_retries=retry,
+        )
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="artwork"
+        )
+        self.max_per_host = max_per_host
+        self._host_semaphores = {}
+        self._host_semaphores_lock = threading.Lock()
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
+        return
+
+    def _get_host_semaphore(self, url: str) -> threading.Semaphore:
+        host = urlparse(url).netloc
+        with self._host_semaphores_lock:
+            if host not in self._host_semaphores:
+                self._host_semaphores[host] = threading.Semaphore(self.max_per_host)
+            return self._host_semaphores[host]
+
+    def download(self, url: str, path: str) -> bool:
+        # Returns True if the image is on disk (downloaded now or before)
+        if os.path.isfile(path):
+            return True
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        part_path = None
+        try:
+            with self._get_host_semaphore(url):
+                with self.session.get(url, stream=True, timeout=TIMEOUT) as response:
+                    if response.status_code != 200:
+                        return False
+                    part_fd, part_path = tempfile.mkstemp(
+                        suffix=".part",
+                        prefix=f"{os.path.basename(path)}.",
+                        dir=os.path.dirname(path),
+                    )
+                    with os.fdopen(part_fd, "wb") as output:
+                        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                            output.write(chunk)
+            os.replace(part_path, path)
+            part_path = None
+        except requests.RequestException as error:
+            print(f"\tFailed to download {url}: {error}")
+            return False
+        finally:
+            if part_path is not None and os.path.isfile(part_path):
+                os.remove(part_path)
+        return True
+
+    def _submit_download(self, url: str, path: str) -> Future:
+        # Reuse the download of the same path if it's still going
+        with self._in_flight_lock:
+            future = self._in_flight.get(path)
+            if future is not None:
+                return future
+            future = self.executor.submit(self.download, url, path)
+            self._in_flight[path] = future
+
+        # Outside the lock, a download that's already done runs this right away
+        future.add_done_callback(
+            lambda done, path=path: self._forget_download(path, done)
+        )
+        return future
+
+    def _forget_download(self, path: str, future: Future) -> None:
+        with self._in_flight_lock:
+            if self._in_flight.get(path) is future:
+                del self._in_flight[path]
+        return
+
+    def submit(self, jobs: list[tuple[str, str, str]]) -> list[Future]:
+        # Start downloading the jobs in the background
+        return [self._submit_download(url, path) for _, url, path in jobs]
+
+    def collect(
+        self,
+        filename_links: dict[str, list[str]],
+        jobs: list[tuple[str, str, str]],
+        futures: list[Future],
+    ) -> dict[str, list[str]]:
+        # Wait for submitted jobs. The paths are added in job order, so the lists come
+        # out the same as when the images were downloaded one after another.
+        for (key, _, path), future in zip(jobs, futures):
+            if future.result():
+                filename_links[key].append(path)
+        return filename_links
+
+    def download_links(
+        self,
+        filename_links: dict[str, list[str]],
+        jobs: list[tuple[str, str, str]],
+    ) -> dict[str, list[str]]:
+        # jobs: (filename_links key, url, path)
+        return self.collect(filename_links, jobs, self.submit(jobs))
+
+
+_artwork_downloader: Union[ArtworkDownloader, None] = None
+_artwork_downloader_lock = threading.Lock()
+
+
+def get_artwork_downloader() -> ArtworkDownloader:
+    # One downloader (session + pool) shared by all the game DBs in the process
+    global _artwork_downloader
+    with _artwork_downloader_lock:
+        if _artwork_downloader is None:
+            _artwork_downloader = ArtworkDownloader()
+        return _artwork_downloader
@@ -2,14 +2,16 @@ import datetime
 import json
 import os
 import sqlite3
+import threading
 import time
-from typing import List
+from typing import List, Union
 
 import pandas
 import requests
-from fuzzywuzzy import fuzz
 from igdb.wrapper import IGDBWrapper
 
+from game_db.title_matcher import TitleMatcher
+
 CLIENT_ID = os.getenv("IGDB_CLIENT_ID")
 API_KEY = os.getenv("IGDB_API_KEY")
 
@@ -81,28 +83,23 @@ PLATFORM_TO_WHERE_CAUSE = {
 }
 
 
-class InternetGameDb:
-    def __init__(self, platform: str) -> None:
-        self.platform = platform
-
-        if platform not in PLATFORM_TO_WHERE_CAUSE.keys():
-            raise ValueError(f"Invalid platform: {platform}")
-
+class IgdbClient:
+    # The platform independent part of IGDB: the API token, the rate limiting and the
+    # local cache of every request. One of these can be shared by the InternetGameDb
+    # of every platform.
+    def __init__(self) -> None:
         self.expired_time = datetime.datetime.now()
         self.igdb = self.get_wrapper()
         self.last_request = datetime.datetime.now()
 
+        # Requests can come from the lookup threads (see RomProcessor), one at a time
         db_file = f"{os.path.dirname(__file__)}/../database/igdb.db"
-        self.engine = sqlite3.connect(db_file)
+        self.engine = sqlite3.connect(db_file, check_same_thread=False)
         self._cursor = self.engine.cursor()
+        self._lock = threading.Lock()
 
         # Create local caching tables
         self._create_tables()
-
-        # Need the platform id to do lookups later
-        self.platform_id = self.get_platform_id_by_name(platform)
-        if len(self.platform_id) == 0:
-            raise NotImplementedError(f"Platform {platform} not found in IGDB")
         return
 
     def __del__(self):
@@ -143,15 +140,12 @@ class InternetGameDb:
         self.engine.commit()
         return
 
-    def get_platform_id_by_name(self, platform_name) -> List[str]:
-        where_clause = PLATFORM_TO_WHERE_CAUSE[platform_name]
-        platforms = self.run_request(
-            endpoint="platforms", query=f"fields *; {where_clause}"
-        )
-        platform_ids = [i["id"] for i in platforms]
-        return platform_ids
-
     def run_request(self, endpoint, query):
+        # Also keeps the requests under the rate limit across threads
+        with self._lock:
+            return self._run_request(endpoint, query)
+
+    def _run_request(self, endpoint, query):
         # Remove quotes or SQL query will fail (can't seem to escape them)
         query_sql = query.replace("'", "")
 
@@ -204,6 +198,34 @@ class InternetGameDb:
 
         return IGDBWrapper(CLIENT_ID, self.token)
 
+
+class InternetGameDb:
+    def __init__(self, platform: str, client: Union[IgdbClient, None] = None) -> None:
+        self.platform = platform
+
+        if platform not in PLATFORM_TO_WHERE_CAUSE.keys():
+            raise ValueError(f"Invalid platform: {platform}")
+
+        # Pass a client to share its token and request cache with other platforms
+        self.client = IgdbClient() if client is None else client
+
+        # Need the platform id to do lookups later
+        self.platform_id = self.get_platform_id_by_name(platform)
+        if len(self.platform_id) == 0:
+            raise NotImplementedError(f"Platform {platform} not found in IGDB")
+        return
+
+    def get_platform_id_by_name(self, platform_name) -> List[str]:
+        where_clause = PLATFORM_TO_WHERE_CAUSE[platform_name]
+        platforms = self.run_request(
+            endpoint="platforms", query=f"fields *; {where_clause}"
+        )
+        platform_ids = [i["id"] for i in platforms]
+        return platform_ids
+
+    def run_request(self, endpoint, query):
+        return self.client.run_request(endpoint, query)
+
     def get_game_from_game_name(self, game_name: str):
         # game_name = game_name.replace("\'", "")
         platform_str = ",".join([str(i) for i in self.platform_id])
@@ -216,14 +238,8 @@ class InternetGameDb:
             query=f'search "{game_name}"; fields *; where platforms = ({platform_str});',
         )
 
-        best_fuzz_score = 0
-        best_match = None
-
-        for game in games:
-            fuzz_score = fuzz.ratio(game_name, game["name"])
-            if fuzz_score > 90 and fuzz_score > best_fuzz_score:
-                best_fuzz_score = fuzz_score
-                best_match = game
+        title_matcher = TitleMatcher([game["name"] for game in games], threshold=90)
+        best_match = title_matcher.best_match_value(game_name, games)
 
         # if we found a "best match" Process it
         if best_match is not None:
@@ -1,15 +1,25 @@
+import functools
+import hashlib
 import os
-import re
 import sqlite3
+import time
 import zipfile
 from pathlib import Path
 from typing import Any, Union
+from xml.etree import ElementTree
 
 import numpy
-import pandas
 import requests
-import xmltodict
-from fuzzywuzzy import fuzz
+
+from game_db.artwork_downloader import get_artwork_downloader
+from game_db.title_index import TitleIndex
+from game_db.title_matcher import TitleMatcher
+from game_db.title_normalizer import TITLE_KEY_VERSION, normalize_title
+from game_db.title_search import (
+    create_title_search,
+    get_title_search_candidates,
+    rebuild_title_search,
+)
 
 "gamesdb.launchbox-app.com/games/dbid/<id-here>"
 
@@ -64,58 +74,630 @@ PLATFORM_LOOKUP = {
 }
 
 
+# Memory map (up to) this much of the DB when it's opened read only
+READ_ONLY_MMAP_SIZE = 1024 * 1024 * 1024
+
+# Secondary indexes, a full load only builds them once all the rows are in
+DEFERRED_INDEXES = {
+    "game_name_idx": "game (name)",
+    "game_platform_idx": "game (platform_id)",
+    "game_platform_title_key_idx": "game (platform_id, title_key)",
+    "game_alternative_title_key_idx": "game_alternative (title_key)",
+    "game_image_game_id_type_region_idx": "game_image (game_id, type, region)",
+}
+
+# Indexes that have been replaced by one of the above
+SUPERSEDED_INDEXES = ["game_image_game_id_dx", "game_alternative_game_id_idx"]
+
+PLATFORM_COLUMNS = [
+    "platform_id",
+    "name",
+    "emulated",
+    "release_data",
+    "developer",
+    "manufacturer",
+    "cpu",
+    "memory",
+    "graphics",
+    "sound",
+    "display",
+    "media",
+    "max_controllers",
+    "notes",
+    "category",
+    "use_mame_files",
+]
+PLATFORM_ALTERNATIVE_COLUMNS = ["platform_alternative_id", "platform_id", "name"]
+GAME_COLUMNS = [
+    "game_id",
+    "name",
+    "release_year",
+    "overview",
+    "max_players",
+    "release_type",
+    "cooperative",
+    "video_url",
+    "community_rating",
+    "platform_id",
+    "esrb",
+    "community_rating_count",
+    "genres",
+    "developer",
+    "publisher",
+    "title_key",
+]
+GAME_ALTERNATIVE_COLUMNS = ["game_id", "name", "title_key"]
+GAME_IMAGE_COLUMNS = ["game_id", "type", "region", "file_name", "crc32"]
+MAME_FILE_COLUMNS = [
+    "filename",
+    "name",
+    "status",
+    "developer",
+    "publisher",
+    "year",
+    "is_mechanical",
+    "is_bootleg",
+    "is_prototype",
+    "is_hack",
+    "is_mature",
+    "is_quiz",
+    "is_fruit",
+    "is_casino",
+    "is_rhythm",
+    "is_table_top",
+    "is_play_choice",
+    "is_mahjong",
+    "is_non_arcade",
+    "genre",
+    "play_mode",
+    "language",
+    "source",
+]
+
+
+# Order of precedence for the artwork regions, by the region in the ROM's filename.
+# The first region (in this order) that's anywhere between the parentheses wins, we
+# try to have the countries alphabetically, but since there's a pattern of
+# (Korea, USA) I'd rather want the USA images
+REGION_PRECEDENCE = [
+    (
+        "USA",
+        [
+            "USA",
+            "NORTH AMERICA",
+            "WORLD",
+            "EUROPE",
+            "ASIA",
+            "JAPAN",
+            "NONE",
+        ],
+    ),
+    (
+        "AUSTRALIA",
+        [
+            "AUSTRALIA",
+            "OCEANIA" "WORLD",
+            "ASIA",
+            "EUROPE",
+            "NORTH AMERICA",
+            "USA",
+            "JAPAN",
+            "NONE",
+        ],
+    ),
+    (
+        "BRAZIL",
+        [
+            "BRAZIL",
+            "WORLD",
+            "EUROPE",
+            "NORTH AMERICA",
+            "USA",
+            "ASIA",
+            "JAPAN",
+            "NONE",
+        ],
+    ),
+    (
+        "CANADA",
+        [
+            "CANADA",
+            "NORTH AMERICA",
+            "WORLD",
+            "EUROPE",
+            "ASIA",
+            "JAPAN",
+            "NONE",
+        ],
+    ),
+    (
+        "FRANCE",
+        [
+            "FRANCE",
+            "EUROPE",
+            "WORLD",
+            "NORTH AMERICA",
+            "USA",
+            "ASIA",
+            "JAPAN",
+            "NONE",
+        ],
+    ),
+    (
+        "GERMANY",
+        [
+            "GERMANY",
+            "EUROPE",
+            "WORLD",
+            "NORTH AMERICA",
+            "USA",
+            "ASIA",
+            "JAPAN",
+            "NONE",
+        ],
+    ),
+    (
+        "GREECE",
+        [
+            "GREECE",
+            "EUROPE",
+            "WORLD",
+            "NORTH AMERICA",
+            "USA",
+            "ASIA",
+            "JAPAN",
+            "NONE",
+        ],
+    ),
+    (
+        "ITALY",
+        [
+            "ITALY",
+            "EUROPE",
+            "WORLD",
+            "NORTH AMERICA",
+            "USA",
+            "ASIA",
+            "JAPAN",
+            "NONE",
+        ],
+    ),
+    (
+        "INDIA",
+        [
+            "INDIA",
+            "ASIA",
+            "WORLD",
+            "NORTH AMERICA",
+            "EUROPE",
+            "NONE",
+        ],
+    ),
+    (
+        "JAPAN",
+        [
+            "JAPAN",
+            "ASIA",
+            "KOREA",
+            "WORLD",
+            "NORTH AMERICA",
+            "EUROPE",
+            "NONE",
+        ],
+    ),
+    (
+        "KOREA",
+        [
+            "KOREA",
+            "ASIA",
+            "WORLD",
+            "JAPAN",
+            "NORTH AMERICA",
+            "EUROPE",
+            "NONE",
+        ],
+    ),
+    (
+        "NETHERLANDS",
+        [
+            "NETHERLANDS",
+            "EUROPE",
+            "WORLD",
+            "NORTH AMERICA",
+            "USA",
+            "ASIA",
+            "JAPAN",
+            "NONE",
+        ],
+    ),
+    (
+        "POLAND",
+        [
+            "POLAND",
+            "EUROPE",
+            "WORLD",
+            "NORTH AMERICA",
+            "USA",
+            "ASIA",
+            "JAPAN",
+            "NONE",
+        ],
+    ),
+    (
+        "PORTUGAL",
+        [
+            "PORTUGAL",
+            "EUROPE",
+            "WORLD",
+            "NORTH AMERICA",
+            "USA",
+            "ASIA",
+            "JAPAN",
+            "NONE",
+        ],
+    ),
+    (
+        "RUSSIA",
+        [
+            "RUSSIA",
+            "EUROPE",
+            "WORLD",
+            "USA",
+            "NORTH AMERICA",
+            "ASIA",
+            "JAPAN",
+            "NONE",
+        ],
+    ),
+    (
+        "SPAIN",
+        [
+            "SPAIN",
+            "EUROPE",
+            "WORLD",
+            "USA",
+            "NORTH AMERICA",
+            "ASIA",
+            "JAPAN",
+            "NONE",
+        ],
+    ),
+    (
+        "UK",
+        [
+            "UNITED KINGDOM",
+            "UK",
+            "EUROPE",
+            "WORLD",
+            "USA",
+            "NORTH AMERICA",
+            "ASIA",
+            "JAPAN",
+            "NONE",
+        ],
+    ),
+    (
+        "UNITED ARAB EMIRATES",
+        [
+            "UNITED ARAB EMIRATES",
+            "EUROPE",
+            "WORLD",
+            "USA",
+            "NORTH AMERICA",
+            "ASIA",
+            "JAPAN",
+            "NONE",
+        ],
+    ),
+    (
+        "ASIA",
+        [
+            "ASIA",
+            "WORLD",
+            "EUROPE",
+            "NORTH AMERICA",
+            "USA",
+            "JAPAN",
+            "NONE",
+        ],
+    ),
+    (
+        "EUROPE",
+        [
+            "EUROPE",
+            "WORLD",
+            "NORTH AMERICA",
+            "USA",
+            "ASIA",
+            "JAPAN",
+            "NONE",
+        ],
+    ),
+    (
+        "NORTH AMERICA",
+        [
+            "NORTH AMERICA",
+            "USA",
+            "WORLD",
+            "EUROPE",
+            "ASIA",
+            "JAPAN",
+            "NONE",
+        ],
+    ),
+    (
+        "SCANDINAVIA",
+        [
+            "SCANDINAVIA",
+            "EUROPE",
+            "WORLD",
+            "NORTH AMERICA",
+            "USA",
+            "ASIA",
+            "JAPAN",
+            "NONE",
+        ],
+    ),
+    (
+        "WORLD",
+        [
+            "WORLD",
+            "EUROPE",
+            "NORTH AMERICA",
+            "USA",
+            "ASIA",
+            "JAPAN",
+            "NONE",
+        ],
+    ),
+]
+
+
+@functools.lru_cache(maxsize=4096)
+def _get_order_of_regions_from_tags(region_tags: str) -> list[str]:
+    for region, order_of_regions in REGION_PRECEDENCE:
+        if region in region_tags:
+            return order_of_regions
+    raise Exception("no region found")
+
+
+def get_order_of_regions(filename: str) -> list[str]:
+    # Everything between the first "(" and the last ")" of the filename, the same
+    # text re.search(r"\(.*REGION.*\)", filename) would have looked at
+    filename = filename.upper()
+    start = filename.find("(") + 1
+    end = filename.rfind(")")
+    region_tags = ""
+    if 0 < start <= end:
+        region_tags = filename[start:end]
+    return list(_get_order_of_regions_from_tags(region_tags))
+
+
+def report_throughput(label: str, rows: Union[int, None], start_time: float) -> None:
+    elapsed = max(time.perf_counter() - start_time, 1e-9)
+    if rows is None:
+        print(f"Loading Launchbox: {label} - {elapsed:.1f}s")
+    else:
+        print(
+            f"Loading Launchbox: {label} - {rows:,} rows in {elapsed:.1f}s "
+            f"({rows / elapsed:,.0f} rows/sec)"
+        )
+    return
+
+
+class BulkLoader:
+    # Buffers the rows for a single table and sends them to SQLite as large
+    # parameterized executemany batches. Committing is left to the caller so a
+    # full load can run as one transaction.
+    def __init__(
+        self,
+        cursor: sqlite3.Cursor,
+        table: str,
+        columns: list[str],
+        batch_size: int = 50_000,
+    ) -> None:
+        self._cursor = cursor
+        self.table = table
+        self.batch_size = batch_size
+        self.rows = 0
+        self._batch = []
+        self._sql = (
+            f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join(['?'] * len(columns))})"
+        )
+        self._start_time = time.perf_counter()
+        return
+
+    def add(self, row: tuple) -> None:
+        self._batch.append(row)
+        if len(self._batch) >= self.batch_size:
+            self.flush()
+        return
+
+    def flush(self) -> None:
+        if len(self._batch) > 0:
+            self._cursor.executemany(self._sql, self._batch)
+            self.rows += len(self._batch)
+            self._batch = []
+        return
+
+    def close(self) -> None:
+        self.flush()
+        report_throughput(self.table, self.rows, self._start_time)
+        return
+
+
+class TableDiff:
+    # Same interface as BulkLoader, but compares every streamed row against what's
+    # already in the table (by key) and only writes the rows that were added or
+    # changed. Whatever wasn't seen in the new dump gets deleted on close.
+    def __init__(
+        self,
+        engine: sqlite3.Connection,
+        table: str,
+        columns: list[str],
+        key_columns: list[str],
+    ) -> None:
+        self._cursor = engine.cursor()
+        self.table = table
+        self.key_columns = key_columns
+        self._key_idxs = [columns.index(key_column) for key_column in key_columns]
+        self._loader = BulkLoader(self._cursor, table, columns)
+        self.inserted = 0
+        self.updated = 0
+        self.deleted = 0
+
+        # Only keep a hash of each existing row around, not the row itself
+        self._cursor.execute(f"SELECT {', '.join(columns)} FROM {table}")
+        self._existing = {self._get_key(row): hash(row) for row in self._cursor}
+        self._start_time = time.perf_counter()
+        return
+
+    def _get_key(self, row: tuple) -> tuple:
+        return tuple(row[key_idx] for key_idx in self._key_idxs)
+
+    def add(self, row: tuple) -> None:
+        existing_hash = self._existing.pop(self._get_key(row), None)
+        if existing_hash is None:
+            self.inserted += 1
+            self._loader.add(row)
+        elif existing_hash != hash(row):
+            self.updated += 1
+            self._loader.add(row)
+        return
+
+    def close(self) -> None:
+        self._loader.flush()
+        removed_keys = list(self._existing.keys())
+        key_filter = " AND ".join(
+            f"{key_column} = ?" for key_column in self.key_columns
+        )
+        self._cursor.executemany(
+            f"DELETE FROM {self.table} WHERE {key_filter}", removed_keys
+        )
+        self.deleted = len(removed_keys)
+        self._existing = {}
+        print(
+            f"Loading Launchbox: {self.table} - {self.inserted:,} inserted, "
+            f"{self.updated:,} updated, {self.deleted:,} deleted"
+        )
+        report_throughput(
+            self.table,
+            self.inserted + self.updated + self.deleted,
+            self._start_time,
+        )
+        return
+
+
 class LaunchBoxDB:
-    def __init__(self, platform: str):
+    def __init__(
+        self,
+        platform: Union[str, None],
+        refresh_metadata: bool = False,
+        read_only: bool = False,
+    ):
+        # With no platform this only makes sure the DB is downloaded and loaded, so
+        # it can be done once before opening it for many platforms.
+        #
+        # read_only opens an already loaded DB without downloading, creating or
+        # loading anything, so many processes can open it at once. Nothing may
+        # write to the DB while it's open this way.
         self.platform = platform
+        self.refresh_metadata = refresh_metadata
+        self.read_only = read_only
+
+        # Get the current script's location
+        current_dir = Path(__file__).parent
+        self.local_metadata_file_zip = current_dir / ".." / "database" / "Metadata.zip"
+        self.local_metadata_folder = current_dir / ".." / "database" / "Metadata"
+        self.local_db_file = current_dir / ".." / "database" / "launchbox.db"
 
-        # Download and process the launchbox DB zip file
-        self.process_files = self._get_and_process_files()
+        if self.read_only:
+            self._open_read_only()
+        else:
+            # Now check if we've created a SQLite database for it.
+            self.engine = sqlite3.connect(self.local_db_file)
+            self._cursor = self.engine.cursor()
 
-        # Now check if we've created a SQLite database for it.
-        self.engine = sqlite3.connect(self.local_db_file)
-        self._cursor = self.engine.cursor()
+            # Create local caching tables
+            self._create_tables()
 
-        # Create local caching tables
-        self._create_tables()
-        self._populate_tables()
+            # Download and process the launchbox DB zip file
+            self.process_files = self._get_and_process_files()
+
+            # New columns have to be filled in from the metadata we already have
+            if self.schema_upgraded and self.local_metadata_folder.exists():
+                self.process_files = True
+            self._populate_tables()
+        if self.platform is None:
+            return
 
-        # Get all the games for the current platform
         self.platform_id = self._get_platform_id(self.platform)
-        self.all_platform_games = self._get_all_games_from_platform_id(self.platform_id)
 
+        # Only needed for names too short for the title search, built the first time
+        # one gets looked up
+        self.platform_game_ids = None
+        self.title_index = None
+
+        # Loaded the first time any artwork is needed
+        self.platform_artworks = None
         return
 
     def __del__(self) -> None:
-        self.engine.commit()
-        self._cursor.close()
-        self.engine.close()
+        # The constructor may have failed before (or while) opening the DB
+        engine = getattr(self, "engine", None)
+        if engine is None:
+            return
+        if not self.read_only:
+            engine.commit()
+        cursor = getattr(self, "_cursor", None)
+        if cursor is not None:
+            cursor.close()
+        engine.close()
         return
 
-    def _get_and_process_files(self):
-        # For now, we are NOT going to process the files
-        process_files = False
+    def _open_read_only(self) -> None:
+        if not self.local_db_file.exists():
+            raise Exception(f"Launchbox DB hasn't been created: {self.local_db_file}")
 
-        # Get the current script's location
-        current_dir = Path(__file__).parent
+        # immutable skips all locking and change detection, and the file gets
+        # memory mapped instead of read through the page cache
+        db_uri = f"{self.local_db_file.resolve().as_uri()}?mode=ro&immutable=1"
+        self.engine = sqlite3.connect(db_uri, uri=True)
+        self._cursor = self.engine.cursor()
+        self._cursor.execute(f"PRAGMA mmap_size = {READ_ONLY_MMAP_SIZE}")
+        return
 
-        # See if we've already downloaded the XML file
-        http_metadata_file_zip = "http://gamesdb.launchbox-app.com/Metadata.zip"
-        local_metadata_file_zip = current_dir / ".." / "database" / "Metadata.zip"
-        self.local_metadata_folder = current_dir / ".." / "database" / "Metadata"
-        self.local_db_file = current_dir / ".." / "database" / "launchbox.db"
+    def _get_and_process_files(self):
+        # Only process the files when a new Metadata.zip gets extracted
+        process_files = False
+        self.metadata_source = None
 
         # If the file doesn't exist, download it
-        if not local_metadata_file_zip.exists():
-            # Make the HTTP request to download the file
-            response = requests.get(http_metadata_file_zip)
-
-            # Check if the request was successful (status code 200)
-            if response.status_code == 200:
-                # Save the content to the file
-                with open(local_metadata_file_zip, "wb") as file:
-                    file.write(response.content)
-            else:
+        if not self.local_metadata_file_zip.exists():
+            self.metadata_source = self._download_metadata_file_zip(etag=None)
+            if self.metadata_source is None:
                 raise Exception("Failed to download Metadata.zip")
+        elif self.refresh_metadata:
+            # Ask the server for a new Metadata.zip only if it changed since the last
+            # time, then double-check against the hash of what we've already loaded
+            recorded_source = self._get_metadata_source()
+            etag = None if recorded_source is None else recorded_source["etag"]
+            self.metadata_source = self._download_metadata_file_zip(etag=etag)
+            if self.metadata_source is None:
+                print("Launchbox: Metadata.zip not modified")
+            elif (
+                recorded_source is not None
+                and recorded_source["sha256"] == self.metadata_source["sha256"]
+            ):
+                print("Launchbox: Metadata.zip unchanged")
+                self._set_metadata_source(self.metadata_source)
+                self.engine.commit()
+                self.metadata_source = None
+            else:
+                # Overwrite the previous extraction with the new dump
+                self._extract_metadata_file_zip()
+                process_files = True
 
         # Check if the extraction folder exists, if not, create it
         if not self.local_metadata_folder.exists():
@@ -123,22 +705,98 @@ class LaunchBoxDB:
             print(f"Created folder: {self.local_metadata_folder}")
 
             # Extract the ZIP file contents if the file exists
-            if local_metadata_file_zip.exists():
-                with zipfile.ZipFile(local_metadata_file_zip, "r") as zip_ref:
-                    zip_ref.extractall(self.local_metadata_folder)
-                print(f"Extracted contents to {self.local_metadata_folder}")
+            if self.local_metadata_file_zip.exists():
+                self._extract_metadata_file_zip()
 
                 # First time extracting everything - Process the files
                 process_files = True
+                if self.metadata_source is None:
+                    self.metadata_source = self._get_local_metadata_source()
+
+        # The metadata_source row is only written once a load has completed, without
+        # it the DB may hold a partial load so it has to be done again
+        if (
+            not process_files
+            and self._get_metadata_source() is None
+            and self.local_metadata_file_zip.exists()
+        ):
+            print("Launchbox: previous load didn't complete, loading again")
+            process_files = True
+            self.metadata_source = self._get_local_metadata_source()
         return process_files
 
-    def _process_string_for_insert(self, value, allow_null=True):
-        value = None if value is None else value.replace("'", "''")
-        if allow_null:
-            value = f"'{value}'" if value is not None else "NULL"
-        else:
-            value = '""' if value is None else value
-        return value
+    def _get_local_metadata_source(self) -> dict[str, Any]:
+        # What we know about a Metadata.zip we didn't just download
+        return {
+            "etag": None,
+            "size": self.local_metadata_file_zip.stat().st_size,
+            "sha256": self._file_sha256(self.local_metadata_file_zip),
+        }
+
+    def _download_metadata_file_zip(self, etag: Union[str, None]):
+        http_metadata_file_zip = "http://gamesdb.launchbox-app.com/Metadata.zip"
+        headers = {} if etag is None else {"If-None-Match": etag}
+
+        # Stream the download to disk, hashing it as it comes in
+        with requests.get(
+            http_metadata_file_zip, headers=headers, stream=True, timeout=60
+        ) as response:
+            if response.status_code == 304:
+                return None
+            if response.status_code != 200:
+                raise Exception("Failed to download Metadata.zip")
+
+            sha256 = hashlib.sha256()
+            size = 0
+            partial_file_zip = self.local_metadata_file_zip.with_suffix(".zip.part")
+            with open(partial_file_zip, "wb") as file:
+                for chunk in response.iter_content(chunk_size=1_048_576):
+                    file.write(chunk)
+                    sha256.update(chunk)
+                    size += len(chunk)
+            os.replace(partial_file_zip, self.local_metadata_file_zip)
+
+            return {
+                "etag": response.headers.get("ETag"),
+                "size": size,
+                "sha256": sha256.hexdigest(),
+            }
+
+    def _extract_metadata_file_zip(self) -> None:
+        with zipfile.ZipFile(self.local_metadata_file_zip, "r") as zip_ref:
+            zip_ref.extractall(self.local_metadata_folder)
+        print(f"Extracted contents to {self.local_metadata_folder}")
+        return
+
+    def _file_sha256(self, file_path: Path) -> str:
+        sha256 = hashlib.sha256()
+        with open(file_path, "rb") as file:
+            for chunk in iter(lambda: file.read(1_048_576), b""):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+    def _get_metadata_source(self):
+        self._cursor.execute(
+            "SELECT etag, size, sha256 FROM metadata_source WHERE name = 'Metadata.zip'"
+        )
+        row = self._cursor.fetchone()
+        if row is None:
+            return None
+        return {"etag": row[0], "size": row[1], "sha256": row[2]}
+
+    def _set_metadata_source(self, metadata_source: dict[str, Any]) -> None:
+        self._cursor.execute(
+            """
+                INSERT OR REPLACE INTO metadata_source (name, etag, size, sha256)
+                VALUES ('Metadata.zip', ?, ?, ?)
+            """,
+            (
+                metadata_source["etag"],
+                metadata_source["size"],
+                metadata_source["sha256"],
+            ),
+        )
+        return
 
     def _process_string_bool_for_insert(self, value: Union[str, bool]) -> bool:
         result = False
@@ -150,402 +808,346 @@ class LaunchBoxDB:
             result = True
         return result
 
+    def _xml_text(self, element: ElementTree.Element) -> Union[str, None]:
+        # Mirror xmltodict: strip whitespace and treat empty text as missing
+        text = element.text
+        if text is not None:
+            text = text.strip() or None
+        return text
+
+    def _iter_xml_records(self, xml_file_path: Path, record_tags: list[str]):
+        # Walk the direct children of the <LaunchBox> root one at a time. Each
+        # record is turned into a {child_tag: text} dict (the same shape xmltodict
+        # gives us) and the parsed elements are cleared straight away, so memory
+        # stays flat no matter how big the XML file is.
+        context = ElementTree.iterparse(xml_file_path, events=("start", "end"))
+        _, root = next(context)
+        depth = 0
+        for event, element in context:
+            if event == "start":
+                depth += 1
+                continue
+            depth -= 1
+            if depth == 0:
+                if element.tag in record_tags:
+                    record = {child.tag: self._xml_text(child) for child in element}
+                    yield element.tag, record
+                root.clear()
+
     def _process_platforms_file(self):
         # Read the platforms xml file
         platforms_file_path = self.local_metadata_folder / "Platforms.xml"
 
-        # Open and read the XML file
+        # Stream the XML file
         print("Loading Launchbox: Platforms.xml")
-        with open(platforms_file_path, "r") as xml_file:
-            platforms_xml_content = xml_file.read()
-
-        # Convert the XML content to a dictionary
-        platform_root = xmltodict.parse(platforms_xml_content).get("LaunchBox")
-        platforms = platform_root.get("Platform")
-        platforms_alternative = platform_root.get("PlatformAlternateName")
+        platform_loader = BulkLoader(self._cursor, "platform", PLATFORM_COLUMNS)
+        platform_alternative_loader = BulkLoader(
+            self._cursor, "platform_alternative", PLATFORM_ALTERNATIVE_COLUMNS
+        )
 
         # Populate the DB with the platform data
         self.platform_lookup = {}
-        for idx, platform in enumerate(platforms):
-            # Process the fields
-            name = self._process_string_for_insert(platform.get("Name"))
-            emulated = self._process_string_bool_for_insert(
-                platform.get("Emulated", "FALSE")
-            )
-            release_date = self._process_string_for_insert(platform.get("ReleaseDate"))
-            developer = self._process_string_for_insert(platform.get("Developer"))
-            manufacturer = self._process_string_for_insert(platform.get("Manufacturer"))
-            cpu = self._process_string_for_insert(platform.get("Cpu"))
-            memory = self._process_string_for_insert(platform.get("Memory"))
-            graphics = self._process_string_for_insert(platform.get("Graphics"))
-            sound = self._process_string_for_insert(platform.get("Sound"))
-            display = self._process_string_for_insert(platform.get("Display"))
-            media = self._process_string_for_insert(platform.get("Media"))
-            max_controllers = self._process_string_for_insert(
-                platform.get("MaxControllers")
-            )
-            notes = self._process_string_for_insert(platform.get("Notes"))
-            category = self._process_string_for_insert(platform.get("Category"))
-            use_mame_files = self._process_string_bool_for_insert(
-                platform.get("UseMameFiles", False)
-            )
-
-            # Create the lookup entry
-            self.platform_lookup[name] = idx
-
-            # Insert into the DB
-            self._cursor.execute(
-                f"""
-                    INSERT OR REPLACE INTO platform (
-                        platform_id,
-                        name,
-                        emulated,
-                        release_data,
-                        developer,
-                        manufacturer,
-                        cpu,
-                        memory,
-                        graphics,
-                        sound,
-                        display,
-                        media,
-                        max_controllers,
-                        notes,
-                        category,
-                        use_mame_files
-                    )
-                    VALUES(
-                        {idx},
-                        {name},
-                        {emulated},
-                        {release_date},
-                        {developer},
-                        {manufacturer},
-                        {cpu},
-                        {memory},
-                        {graphics},
-                        {sound},
-                        {display},
-                        {media},
-                        {max_controllers},
-                        {notes},
-                        {category},
-                        {use_mame_files}
-                    )
-                """
-            )
-        self.engine.commit()
+        platforms_alternative = []
+        for tag, record in self._iter_xml_records(
+            platforms_file_path, ["Platform", "PlatformAlternateName"]
+        ):
+            if tag == "Platform":
+                platform_id = len(self.platform_lookup)
+                self.platform_lookup[record.get("Name")] = platform_id
+                platform_loader.add(self._platform_row(platform_id, record))
+            else:
+                # Alternative names need every platform to be loaded first
+                platforms_alternative.append(record)
+        platform_loader.close()
 
         # Platform alternative
         for idx, platform_alternative in enumerate(platforms_alternative):
-            # Process the fields
-            platform_name = self._process_string_for_insert(
-                platform_alternative.get("Name")
+            platform_alternative_loader.add(
+                (
+                    idx,
+                    self.platform_lookup[platform_alternative.get("Name")],
+                    platform_alternative.get("Alternate"),
+                )
             )
-            platform_id = self.platform_lookup[platform_name]
-            alternative_name = platform_alternative.get("Alternate")
+        platform_alternative_loader.close()
 
-            self._cursor.execute(
-                f"""
-                    INSERT OR REPLACE INTO platform_alternative (
-                        platform_alternative_id,
-                        platform_id,
-                        name
-                    )
-                    VALUES(
-                        {idx},
-                        {platform_id},
-                        '{alternative_name}'
-                    )
-                """
-            )
-        self.engine.commit()
+        # Platform ids are positional, drop anything left over from an older dump
+        self._cursor.execute(
+            "DELETE FROM platform WHERE platform_id >= ?", (len(self.platform_lookup),)
+        )
+        self._cursor.execute(
+            "DELETE FROM platform_alternative WHERE platform_alternative_id >= ?",
+            (len(platforms_alternative),),
+        )
+        return
+
+    def _platform_row(self, platform_id: int, platform: dict[str, Any]) -> tuple:
+        return (
+            platform_id,
+            platform.get("Name"),
+            self._process_string_bool_for_insert(platform.get("Emulated", "FALSE")),
+            platform.get("ReleaseDate"),
+            platform.get("Developer"),
+            platform.get("Manufacturer"),
+            platform.get("Cpu"),
+            platform.get("Memory"),
+            platform.get("Graphics"),
+            platform.get("Sound"),
+            platform.get("Display"),
+            platform.get("Media"),
+            platform.get("MaxControllers"),
+            platform.get("Notes"),
+            platform.get("Category"),
+            self._process_string_bool_for_insert(platform.get("UseMameFiles", False)),
+        )
 
-    def _process_metadata_file(self):
+    def _table_writer(
+        self, table: str, columns: list[str], key_columns: list[str], incremental: bool
+    ):
+        if incremental:
+            return TableDiff(self.engine, table, columns, key_columns)
+        return BulkLoader(self._cursor, table, columns)
+
+    def _process_metadata_file(self, incremental: bool = False):
         # Read the Metadata xml file
         metadata_file_path = self.local_metadata_folder / "Metadata.xml"
 
-        # Open and read the XML file
-        with open(metadata_file_path, "r") as xml_file:
-            metadata_xml_content = xml_file.read()
-
-        # Convert the XML content to a dictionary
+        # Stream the <Game>, <GameAlternateName> and <GameImage> records straight
+        # into the DB
         print("Loading Launchbox: Metadata.xml - Starting")
-        metadata_root = xmltodict.parse(metadata_xml_content).get("LaunchBox")
-        print("Loading Launchbox: Metadata.xml - Completed")
-        games = metadata_root.get("Game")
-        game_images = metadata_root.get("GameImage")
-
-        # Games
-        # Check if the length of the game table is the same as the length from metadata
-        df = pandas.read_sql(
-            "SELECT COUNT(*) AS cnt FROM game",
-            self.engine,
+        game_loader = self._table_writer("game", GAME_COLUMNS, ["game_id"], incremental)
+        game_alternative_loader = self._table_writer(
+            "game_alternative",
+            GAME_ALTERNATIVE_COLUMNS,
+            ["game_id", "name"],
+            incremental,
+        )
+        game_image_loader = self._table_writer(
+            "game_image", GAME_IMAGE_COLUMNS, ["file_name"], incremental
         )
-        game_len = int(df["cnt"][0])
-        game_len = 0
-        if game_len != len(games):
-            for idx, game in enumerate(games):
-                # Process the fields
-                name = self._process_string_for_insert(game.get("Name"))
-                release_year = game.get("ReleaseYear")
-                release_year = "NULL" if release_year is None else int(release_year)
-                overview = self._process_string_for_insert(game.get("Overview"))
-                max_players = int(game.get("MaxPlayers", 1))
-                release_type = self._process_string_for_insert(game.get("ReleaseType"))
-                cooperative = self._process_string_bool_for_insert(
-                    game.get("Cooperative", False)
-                )
-                video_url = self._process_string_for_insert(game.get("VideoURL"))
-                game_id = game.get("DatabaseID")
-                community_rating = float(game.get("CommunityRating", 0.0))
-                platform = self._process_string_for_insert(game.get("Platform"))
-                platform_id = self.platform_lookup[platform]
-                esrb = self._process_string_for_insert(game.get("ESRB"))
-                community_rating_count = int(game.get("CommunityRatingCount", 0))
-                genres = self._process_string_for_insert(game.get("Genres"))
-                developer = self._process_string_for_insert(game.get("Developer"))
-                publisher = self._process_string_for_insert(game.get("Publisher"))
-
-                self._cursor.execute(
-                    f"""
-                        INSERT OR REPLACE INTO game (
-                            game_id,
-                            name,
-                            release_year,
-                            overview,
-                            max_players,
-                            release_type,
-                            cooperative,
-                            video_url,
-                            community_rating ,
-                            platform_id,
-                            esrb,
-                            community_rating_count,
-                            genres,
-                            developer,
-                            publisher
-                        )
-                        VALUES(
-                            {game_id},
-                            {name},
-                            {release_year},
-                            {overview},
-                            {max_players},
-                            {release_type},
-                            {cooperative},
-                            {video_url},
-                            {community_rating},
-                            {platform_id},
-                            {esrb},
-                            {community_rating_count},
-                            {genres},
-                            {developer},
-                            {publisher}
-                        )
-                    """
-                )
 
-                # commit every so many records
-                if idx % 10_000 == 0:
-                    self.engine.commit()
-            self.engine.commit()
+        # Alternate names don't have an id of their own, the same name can be listed
+        # for a few regions but is only kept once
+        game_alternative_keys = set()
+        for tag, record in self._iter_xml_records(
+            metadata_file_path, ["Game", "GameAlternateName", "GameImage"]
+        ):
+            if tag == "Game":
+                game_loader.add(self._game_row(record))
+            elif tag == "GameAlternateName":
+                game_alternative_row = self._game_alternative_row(record)
+                if game_alternative_row[:2] not in game_alternative_keys:
+                    game_alternative_keys.add(game_alternative_row[:2])
+                    game_alternative_loader.add(game_alternative_row)
+            else:
+                game_image_loader.add(self._game_image_row(record))
+        game_loader.close()
+        game_alternative_loader.close()
+        game_image_loader.close()
+        print("Loading Launchbox: Metadata.xml - Completed")
+        return
 
-        # Game Images
-        # Check if the length of the game table is the same as the length from metadata
-        df = pandas.read_sql(
-            "SELECT COUNT(*) AS cnt FROM game_image",
-            self.engine,
+    def _game_row(self, game: dict[str, Any]) -> tuple:
+        release_year = game.get("ReleaseYear")
+        return (
+            int(game.get("DatabaseID")),
+            game.get("Name"),
+            None if release_year is None else int(release_year),
+            game.get("Overview"),
+            int(game.get("MaxPlayers", 1)),
+            game.get("ReleaseType"),
+            self._process_string_bool_for_insert(game.get("Cooperative", False)),
+            game.get("VideoURL"),
+            float(game.get("CommunityRating", 0.0)),
+            self.platform_lookup[game.get("Platform")],
+            game.get("ESRB"),
+            int(game.get("CommunityRatingCount", 0)),
+            game.get("Genres"),
+            game.get("Developer"),
+            game.get("Publisher"),
+            normalize_title(game.get("Name")),
         )
-        game_image_len = int(df["cnt"][0])
-        game_image_len = 0
-        if len(game_images) != game_image_len:
-            for idx, game_image in enumerate(game_images):
-                game_id = game_image.get("DatabaseID")
-                file_name = self._process_string_for_insert(game_image.get("FileName"))
-                image_type = self._process_string_for_insert(game_image.get("Type"))
-                region = self._process_string_for_insert(game_image.get("Region"))
-                crc32 = self._process_string_for_insert(game_image.get("CRC32"))
 
-                self._cursor.execute(
-                    f"""
-                        INSERT OR REPLACE INTO game_image (
-                            game_id,
-                            type,
-                            region,
-                            file_name,
-                            crc32
-                        )
-                        VALUES(
-                            {game_id},
-                            {image_type},
-                            {region},
-                            {file_name},
-                            {crc32}
-                        )
-                    """
-                )
-                # commit every so many records
-                if idx % 10_000 == 0:
-                    self.engine.commit()
-            self.engine.commit()
+    def _game_alternative_row(self, game_alternative: dict[str, Any]) -> tuple:
+        return (
+            int(game_alternative.get("DatabaseID")),
+            game_alternative.get("AlternateName"),
+            normalize_title(game_alternative.get("AlternateName")),
+        )
 
-        return
+    def _game_image_row(self, game_image: dict[str, Any]) -> tuple:
+        return (
+            int(game_image.get("DatabaseID")),
+            game_image.get("Type"),
+            game_image.get("Region"),
+            game_image.get("FileName"),
+            game_image.get("CRC32"),
+        )
 
-    def _process_mame_file(self):
+    def _process_mame_file(self, incremental: bool = False):
         # Read the Metadata xml file
         mame_file_path = self.local_metadata_folder / "Mame.xml"
 
-        # Open and read the XML file
-        with open(mame_file_path, "r") as xml_file:
-            mame_xml_content = xml_file.read()
-
-        # Convert the XML content to a dictionary
+        # Stream the <MameFile> records straight into the DB
         print("Loading Launchbox: Mame.xml - Starting")
-        mame_root = xmltodict.parse(mame_xml_content).get("LaunchBox")
+        mame_file_loader = self._table_writer(
+            "mame_file", MAME_FILE_COLUMNS, ["filename"], incremental
+        )
+        for _, mame in self._iter_xml_records(mame_file_path, ["MameFile"]):
+            mame_file_loader.add(self._mame_file_row(mame))
+        mame_file_loader.close()
         print("Loading Launchbox: Mame.xml - Completed")
-        mame_files = mame_root.get("MameFile")
+        return
 
-        # Games
-        # Check if the length of the game table is the same as the length from metadata
-        df = pandas.read_sql(
-            "SELECT COUNT(*) AS cnt FROM mame_file",
-            self.engine,
+    def _mame_file_row(self, mame: dict[str, Any]) -> tuple:
+        year = mame.get("Year")
+        try:
+            year = None if year is None else int(year)
+        except:  # noqa: E722
+            year = None
+        play_mode = mame.get("PlayMode")
+        play_mode = None if play_mode == "???" else play_mode
+        return (
+            mame.get("FileName"),
+            mame.get("Name"),
+            mame.get("Status"),
+            mame.get("Developer"),
+            mame.get("Publisher"),
+            year,
+            self._process_string_bool_for_insert(mame.get("IsMechanical", False)),
+            self._process_string_bool_for_insert(mame.get("IsBootleg", False)),
+            self._process_string_bool_for_insert(mame.get("IsPrototype", False)),
+            self._process_string_bool_for_insert(mame.get("IsHack", False)),
+            self._process_string_bool_for_insert(mame.get("IsMature", False)),
+            self._process_string_bool_for_insert(mame.get("IsQuiz", False)),
+            self._process_string_bool_for_insert(mame.get("IsFruit", False)),
+            self._process_string_bool_for_insert(mame.get("IsCasino", False)),
+            self._process_string_bool_for_insert(mame.get("IsRhythm", False)),
+            self._process_string_bool_for_insert(mame.get("IsTableTop", False)),
+            self._process_string_bool_for_insert(mame.get("IsPlayChoice", False)),
+            self._process_string_bool_for_insert(mame.get("IsMahjong", False)),
+            self._process_string_bool_for_insert(mame.get("IsNonArcade", False)),
+            mame.get("Genre"),
+            play_mode,
+            mame.get("Language"),
+            mame.get("Source"),
         )
-        mame_file_len = int(df["cnt"][0])
-        mame_file_len = 0
-        if mame_file_len != len(mame_files):
-            for mame_id, mame in enumerate(mame_files):
-                # Process the fields
-                file_name = self._process_string_for_insert(mame.get("FileName"))
-                name = self._process_string_for_insert(mame.get("Name"))
-                status = self._process_string_for_insert(mame.get("Status"))
-                developer = self._process_string_for_insert(mame.get("Developer"))
-                publisher = self._process_string_for_insert(mame.get("Publisher"))
-                year = mame.get("Year")
-                try:
-                    year = "NULL" if year is None else int(year)
-                except:  # noqa: E722
-                    year = "NULL"
-                is_mechanical = self._process_string_bool_for_insert(
-                    mame.get("IsMechanical", False)
-                )
-                is_bootleg = self._process_string_bool_for_insert(
-                    mame.get("IsBootleg", False)
-                )
-                is_prototype = self._process_string_bool_for_insert(
-                    mame.get("IsPrototype", False)
-                )
-                is_hack = self._process_string_bool_for_insert(
-                    mame.get("IsHack", False)
-                )
-                is_mature = self._process_string_bool_for_insert(
-                    mame.get("IsMature", False)
-                )
-                is_quiz = self._process_string_bool_for_insert(
-                    mame.get("IsQuiz", False)
-                )
-                is_fruit = self._process_string_bool_for_insert(
-                    mame.get("IsFruit", False)
-                )
-                is_casino = self._process_string_bool_for_insert(
-                    mame.get("IsCasino", False)
-                )
-                is_rhythm = self._process_string_bool_for_insert(
-                    mame.get("IsRhythm", False)
-                )
-                is_table_top = self._process_string_bool_for_insert(
-                    mame.get("IsTableTop", False)
-                )
-                is_play_choice = self._process_string_bool_for_insert(
-                    mame.get("IsPlayChoice", False)
-                )
-                is_mahjong = self._process_string_bool_for_insert(
-                    mame.get("IsMahjong", False)
-                )
-                is_non_arcade = self._process_string_bool_for_insert(
-                    mame.get("IsNonArcade", False)
-                )
-                genre = self._process_string_for_insert(mame.get("Genre"))
-                play_mode = self._process_string_for_insert(mame.get("PlayMode"))
-                play_mode = "NULL" if play_mode == "'???'" else play_mode
-                language = self._process_string_for_insert(mame.get("Language"))
-                source = self._process_string_for_insert(mame.get("Source"))
 
-                self._cursor.execute(
-                    f"""
-                        INSERT OR REPLACE INTO mame_file (
-                            mame_id,
-                            filename,
-                            name,
-                            status,
-                            developer,
-                            publisher,
-                            year,
-                            is_mechanical,
-                            is_bootleg,
-                            is_prototype,
-                            is_hack,
-                            is_mature,
-                            is_quiz,
-                            is_fruit,
-                            is_casino,
-                            is_rhythm,
-                            is_table_top,
-                            is_play_choice,
-                            is_mahjong,
-                            is_non_arcade,
-                            genre,
-                            play_mode,
-                            language,
-                            source
-                        )
-                        VALUES(
-                            {mame_id},
-                            {file_name},
-                            {name},
-                            {status},
-                            {developer},
-                            {publisher},
-                            {year},
-                            {is_mechanical},
-                            {is_bootleg},
-                            {is_prototype},
-                            {is_hack},
-                            {is_mature},
-                            {is_quiz},
-                            {is_fruit},
-                            {is_casino},
-                            {is_rhythm},
-                            {is_table_top},
-                            {is_play_choice},
-                            {is_mahjong},
-                            {is_non_arcade},
-                            {genre},
-                            {play_mode},
-                            {language},
-                            {source}
-                        )
-                    """
-                )
+    def _populate_tables(self):
+        # Only touch the DB when we've freshly extracted the metadata
+        if not self.process_files:
+            return
+
+        # An empty DB gets a full bulk load into a new file, otherwise only apply
+        # what changed
+        self._cursor.execute("SELECT COUNT(*) FROM game")
+        incremental = self._cursor.fetchone()[0] > 0
 
-                # commit every so many records
-                if mame_id % 10_000 == 0:
-                    self.engine.commit()
+        start_time = time.perf_counter()
+        if incremental:
+            self._update_tables()
+        else:
+            self._rebuild_tables()
+        report_throughput("launchbox.db", None, start_time)
+        return
+
+    def _load_tables(self, incremental: bool) -> None:
+        self._process_platforms_file()
+        self._process_metadata_file(incremental=incremental)
+        self._process_mame_file(incremental=incremental)
+
+        # The title search doesn't follow the game table by itself
+        rebuild_title_search(self._cursor, "game_title_fts")
+        if not incremental:
+            index_start_time = time.perf_counter()
+            self._create_indexes()
+            report_throughput("indexes", None, index_start_time)
+
+        # Remember what we've loaded so the next refresh can skip it. Written last,
+        # in the same transaction, it also marks the load as complete.
+        if self.metadata_source is not None:
+            self._set_metadata_source(self.metadata_source)
+        self._cursor.execute(f"PRAGMA user_version = {TITLE_KEY_VERSION}")
+        return
+
+    def _update_tables(self) -> None:
+        # Everything goes in as a single transaction, on the normal journal
+        try:
+            self._load_tables(incremental=True)
             self.engine.commit()
+        except BaseException:
+            # Including KeyboardInterrupt, nothing of a partial load gets committed
+            self.engine.rollback()
+            raise
         return
 
-    def _populate_tables(self):
-        if True:
-            return
+    def _rebuild_tables(self) -> None:
+        # Build the whole DB in a new file and only swap it in once it's complete.
+        # Nothing else sees the new file, so durability can be traded for speed: if
+        # anything goes wrong the file is thrown away and launchbox.db is untouched.
+        if self.metadata_source is None:
+            self.metadata_source = self._get_metadata_source()
+        build_db_file = self.local_db_file.with_suffix(f".db.{os.getpid()}.tmp")
+        if build_db_file.exists():
+            build_db_file.unlink()
 
-        self._process_platforms_file()
-        self._process_metadata_file()
-        self._process_mame_file()
+        self._cursor.close()
+        self.engine.close()
+        try:
+            self.engine = sqlite3.connect(build_db_file)
+            self._cursor = self.engine.cursor()
+            self._cursor.execute("PRAGMA journal_mode = OFF")
+            self._cursor.execute("PRAGMA synchronous = OFF")
+            self._cursor.execute("PRAGMA temp_store = MEMORY")
+            self._cursor.execute("PRAGMA cache_size = -262144")
+
+            # Maintaining secondary indexes row by row is slow, they get built once
+            # at the end instead. Unique indexes stay as INSERT OR REPLACE relies on
+            # them
+            self._create_tables(create_indexes=False)
+            self._load_tables(incremental=False)
+            self.engine.commit()
+            self._cursor.close()
+            self.engine.close()
+            os.replace(build_db_file, self.local_db_file)
+        except BaseException:
+            # Including KeyboardInterrupt
+            self._cursor.close()
+            self.engine.close()
+            if build_db_file.exists():
+                build_db_file.unlink()
+            raise
+        finally:
+            self.engine = sqlite3.connect(self.local_db_file)
+            self._cursor = self.engine.cursor()
+        return
 
+    def _create_indexes(self) -> None:
+        for index_name in SUPERSEDED_INDEXES:
+            self._cursor.execute(f"DROP INDEX IF EXISTS {index_name}")
+        for index_name, index_columns in DEFERRED_INDEXES.items():
+            self._cursor.execute(
+                f"""
+                CREATE INDEX IF NOT EXISTS {index_name} ON
+                    {index_columns}
+                """
+            )
         return
 
-    def _create_tables(self):
+    def _create_tables(self, create_indexes: bool = True):
+        # metadata_source
+        self._cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS metadata_source (
+                name TEXT PRIMARY KEY,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                etag TEXT NULL,
+                size INT NOT NULL,
+                sha256 TEXT NOT NULL
+            )
+            """
+        )
+
         # platform
         self._cursor.execute(
             """
@@ -614,22 +1216,11 @@ class LaunchBoxDB:
                 community_rating_count INT DEFAULT 0,
                 genres TEXT NULL,
                 developer TEXT NULL,
-                publisher TEXT NULL
+                publisher TEXT NULL,
+                title_key TEXT NULL
             )
             """
         )
-        self._cursor.execute(
-            """
-            CREATE INDEX IF NOT EXISTS game_name_idx ON
-                game (name)
-            """
-        )
-        self._cursor.execute(
-            """
-            CREATE INDEX IF NOT EXISTS game_platform_idx ON
-                game (platform_id)
-            """
-        )
 
         # game_alternative
         self._cursor.execute(
@@ -638,16 +1229,49 @@ class LaunchBoxDB:
                 game_alternative_id INTEGER PRIMARY KEY,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 game_id INT NOT NULL,
-                name TEXT NOT NULL
+                name TEXT NOT NULL,
+                title_key TEXT NULL
             )
             """
         )
+
+        # Older DBs don't have the normalized title keys yet
+        self.schema_upgraded = False
+        for table in ["game", "game_alternative"]:
+            self._cursor.execute(f"PRAGMA table_info({table})")
+            if "title_key" not in [row[1] for row in self._cursor.fetchall()]:
+                self._cursor.execute(
+                    f"ALTER TABLE {table} ADD COLUMN title_key TEXT NULL"
+                )
+                self.schema_upgraded = True
+
+        # Alternate names used to be keyed on their position in Metadata.xml, those
+        # rows can hold duplicates so they're dropped and loaded again
         self._cursor.execute(
             """
-            CREATE INDEX IF NOT EXISTS game_alternative_game_id_idx ON
-                game_alternative (game_id)
+            SELECT name FROM sqlite_master
+            WHERE type = 'index' AND name = 'game_alternative_game_id_name_uidx'
             """
         )
+        if self._cursor.fetchone() is None:
+            self._cursor.execute("DELETE FROM game_alternative")
+            self._cursor.execute(
+                """
+                CREATE UNIQUE INDEX game_alternative_game_id_name_uidx ON
+                    game_alternative (game_id, name)
+                """
+            )
+            self.schema_upgraded = True
+
+        # Keys made by an older normalize_title have to be made again
+        self._cursor.execute("PRAGMA user_version")
+        if self._cursor.fetchone()[0] < TITLE_KEY_VERSION:
+            self.schema_upgraded = True
+
+        # Full text search over the game names
+        create_title_search(
+            self._cursor, "game_title_fts", "game", "name", "game_id", "platform_id"
+        )
 
         # game_image
         self._cursor.execute(
@@ -663,12 +1287,6 @@ class LaunchBoxDB:
             )
             """
         )
-        self._cursor.execute(
-            """
-            CREATE INDEX IF NOT EXISTS game_image_game_id_dx ON
-                game_image (game_id)
-            """
-        )
         self._cursor.execute(
             """
             CREATE UNIQUE INDEX IF NOT EXISTS game_image_file_name_dx ON
@@ -721,368 +1339,237 @@ class LaunchBoxDB:
             """
         )
 
-        # Commit all the table generation
+        # Commit all the table generation (this also brings back any index a past
+        # load didn't get to create)
+        if create_indexes:
+            self._create_indexes()
         self.engine.commit()
         return
 
     def _get_platform_id(self, platform: str):
         platform_lookup = PLATFORM_LOOKUP[platform]
-        df = pandas.read_sql(
-            f"""
-                SELECT * FROM platform
-                WHERE UPPER(name) = UPPER('{platform_lookup}')""",
-            self.engine,
+        self._cursor.execute(
+            "SELECT platform_id FROM platform WHERE UPPER(name) = UPPER(?)",
+            (platform_lookup,),
         )
-        return df["platform_id"][0]
+        return self._cursor.fetchone()[0]
 
-    def _get_all_games_from_platform_id(self, platform_id):
-        df = pandas.read_sql(
-            f"""
-                SELECT * FROM game
-                WHERE platform_id = {platform_id}""",
-            self.engine,
+    def _get_all_games_from_platform_id(
+        self, platform_id
+    ) -> tuple[numpy.ndarray, list[str]]:
+        # (game ids, names) as parallel arrays, one entry per distinct name. Games
+        # sharing a name keep the position of the first one and the id of the last.
+        self._cursor.execute(
+            """
+                SELECT game_id, name FROM game
+                WHERE platform_id = ?
+                ORDER BY game_id
+            """,
+            (platform_id,),
         )
-        all_games = {}
-        for idx, row in df.iterrows():
-            values = row.to_dict()
-            if numpy.isnan(values["release_year"]):
-                values["release_year"] = None
-            name = values["name"]
-            all_games[name] = values
-        return all_games
+        name_positions = {}
+        game_ids = []
+        for game_id, name in self._cursor:
+            position = name_positions.setdefault(name, len(game_ids))
+            if position == len(game_ids):
+                game_ids.append(game_id)
+            else:
+                game_ids[position] = game_id
+        return numpy.array(game_ids, dtype=numpy.int64), list(name_positions.keys())
+
+    def get_game(self, game_id: int) -> Union[dict[str, Any], None]:
+        self._cursor.execute(
+            f"SELECT {', '.join(GAME_COLUMNS)} FROM game WHERE game_id = ?",
+            (int(game_id),),
+        )
+        row = self._cursor.fetchone()
+        if row is None:
+            return None
+        return dict(zip(GAME_COLUMNS, row))
+
+    def _get_game_id_by_title_key(self, game_name: str) -> Union[int, None]:
+        # Exact match on the normalized title, then on the alternate names, both
+        # straight from the indexes
+        title_key = normalize_title(game_name)
+        if title_key == "":
+            return None
+
+        self._cursor.execute(
+            """
+                SELECT game_id FROM game
+                WHERE platform_id = ? AND title_key = ?
+                ORDER BY name = ? DESC, game_id
+                LIMIT 1
+            """,
+            (int(self.platform_id), title_key, game_name),
+        )
+        row = self._cursor.fetchone()
+        if row is None:
+            self._cursor.execute(
+                """
+                    SELECT game.game_id FROM game_alternative
+                    JOIN game ON game.game_id = game_alternative.game_id
+                    WHERE game_alternative.title_key = ? AND game.platform_id = ?
+                    ORDER BY game_alternative.game_alternative_id
+                    LIMIT 1
+                """,
+                (title_key, int(self.platform_id)),
+            )
+            row = self._cursor.fetchone()
+        return None if row is None else row[0]
 
     def get_game_by_name(self, game_name: str):
         game_name = game_name.strip()
-        best_fuzz_score = 0
         best_match = None
 
-        for db_game_name in self.all_platform_games.keys():
-            fuzz_score = fuzz.ratio(game_name, db_game_name)
-            if fuzz_score > 80 and fuzz_score > best_fuzz_score:
-                best_fuzz_score = fuzz_score
-                best_match = self.all_platform_games[db_game_name]
-            if best_fuzz_score == 100:
-                break
+        game_id = self._get_game_id_by_title_key(game_name)
+        if game_id is not None:
+            return self.get_game(game_id)
+
+        # Only score the titles the full text search comes up with
+        candidates = self._get_candidate_games(game_name)
+        if candidates is not None:
+            game_ids, names = candidates
+            position = TitleMatcher(names, threshold=80).best_match(game_name)
+            if position is not None:
+                best_match = self.get_game(game_ids[position])
+            return best_match
+
+        # Too short to search for, only score the titles that could beat the threshold
+        position = self.get_title_index().best_match(game_name)
+        if position is not None:
+            best_match = self.get_game(self.platform_game_ids[position])
         return best_match
 
+    def get_title_index(self) -> TitleIndex:
+        # Every game on the platform. Only the names (for matching) and ids are kept,
+        # the rest of a game is read when it's matched.
+        if self.title_index is None:
+            (
+                self.platform_game_ids,
+                platform_game_names,
+            ) = self._get_all_games_from_platform_id(self.platform_id)
+            self.title_index = TitleIndex(platform_game_names, threshold=80)
+        return self.title_index
+
+    def _get_candidate_games(
+        self, game_name: str
+    ) -> Union[tuple[list[int], list[str]], None]:
+        # (game ids, names) of the platform's best full text matches, in the same
+        # order and with the same ids as _get_all_games_from_platform_id
+        game_ids = get_title_search_candidates(
+            self._cursor, "game_title_fts", game_name, self.platform_id
+        )
+        if game_ids is None:
+            return None
+
+        placeholders = ", ".join("?" for _ in game_ids)
+        self._cursor.execute(
+            f"""
+                SELECT name, MIN(game_id), MAX(game_id) FROM game
+                WHERE platform_id = ? AND name IN (
+                    SELECT name FROM game WHERE game_id IN ({placeholders})
+                )
+                GROUP BY name
+                ORDER BY MIN(game_id)
+            """,
+            (int(self.platform_id), *game_ids),
+        )
+        rows = self._cursor.fetchall()
+        return [row[2] for row in rows], [row[0] for row in rows]
+
+    def _get_all_artwork_from_platform_id(
+        self, platform_id
+    ) -> dict[tuple[int, str, str], list[dict[str, Any]]]:
+        # Every image of every game on the platform in one query, grouped by
+        # (game_id, TYPE, REGION). Images without a region go under "NONE".
+        self._cursor.execute(
+            """
+                SELECT game_image.game_image_id, game_image.game_id, game_image.type,
+                    game_image.region, game_image.file_name, game_image.crc32
+                FROM game_image
+                JOIN game ON game.game_id = game_image.game_id
+                WHERE game.platform_id = ?
+                ORDER BY game_image.game_image_id
+            """,
+            (int(platform_id),),
+        )
+        platform_artworks = {}
+        for row in self._cursor.fetchall():
+            game_image_id, game_id, image_type, region, file_name, crc32 = row
+            if region is None:
+                region = "None"
+            key = (game_id, image_type.upper(), region.upper())
+            platform_artworks.setdefault(key, []).append(
+                {
+                    "game_image_id": game_image_id,
+                    "game_id": game_id,
+                    "type": image_type,
+                    "region": region,
+                    "file_name": file_name,
+                    "crc32": crc32,
+                }
+            )
+        return platform_artworks
+
     def _find_artwork(
         self,
-        artworks: list[dict[str, Any]],
+        game_id: int,
         artwork_type: str,
         order_of_regions: list[str],
     ):
-        # Find relevant artwork
-        found_artworks = []
+        if self.platform_artworks is None:
+            self.platform_artworks = self._get_all_artwork_from_platform_id(
+                self.platform_id
+            )
+
+        # The artwork for the first region that has any
+        artwork_type = artwork_type.upper()
         for region in order_of_regions:
-            criteria = {"region": region, "type": artwork_type}
-            found_artworks += list(
-                filter(
-                    lambda d: all(
-                        d.get(k).upper() == v.upper() for k, v in criteria.items()
-                    ),
-                    artworks,
-                )
+            found_artworks = self.platform_artworks.get(
+                (game_id, artwork_type, region.upper())
             )
-            if len(found_artworks) > 0:
-                break
-        return found_artworks
+            if found_artworks is not None:
+                return list(found_artworks)
+        return []
 
     def get_artwork_from_game(self, game: dict[str, Any], filename: str):
-        df = pandas.read_sql(
-            f"SELECT * FROM game_image WHERE game_id = {game['game_id']}", self.engine
-        )
-        df["index"] = df["game_image_id"]
-        artworks = df.set_index("index").T.to_dict("dict")
-        artworks = list(artworks.values())
-
-        # Some artwork doesn't have a region setup. Set it to "None"
-        for artwork in artworks:
-            if artwork["region"] is None:
-                artwork["region"] = "None"
-
-        # Get the order of precedence for artwork
-        # We try to have the countries alphabetically, but since there's a pattern of (Korea, USA)
-        # I'd rather want the USA images
-        if re.search(r"\(.*USA.*\)", filename.upper()):
-            order_of_regions = [
-                "USA",
-                "NORTH AMERICA",
-                "WORLD",
-                "EUROPE",
-                "ASIA",
-                "JAPAN",
-                "NONE",
-            ]
-        elif re.search(r"\(.*AUSTRALIA.*\)", filename.upper()):
-            order_of_regions = [
-                "AUSTRALIA",
-                "OCEANIA" "WORLD",
-                "ASIA",
-                "EUROPE",
-                "NORTH AMERICA",
-                "USA",
-                "JAPAN",
-                "NONE",
-            ]
-        elif re.search(r"\(.*BRAZIL.*\)", filename.upper()):
-            order_of_regions = [
-                "BRAZIL",
-                "WORLD",
-                "EUROPE",
-                "NORTH AMERICA",
-                "USA",
-                "ASIA",
-                "JAPAN",
-                "NONE",
-            ]
-        elif re.search(r"\(.*CANADA.*\)", filename.upper()):
-            order_of_regions = [
-                "CANADA",
-                "NORTH AMERICA",
-                "WORLD",
-                "EUROPE",
-                "ASIA",
-                "JAPAN",
-                "NONE",
-            ]
-        elif re.search(r"\(.*FRANCE.*\)", filename.upper()):
-            order_of_regions = [
-                "FRANCE",
-                "EUROPE",
-                "WORLD",
-                "NORTH AMERICA",
-                "USA",
-                "ASIA",
-                "JAPAN",
-                "NONE",
-            ]
-        elif re.search(r"\(.*GERMANY.*\)", filename.upper()):
-            order_of_regions = [
-                "GERMANY",
-                "EUROPE",
-                "WORLD",
-                "NORTH AMERICA",
-                "USA",
-                "ASIA",
-                "JAPAN",
-                "NONE",
-            ]
-        elif re.search(r"\(.*GREECE.*\)", filename.upper()):
-            order_of_regions = [
-                "GREECE",
-                "EUROPE",
-                "WORLD",
-                "NORTH AMERICA",
-                "USA",
-                "ASIA",
-                "JAPAN",
-                "NONE",
-            ]
-        elif re.search(r"\(.*ITALY.*\)", filename.upper()):
-            order_of_regions = [
-                "ITALY",
-                "EUROPE",
-                "WORLD",
-                "NORTH AMERICA",
-                "USA",
-                "ASIA",
-                "JAPAN",
-                "NONE",
-            ]
-        elif re.search(r"\(.*INDIA.*\)", filename.upper()):
-            order_of_regions = [
-                "INDIA",
-                "ASIA",
-                "WORLD",
-                "NORTH AMERICA",
-                "EUROPE",
-                "NONE",
-            ]
-        elif re.search(r"\(.*JAPAN.*\)", filename.upper()):
-            order_of_regions = [
-                "JAPAN",
-                "ASIA",
-                "KOREA",
-                "WORLD",
-                "NORTH AMERICA",
-                "EUROPE",
-                "NONE",
-            ]
-        elif re.search(r"\(.*KOREA.*\)", filename.upper()):
-            order_of_regions = [
-                "KOREA",
-                "ASIA",
-                "WORLD",
-                "JAPAN",
-                "NORTH AMERICA",
-                "EUROPE",
-                "NONE",
-            ]
-        elif re.search(r"\(.*NETHERLANDS.*\)", filename.upper()):
-            order_of_regions = [
-                "NETHERLANDS",
-                "EUROPE",
-                "WORLD",
-                "NORTH AMERICA",
-                "USA",
-                "ASIA",
-                "JAPAN",
-                "NONE",
-            ]
-        elif re.search(r"\(.*POLAND.*\)", filename.upper()):
-            order_of_regions = [
-                "POLAND",
-                "EUROPE",
-                "WORLD",
-                "NORTH AMERICA",
-                "USA",
-                "ASIA",
-                "JAPAN",
-                "NONE",
-            ]
-        elif re.search(r"\(.*PORTUGAL.*\)", filename.upper()):
-            order_of_regions = [
-                "PORTUGAL",
-                "EUROPE",
-                "WORLD",
-                "NORTH AMERICA",
-                "USA",
-                "ASIA",
-                "JAPAN",
-                "NONE",
-            ]
-        elif re.search(r"\(.*RUSSIA.*\)", filename.upper()):
-            order_of_regions = [
-                "RUSSIA",
-                "EUROPE",
-                "WORLD",
-                "USA",
-                "NORTH AMERICA",
-                "ASIA",
-                "JAPAN",
-                "NONE",
-            ]
-        elif re.search(r"\(.*SPAIN.*\)", filename.upper()):
-            order_of_regions = [
-                "SPAIN",
-                "EUROPE",
-                "WORLD",
-                "USA",
-                "NORTH AMERICA",
-                "ASIA",
-                "JAPAN",
-                "NONE",
-            ]
-        elif re.search(r"\(.*UK.*\)", filename.upper()):
-            order_of_regions = [
-                "UNITED KINGDOM",
-                "UK",
-                "EUROPE",
-                "WORLD",
-                "USA",
-                "NORTH AMERICA",
-                "ASIA",
-                "JAPAN",
-                "NONE",
-            ]
-        elif re.search(r"\(.*UNITED ARAB EMIRATES.*\)", filename.upper()):
-            order_of_regions = [
-                "UNITED ARAB EMIRATES",
-                "EUROPE",
-                "WORLD",
-                "USA",
-                "NORTH AMERICA",
-                "ASIA",
-                "JAPAN",
-                "NONE",
-            ]
-        elif re.search(r"\(.*ASIA.*\)", filename.upper()):
-            order_of_regions = [
-                "ASIA",
-                "WORLD",
-                "EUROPE",
-                "NORTH AMERICA",
-                "USA",
-                "JAPAN",
-                "NONE",
-            ]
-        elif re.search(r"\(.*EUROPE.*\)", filename.upper()):
-            order_of_regions = [
-                "EUROPE",
-                "WORLD",
-                "NORTH AMERICA",
-                "USA",
-                "ASIA",
-                "JAPAN",
-                "NONE",
-            ]
-        elif re.search(r"\(.*NORTH AMERICA.*\)", filename.upper()):
-            order_of_regions = [
-                "NORTH AMERICA",
-                "USA",
-                "WORLD",
-                "EUROPE",
-                "ASIA",
-                "JAPAN",
-                "NONE",
-            ]
-        elif re.search(r"\(.*SCANDINAVIA.*\)", filename.upper()):
-            order_of_regions = [
-                "SCANDINAVIA",
-                "EUROPE",
-                "WORLD",
-                "NORTH AMERICA",
-                "USA",
-                "ASIA",
-                "JAPAN",
-                "NONE",
-            ]
-        elif re.search(r"\(.*WORLD.*\)", filename.upper()):
-            order_of_regions = [
-                "WORLD",
-                "EUROPE",
-                "NORTH AMERICA",
-                "USA",
-                "ASIA",
-                "JAPAN",
-                "NONE",
-            ]
-        else:
-            raise Exception("no region found")
+        game_id = int(game["game_id"])
+        order_of_regions = get_order_of_regions(filename)
 
         # banner
         banners = self._find_artwork(
-            artworks=artworks,
+            game_id=game_id,
             artwork_type="Banner",
             order_of_regions=order_of_regions,
         )
         boxart_back = self._find_artwork(
-            artworks=artworks,
+            game_id=game_id,
             artwork_type="Box - Back",
             order_of_regions=order_of_regions,
         )
         boxart_front = self._find_artwork(
-            artworks=artworks,
+            game_id=game_id,
             artwork_type="Box - Front",
             order_of_regions=order_of_regions,
         )
         clearlogo = self._find_artwork(
-            artworks=artworks,
+            game_id=game_id,
             artwork_type="Clear Logo",
             order_of_regions=order_of_regions,
         )
         fanart = self._find_artwork(
-            artworks=artworks,
+            game_id=game_id,
             artwork_type="Fanart - Background",
             order_of_regions=order_of_regions,
         )
         screenshot = self._find_artwork(
-            artworks=artworks,
+            game_id=game_id,
             artwork_type="Screenshot - Gameplay",
             order_of_regions=order_of_regions,
         )
         titlescreen = self._find_artwork(
-            artworks=artworks,
+            game_id=game_id,
             artwork_type="Screenshot - Game Title",
             order_of_regions=order_of_regions,
         )
@@ -1099,9 +1586,11 @@ class LaunchBoxDB:
 
         return final_artwork
 
-    def download_all_art(self, launchbox_game: Any, filename: str, art_path_root: str):
+    def get_artwork_jobs(
+        self, launchbox_game: Any, filename: str, art_path_root: str
+    ) -> tuple[dict[str, list[str]], list[tuple[str, str, str]]]:
         if launchbox_game is None:
-            return {}
+            return {}, []
         art_path = art_path_root + "launchbox/"
 
         # Get Image data from database
@@ -1118,24 +1607,17 @@ class LaunchBoxDB:
             "titlescreen": [],
             "graphical": [],
         }
+        jobs = []
         for image_type, launchbox_images in game_images.items():
             for image in launchbox_images:
                 image_filename: str = image["file_name"]
                 image_path = os.path.join(art_path, image_filename)
-                if not os.path.exists(os.path.dirname(image_path)):
-                    os.makedirs(os.path.dirname(image_path))
                 image_url = f"{base_url}{image_filename}"
-                have_image = False
-                if not os.path.isfile(image_path):
-                    image_web = requests.get(image_url)
-                    if image_web.status_code == 200:
-                        with open(image_path, "wb") as output:
-                            output.write(image_web.content)
-                            have_image = True
-                else:  # already downloaded
-                    have_image = True
-
-                if have_image:
-                    filename_links[image_type].append(image_path)
-
-        return filename_links
+                jobs.append((image_type, image_url, image_path))
+        return filename_links, jobs
+
+    def download_all_art(self, launchbox_game: Any, filename: str, art_path_root: str):
+        filename_links, jobs = self.get_artwork_jobs(
+            launchbox_game, filename, art_path_root
+        )
+        return get_artwork_downloader().download_links(filename_links, jobs)
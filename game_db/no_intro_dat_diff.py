@@ -0,0 +1,92 @@
+import os
+import re
+from typing import Any, Union
+
+from game_db.no_intro_db import NO_INTRO_ROOT
+from game_db.no_intro_hash_index import iter_dat_roms
+
+# DAT files are named "<System> (<YYYYMMDD-HHMMSS>).dat", the date changes with every
+# release of the pack
+REG_EX_DAT_DATE = re.compile(r" \(\d{8}-\d{6}\)\.dat$")
+
+
+def get_dat_system_name(dat_file: str) -> str:
+    return REG_EX_DAT_DATE.sub("", os.path.basename(dat_file))
+
+
+def find_previous_dat_file(dat_file: str, old_no_intro_root: str) -> Union[str, None]:
+    # The same system's DAT in an older No-Intro pack (whatever its date)
+    dat_folder = os.path.join(
+        old_no_intro_root,
+        os.path.relpath(os.path.dirname(dat_file), NO_INTRO_ROOT),
+    )
+    if not os.path.isdir(dat_folder):
+        return None
+
+    system_name = get_dat_system_name(dat_file)
+    for filename in sorted(os.listdir(dat_folder)):
+        if filename.endswith(".dat") and get_dat_system_name(filename) == system_name:
+            return os.path.join(dat_folder, filename)
+    return None
+
+
+def get_dat_entries(dat_file: str) -> dict[tuple, dict[str, Any]]:
+    # rom hash -> the rom, keyed on the strongest hash the DAT has for it. The first
+    # rom in the DAT wins, the same as the lookups in NoIntroDb.
+    entries = {}
+    for game_name, rom in iter_dat_roms(dat_file):
+        crc = (rom.get("crc") or "").upper() or None
+        size = rom.get("size")
+        size = None if size is None else int(size)
+        if rom.get("sha1"):
+            key = ("sha1", rom["sha1"].upper())
+        elif rom.get("md5"):
+            key = ("md5", rom["md5"].upper())
+        else:
+            key = ("crc", crc, size)
+        entries.setdefault(key, {"game_name": game_name, "crc": crc, "size": size})
+    return entries
+
+
+def diff_dat_files(old_dat_file: str, new_dat_file: str) -> dict[str, list[dict]]:
+    # Roms that were added, removed or renamed (same hash, different game) between
+    # two releases of a DAT
+    old_entries = get_dat_entries(old_dat_file)
+    new_entries = get_dat_entries(new_dat_file)
+
+    dat_diff = {"added": [], "removed": [], "renamed": []}
+    for key, new_entry in new_entries.items():
+        old_entry = old_entries.get(key)
+        if old_entry is None:
+            dat_diff["added"].append(new_entry)
+        elif old_entry["game_name"] != new_entry["game_name"]:
+            dat_diff["renamed"].append(
+                {**new_entry, "old_game_name": old_entry["game_name"]}
+            )
+    for key, old_entry in old_entries.items():
+        if key not in new_entries:
+            dat_diff["removed"].append(old_entry)
+    return dat_diff
+
+
+def get_affected_rom_crcs(
+    dat_diff: dict[str, list[dict]]
+) -> dict[Union[int, None], set[Union[str, None]]]:
+    # size -> CRCs of the roms in the diff, a ROM with one of these needs to be
+    # identified again. None stands for any size / CRC (when the DAT left it out).
+    affected = {}
+    for entries in dat_diff.values():
+        for entry in entries:
+            affected.setdefault(entry["size"], set()).add(entry["crc"])
+    return affected
+
+
+def is_affected_rom(
+    affected: dict[Union[int, None], set[Union[str, None]]], crc: str, size: int
+) -> bool:
+    crc = crc.upper()
+    for affected_size in (size, None):
+        crcs = affected.get(affected_size)
+        if crcs is not None and (crc in crcs or None in crcs):
+            return True
+    return False
@@ -1,8 +1,23 @@
+import functools
 import hashlib
+import os
+import pickle
 import re
+import zipfile
+from typing import Union
 
 import xmltodict as xmltodict
 
+from game_db.rom_fingerprint_cache import get_rom_fingerprint_cache
+from game_db.rom_hasher import (
+    INES_MAGIC,
+    get_file_header_size,
+    get_header_size,
+    hash_file,
+    hash_roms_in_parallel,
+    hash_stream,
+)
+
 NO_INTRO_ROOT = "/mnt/SnapSsdArray_01/SnapDisk_4TB_27/Consoles/DatFiles/No-Intro Love Pack (Standard) (2023-04-13)"
 PLATFORM_LOOKUP = {
     "amiga": f"{NO_INTRO_ROOT}/No-Intro/Commodore - Amiga (20220712-143036).dat",
@@ -30,6 +45,23 @@ PLATFORM_LOOKUP = {
     "wonderswan": f"{NO_INTRO_ROOT}/No-Intro/Bandai - WonderSwan (20230317-075216).dat",
     "wonderswancolor": f"{NO_INTRO_ROOT}/No-Intro/Bandai - WonderSwan Color (20230218-062956).dat",
 }
+
+# Parsed DATs get cached here, bump the version when the cached data changes
+DAT_CACHE_FOLDER = f"{os.path.dirname(__file__)}/../database/no_intro"
+DAT_CACHE_VERSION = 4
+
+# Everything built from the DAT that gets stored in the cache. The parsed DAT itself
+# isn't kept, only the game (or rom) entries the indexes point at.
+DAT_CACHE_ATTRIBUTES = [
+    "md5_index",
+    "sha1_index",
+    "crc_index",
+    "crc_roms",
+    "all_crcs_known",
+    "rom_sizes",
+    "all_rom_sizes_known",
+]
+
 REG_EX_COUNTRIES = (
     r"( \(("
     # Revisions / Beta
@@ -140,6 +172,36 @@ REG_EX_SWITCH_REGION = r"(\[US\])|(\[JP\])|(\[EU\])"
 REG_EX_WII_U_ID = r"\[([0-9A-Z]){8}\]"
 REG_EX_VERSION = r"(\([vV][0-9]+.[0-9]+\))"
 
+# The expressions above, compiled, in the order they get stripped from a name. Each
+# one comes with a bit of text every match has to contain, when a name doesn't have
+# it the (much slower) regex doesn't need to run at all.
+NAME_CLEANING_EXPRESSIONS = [
+    (re.compile(REG_EX_COUNTRIES), " ("),
+    (re.compile(REG_EX_LANG), "("),
+    (re.compile(REG_EX_DATE), " ("),
+    (re.compile(REG_EX_EXTRAS), "["),
+    (re.compile(REG_EX_PS3), "(B"),
+    (re.compile(REG_EX_SWITCH_GAME_ID), "["),
+    (re.compile(REG_EX_SWITCH_GAME_VER), "[v"),
+    (re.compile(REG_EX_SWITCH_GAME_SIZE), " GB)"),
+    (re.compile(REG_EX_SWITCH_REGION), "["),
+    (re.compile(REG_EX_WII_U_ID), "["),
+    (re.compile(REG_EX_VERSION), "("),
+]
+
+
+@functools.lru_cache(maxsize=262144)
+def clean_no_intro_name(game_name: str) -> str:
+    # The expressions have to run one after another: stripping one tag can change
+    # what the next one matches (ie: "Game (En)(2001-01-01)" only loses its date once
+    # the language is gone), so they can't be merged into a single pass
+    for expression, required_text in NAME_CLEANING_EXPRESSIONS:
+        if required_text in game_name:
+            game_name = expression.sub("", game_name)
+    if ", The" in game_name:
+        game_name = "The " + game_name.replace(", The", "")
+    return game_name
+
 
 class NoIntroDb:
     def __init__(self, platform: str):
@@ -148,83 +210,413 @@ class NoIntroDb:
         if platform not in PLATFORM_LOOKUP.keys():
             raise ValueError(f"Invalid Platform {platform}")
 
-        with open(PLATFORM_LOOKUP[platform]) as df:
-            self.no_intro_dat_file = xmltodict.parse(df.read())
+        self.dat_file = PLATFORM_LOOKUP[platform]
+        self.dat_cache_file = f"{DAT_CACHE_FOLDER}/{platform}.pickle"
+
+        # Parsing the XML is slow, only do it when the DAT has changed
+        if not self._load_dat_cache():
+            self._build_indexes(self._parse_dat_file(self.dat_file))
+            self._save_dat_cache()
+
+    def _dat_file_sha1(self) -> str:
+        h = hashlib.sha1()
+        with open(self.dat_file, "rb") as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def _load_dat_cache(self) -> bool:
+        # The cache file is a small header followed by the indexes, so the header can
+        # be checked without loading the rest
+        if not os.path.isfile(self.dat_cache_file):
+            return False
+
+        dat_stat = os.stat(self.dat_file)
+        with open(self.dat_cache_file, "rb") as cache:
+            try:
+                header = pickle.load(cache)
+            except Exception:
+                return False
+            if header.get("version") != DAT_CACHE_VERSION:
+                return False
+
+            # If the DAT was touched, it still might be the same file
+            touched = (header["mtime_ns"], header["size"]) != (
+                dat_stat.st_mtime_ns,
+                dat_stat.st_size,
+            )
+            if touched and header["sha1"] != self._dat_file_sha1():
+                return False
+
+            for attribute, value in zip(DAT_CACHE_ATTRIBUTES, pickle.load(cache)):
+                setattr(self, attribute, value)
+
+        # Record the new mtime so the DAT doesn't get hashed every time
+        if touched:
+            self._save_dat_cache()
+        return True
+
+    def _save_dat_cache(self) -> None:
+        dat_stat = os.stat(self.dat_file)
+        header = {
+            "version": DAT_CACHE_VERSION,
+            "mtime_ns": dat_stat.st_mtime_ns,
+            "size": dat_stat.st_size,
+            "sha1": self._dat_file_sha1(),
+        }
+
+        # Write to a temp file and swap it in, so a crash never leaves half a cache
+        os.makedirs(DAT_CACHE_FOLDER, exist_ok=True)
+        temp_cache_file = f"{self.dat_cache_file}.{os.getpid()}.tmp"
+        with open(temp_cache_file, "wb") as cache:
+            pickle.dump(header, cache, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(
+                [getattr(self, attribute) for attribute in DAT_CACHE_ATTRIBUTES],
+                cache,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(temp_cache_file, self.dat_cache_file)
+        return
 
     @staticmethod
     def platform_available(platform: str) -> bool:
         return platform in PLATFORM_LOOKUP.keys()
 
-    def get_game_info_from_dat(self, hash, dat):
-        for game in dat["datafile"]["game"]:
+    @staticmethod
+    def _parse_dat_file(dat_file: str):
+        with open(dat_file) as df:
+            return xmltodict.parse(df.read())
+
+    @staticmethod
+    def _iter_dat_roms(dat):
+        # (rom, result) for every rom in the DAT, in DAT order. For games with several
+        # roms the matching rom itself is the result, otherwise it's the whole game.
+        games = dat["datafile"]["game"]
+        if isinstance(games, dict):
+            games = [games]
+        for game in games:
             if isinstance(game["rom"], list):
                 for curr_file in game["rom"]:
-                    if curr_file.get("@md5", "").upper() == hash.upper():
-                        return curr_file
+                    yield curr_file, curr_file
             elif isinstance(game["rom"], dict):
-                curr_file = game["rom"]
-                if curr_file.get("@md5", "").upper() == hash.upper():
-                    return game
+                yield game["rom"], game
+
+    @staticmethod
+    def _get_result_rom(result):
+        # The rom a result was found from (the result itself for games with several
+        # roms, see _iter_dat_roms)
+        if isinstance(result.get("rom"), dict):
+            return result["rom"]
+        return result
+
+    def _build_indexes(self, dat) -> None:
+        # Hash -> result lookups, so identifying a ROM doesn't have to walk the whole
+        # DAT. The first entry in the DAT wins, the same as a scan through it would.
+        self.md5_index = {}
+        self.sha1_index = {}
+        self.crc_index = {}
+        self.crc_roms = {}
+        self.all_crcs_known = True
+        self.rom_sizes = set()
+        self.all_rom_sizes_known = True
+        for curr_file, result in self._iter_dat_roms(dat):
+            for key, index in (
+                ("@md5", self.md5_index),
+                ("@sha1", self.sha1_index),
+                ("@crc", self.crc_index),
+            ):
+                value = curr_file.get(key)
+                if value:
+                    index.setdefault(value.upper(), result)
+
+            size = curr_file.get("@size")
+            if size is None:
+                self.all_rom_sizes_known = False
+            else:
+                self.rom_sizes.add(int(size))
+
+            # The different roms sharing each CRC, to know when the CRC is enough
+            crc = curr_file.get("@crc")
+            if crc:
+                self.crc_roms.setdefault(crc.upper(), set()).add(
+                    (
+                        None if size is None else int(size),
+                        curr_file.get("@md5", "").upper(),
+                        curr_file.get("@sha1", "").upper(),
+                    )
+                )
+            else:
+                self.all_crcs_known = False
         return
 
-    def get_game_info_from_filename(self, full_filename_path):
-        # TODO: Handle zip files
-        offset = 0
+    def size_available(self, size: int) -> bool:
+        # False when no ROM in the DAT has this size (so hashing it is pointless)
+        return not self.all_rom_sizes_known or size in self.rom_sizes
 
-        # Nes roms
-        if full_filename_path.endswith(".nes") and self.platform == "nes":
-            offset = 16  # 16
+    def get_game_info_from_crc(self, crc: str, size: int):
+        # Identify a ROM from its CRC and size alone (ie: from a zip's central
+        # directory). Returns (known, result), known is False when the CRC can't
+        # tell the roms in the DAT apart and the ROM has to be hashed instead.
+        crc = crc.upper()
+        crc_roms = self.crc_roms.get(crc)
+        if crc_roms is None:
+            # Every rom in the DAT has a CRC, so nothing else can match either
+            return self.all_crcs_known, None
+        if len(crc_roms) == 1 and next(iter(crc_roms))[0] == size:
+            return True, self.crc_index[crc]
+        return False, None
 
-        # Super Nintendo roms
-        if (
-            full_filename_path.endswith(".sfc")
-            or full_filename_path.endswith(".smc")
+    def get_game_info_from_hashes(self, md5=None, sha1=None, crc=None, size=None):
+        for hash, index in (
+            (md5, self.md5_index),
+            (sha1, self.sha1_index),
+        ):
+            if hash is not None:
+                result = index.get(hash.upper())
+                if result is not None:
+                    return result
+
+        # A CRC on its own is only trusted when the size matches too, a 32-bit CRC
+        # can collide across a big DAT
+        if crc is None or size is None:
+            return
+        crc = crc.upper()
+        result = self.crc_index.get(crc)
+        if result is None or self._get_result_rom(result).get("@size") == str(size):
+            return result
+        # Another rom in the DAT with the same CRC might have the right size
+        for _, rom_md5, rom_sha1 in sorted(
+            rom for rom in self.crc_roms[crc] if rom[0] == size
+        ):
+            result = self.md5_index.get(rom_md5) or self.sha1_index.get(rom_sha1)
+            if result is not None:
+                return result
+        return
+
+    def get_game_info_from_dat(self, hash, dat=None):
+        # Without a dat, look the md5 up in this platform's DAT
+        if dat is None:
+            return self.md5_index.get(hash.upper())
+
+        for curr_file, result in self._iter_dat_roms(dat):
+            if curr_file.get("@md5", "").upper() == hash.upper():
+                return result
+        return
+
+    def _may_have_header(self, rom_name: str) -> bool:
+        # Nes roms (iNES header) and Super Nintendo roms (copier header)
+        return (rom_name.endswith(".nes") and self.platform == "nes") or (
+            (rom_name.endswith(".sfc") or rom_name.endswith(".smc"))
             and self.platform == "snes"
+        )
+
+    def _get_file_header_offset(self, full_filename_path) -> int:
+        # Where to start hashing the file from, to skip any header
+        if not self._may_have_header(full_filename_path):
+            return 0
+        return get_file_header_size(self.platform, full_filename_path)
+
+    def _file_size_available(self, full_filename_path, offset: int) -> bool:
+        # False when nothing in the DAT is the size of the file (without its header),
+        # so hashing it is pointless
+        rom_size = max(os.path.getsize(full_filename_path) - offset, 0)
+        return self.size_available(rom_size)
+
+    def _get_zip_member_hash_offset(
+        self, zip_ref: zipfile.ZipFile, member: zipfile.ZipInfo
+    ) -> int:
+        if not self._may_have_header(member.filename):
+            return 0
+        with zip_ref.open(member) as rom:
+            first_bytes = rom.read(len(INES_MAGIC))
+        return get_header_size(self.platform, first_bytes, member.file_size)
+
+    def _check_zip_member(self, member: zipfile.ZipInfo, offset: int):
+        # (needs hashing, game) for a zip member with its header offset, using only
+        # what's in the zip's central directory
+        #
+        # Nothing in the DAT is this size, don't bother decompressing it
+        rom_size = max(member.file_size - offset, 0)
+        if not self.size_available(rom_size):
+            return False, None
+
+        # The zip already has the CRC of the whole member, which is usually enough
+        # (but it also covers the header, if there is one)
+        if offset == 0:
+            known, game_no_intro = self.get_game_info_from_crc(
+                f"{member.CRC:08X}", rom_size
+            )
+            if known:
+                return False, game_no_intro
+        return True, None
+
+    def get_hash_jobs(self, full_filename_path) -> list[tuple[str, str, int, int]]:
+        # What get_game_info_from_filename would have to hash for this file, as
+        # (path, zip member or "", header offset, size), so it can be hashed ahead of
+        # time (see prehash_files). Nothing for files that are already in the
+        # fingerprint cache or don't need hashing.
+        fingerprint_cache = get_rom_fingerprint_cache()
+        if zipfile.is_zipfile(full_filename_path):
+            jobs = []
+            with zipfile.ZipFile(full_filename_path, "r") as zip_ref:
+                for member in zip_ref.infolist():
+                    if member.is_dir():
+                        continue
+                    offset = self._get_zip_member_hash_offset(zip_ref, member)
+                    if fingerprint_cache.get(
+                        full_filename_path, offset=offset, member=member.filename
+                    ):
+                        continue
+                    needs_hashing, _ = self._check_zip_member(member, offset)
+                    if needs_hashing:
+                        jobs.append(
+                            (
+                                full_filename_path,
+                                member.filename,
+                                offset,
+                                member.file_size,
+                            )
+                        )
+            return jobs
+
+        offset = self._get_file_header_offset(full_filename_path)
+        if fingerprint_cache.get(full_filename_path, offset=offset) is not None:
+            return []
+        if not self._file_size_available(full_filename_path, offset):
+            return []
+        return [(full_filename_path, "", offset, os.path.getsize(full_filename_path))]
+
+    def prehash_files(self, full_filename_paths: list[str], max_workers: int) -> None:
+        # Hash everything get_game_info_from_filename is going to need on a pool of
+        # processes, the results go in the fingerprint cache where it'll find them
+        jobs = []
+        for full_filename_path in full_filename_paths:
+            jobs.extend(self.get_hash_jobs(full_filename_path))
+        if len(jobs) == 0:
+            return
+
+        print(f"Hashing {len(jobs):,} ROMs with {max_workers} workers")
+        fingerprint_cache = get_rom_fingerprint_cache()
+        for (path, member, offset, _), hashes in hash_roms_in_parallel(
+            jobs, max_workers
         ):
-            offset = 0
+            fingerprint_cache.put(path, hashes, offset=offset, member=member)
+        return
+
+    def get_rom_crcs(
+        self, full_filename_path, sizes: set[Union[int, None]]
+    ) -> list[tuple[str, int]]:
+        # (CRC, size) of the ROM, or of every member of a zip, skipping the ones whose
+        # size isn't in sizes (None in sizes means any size). Zip members without a
+        # header come straight from the zip's central directory, everything else
+        # from the fingerprint cache.
+        fingerprint_cache = get_rom_fingerprint_cache()
+        if zipfile.is_zipfile(full_filename_path):
+            rom_crcs = []
+            with zipfile.ZipFile(full_filename_path, "r") as zip_ref:
+                for member in zip_ref.infolist():
+                    if member.is_dir():
+                        continue
+                    offset = self._get_zip_member_hash_offset(zip_ref, member)
+                    rom_size = max(member.file_size - offset, 0)
+                    if None not in sizes and rom_size not in sizes:
+                        continue
+                    if offset == 0:
+                        rom_crcs.append((f"{member.CRC:08X}", rom_size))
+                        continue
+
+                    hashes = fingerprint_cache.get(
+                        full_filename_path, offset=offset, member=member.filename
+                    )
+                    if hashes is None:
+                        with zip_ref.open(member) as rom:
+                            hashes = hash_stream(rom, offset=offset)
+                        fingerprint_cache.put(
+                            full_filename_path,
+                            hashes,
+                            offset=offset,
+                            member=member.filename,
+                        )
+                    rom_crcs.append((hashes["crc"].upper(), rom_size))
+            return rom_crcs
+
+        offset = self._get_file_header_offset(full_filename_path)
+        rom_size = max(os.path.getsize(full_filename_path) - offset, 0)
+        if None not in sizes and rom_size not in sizes:
+            return []
+        hashes = fingerprint_cache.hash_file(full_filename_path, offset=offset)
+        return [(hashes["crc"].upper(), rom_size)]
+
+    def get_game_info_from_filename(self, full_filename_path):
+        if zipfile.is_zipfile(full_filename_path):
+            return self.get_game_info_from_zip(full_filename_path)
+
+        # Only read the file if it changed since the last time it got hashed
+        fingerprint_cache = get_rom_fingerprint_cache()
+        offset = self._get_file_header_offset(full_filename_path)
+        hashes = fingerprint_cache.get(full_filename_path, offset=offset)
+        if hashes is None:
+            # Nothing in the DAT is this size, don't bother hashing it
+            if not self._file_size_available(full_filename_path, offset):
+                return None
 
-        hash = self.md5sum(
-            full_filename_path, offset
-        ).upper()  # no-intro dats checksums are uppercase
+            hashes = hash_file(full_filename_path, offset=offset)
+            fingerprint_cache.put(full_filename_path, hashes, offset=offset)
 
         # Get game name by hash
-        game_no_intro = self.get_game_info_from_dat(hash, self.no_intro_dat_file)
+        game_no_intro = self.get_game_info_from_hashes(
+            md5=hashes["md5"],
+            sha1=hashes["sha1"],
+            crc=hashes["crc"],
+            size=hashes["size"],
+        )
 
         result = game_no_intro
         return result
 
+    def get_game_info_from_zip(self, full_filename_path):
+        # First member of the zip that's in the DAT
+        with zipfile.ZipFile(full_filename_path, "r") as zip_ref:
+            for member in zip_ref.infolist():
+                if member.is_dir():
+                    continue
+                game_no_intro = self._get_game_info_from_zip_member(zip_ref, member)
+                if game_no_intro is not None:
+                    return game_no_intro
+        return None
+
+    def _get_game_info_from_zip_member(
+        self, zip_ref: zipfile.ZipFile, member: zipfile.ZipInfo
+    ):
+        # Hashed before (and the zip hasn't changed since)
+        fingerprint_cache = get_rom_fingerprint_cache()
+        offset = self._get_zip_member_hash_offset(zip_ref, member)
+        hashes = fingerprint_cache.get(
+            zip_ref.filename, offset=offset, member=member.filename
+        )
+        if hashes is None:
+            needs_hashing, game_no_intro = self._check_zip_member(member, offset)
+            if not needs_hashing:
+                return game_no_intro
+
+            # Decompress and hash it, without writing it anywhere
+            with zip_ref.open(member) as rom:
+                hashes = hash_stream(rom, offset=offset)
+            fingerprint_cache.put(
+                zip_ref.filename, hashes, offset=offset, member=member.filename
+            )
+
+        return self.get_game_info_from_hashes(
+            md5=hashes["md5"],
+            sha1=hashes["sha1"],
+            crc=hashes["crc"],
+            size=hashes["size"],
+        )
+
     @staticmethod
     def get_regular_name_from_no_intro(no_intro_game):
         game_name = None
         if no_intro_game is not None:
             game_name = no_intro_game["@name"]
-            all_reg_ex = [
-                REG_EX_COUNTRIES,
-                REG_EX_LANG,
-                REG_EX_DATE,
-                REG_EX_EXTRAS,
-                REG_EX_PS3,
-                REG_EX_SWITCH_GAME_ID,
-                REG_EX_SWITCH_GAME_VER,
-                REG_EX_SWITCH_GAME_SIZE,
-                REG_EX_SWITCH_REGION,
-                REG_EX_WII_U_ID,
-                REG_EX_VERSION,
-            ]
-
-            for replacement in all_reg_ex:
-                game_name = re.sub(replacement, "", game_name)
-            if ", The" in game_name:
-                game_name = "The " + game_name.replace(", The", "")
+            game_name = clean_no_intro_name(game_name)
         return game_name
-
-    def md5sum(self, filename, offset):
-        h = hashlib.md5()
-        with open(filename, "rb") as file:
-            if offset > 0:
-                file.read(offset)  # read files with an offset, for iNES roms etc
-            chunk = 0
-            while chunk != b"":
-                chunk = file.read(1024)
-                h.update(chunk)
-        return h.hexdigest()
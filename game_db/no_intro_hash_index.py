@@ -0,0 +1,392 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zipfile
+from typing import Any, Union
+from xml.etree import ElementTree
+
+from game_db.no_intro_db import PLATFORM_LOOKUP
+from game_db.rom_fingerprint_cache import get_rom_fingerprint_cache
+from game_db.rom_hasher import (
+    INES_MAGIC,
+    get_file_header_size,
+    get_header_size,
+    hash_stream,
+)
+
+HASH_INDEX_DB_FILE = f"{os.path.dirname(__file__)}/../database/no_intro_hashes.db"
+
+# Platform to check headers for, by ROM extension (see rom_hasher.get_header_size)
+HEADER_PLATFORMS = {
+    ".nes": "nes",
+    ".sfc": "snes",
+    ".smc": "snes",
+}
+
+ROM_HASH_COLUMNS = [
+    "dat_file_id",
+    "position",
+    "game_name",
+    "rom_name",
+    "size",
+    "crc",
+    "md5",
+    "sha1",
+]
+
+
+def iter_dat_roms(dat_file: str):
+    # (game name, rom attributes) for every rom in the DAT, without keeping the whole
+    # DAT in memory
+    context = ElementTree.iterparse(dat_file, events=("start", "end"))
+    _, root = next(context)
+    depth = 0
+    for event, element in context:
+        if event == "start":
+            depth += 1
+            continue
+        depth -= 1
+        if depth == 0:
+            if element.tag == "game":
+                for rom in element.iter("rom"):
+                    yield element.get("name"), rom.attrib
+            root.clear()
+
+
+class NoIntroHashIndex:
+    # One hash index over every DAT in PLATFORM_LOOKUP, so a ROM can be identified
+    # whichever folder (platform) it ended up in.
+    #
+    # The roms of all the DATs live in a sqlite table indexed by md5, sha1 and
+    # crc/size, so looking a ROM up doesn't need any DAT in memory. A DAT only gets
+    # (re)loaded when it changes (mtime/size, then sha1), DATs that are no longer in
+    # PLATFORM_LOOKUP get dropped.
+    def __init__(self, db_file: str = HASH_INDEX_DB_FILE) -> None:
+        # Used from the identification threads
+        self.engine = sqlite3.connect(db_file, timeout=60, check_same_thread=False)
+        self._cursor = self.engine.cursor()
+        self._lock = threading.Lock()
+        self._cursor.execute("PRAGMA journal_mode = WAL")
+        self._cursor.execute("PRAGMA synchronous = NORMAL")
+        self._create_tables()
+
+        # DAT file -> the platforms using it (some DATs are used by a few)
+        self.dat_platforms = {}
+        for platform, dat_file in PLATFORM_LOOKUP.items():
+            self.dat_platforms.setdefault(dat_file, []).append(platform)
+        return
+
+    def __del__(self) -> None:
+        self.engine.commit()
+        self._cursor.close()
+        self.engine.close()
+        return
+
+    def _create_tables(self) -> None:
+        self._cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS dat_file (
+                dat_file_id INTEGER PRIMARY KEY,
+                path TEXT NOT NULL UNIQUE,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                sha1 TEXT NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+        self._cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS rom_hash (
+                dat_file_id INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                game_name TEXT NOT NULL,
+                rom_name TEXT,
+                size INTEGER,
+                crc TEXT,
+                md5 TEXT,
+                sha1 TEXT
+            )
+            """
+        )
+        self._cursor.execute(
+            "CREATE INDEX IF NOT EXISTS rom_hash_md5_idx ON rom_hash (md5)"
+        )
+        self._cursor.execute(
+            "CREATE INDEX IF NOT EXISTS rom_hash_sha1_idx ON rom_hash (sha1)"
+        )
+        self._cursor.execute(
+            "CREATE INDEX IF NOT EXISTS rom_hash_crc_size_idx ON rom_hash (crc, size)"
+        )
+        self._cursor.execute(
+            "CREATE INDEX IF NOT EXISTS rom_hash_size_idx ON rom_hash (size)"
+        )
+        self._cursor.execute(
+            """
+            CREATE INDEX IF NOT EXISTS rom_hash_dat_file_id_idx ON
+                rom_hash (dat_file_id)
+            """
+        )
+        self.engine.commit()
+        return
+
+    @staticmethod
+    def _file_sha1(file_path: str) -> str:
+        h = hashlib.sha1()
+        with open(file_path, "rb") as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def update(self) -> None:
+        # Bring the index up to date with the DATs in PLATFORM_LOOKUP
+        with self._lock:
+            known_dats = {
+                path: (dat_file_id, mtime_ns, size, sha1)
+                for dat_file_id, path, mtime_ns, size, sha1 in self._cursor.execute(
+                    "SELECT dat_file_id, path, mtime_ns, size, sha1 FROM dat_file"
+                ).fetchall()
+            }
+
+            # DATs nobody uses any more
+            for path, (dat_file_id, _, _, _) in known_dats.items():
+                if path not in self.dat_platforms:
+                    self._remove_dat(dat_file_id)
+
+            # New and changed DATs (missing ones are kept, ie: the NAS is offline)
+            for path in self.dat_platforms.keys():
+                if not os.path.isfile(path):
+                    continue
+                dat_stat = os.stat(path)
+                known_dat = known_dats.get(path)
+                if known_dat is not None:
+                    dat_file_id, mtime_ns, size, sha1 = known_dat
+                    if (mtime_ns, size) == (dat_stat.st_mtime_ns, dat_stat.st_size):
+                        continue
+                    dat_sha1 = self._file_sha1(path)
+                    if dat_sha1 == sha1:
+                        self._cursor.execute(
+                            "UPDATE dat_file SET mtime_ns = ?, size = ? "
+                            "WHERE dat_file_id = ?",
+                            (dat_stat.st_mtime_ns, dat_stat.st_size, dat_file_id),
+                        )
+                        continue
+                    self._remove_dat(dat_file_id)
+                self._load_dat(path, dat_stat)
+            self.engine.commit()
+        return
+
+    def _remove_dat(self, dat_file_id: int) -> None:
+        self._cursor.execute(
+            "DELETE FROM rom_hash WHERE dat_file_id = ?", (dat_file_id,)
+        )
+        self._cursor.execute(
+            "DELETE FROM dat_file WHERE dat_file_id = ?", (dat_file_id,)
+        )
+        return
+
+    def _load_dat(self, path: str, dat_stat: os.stat_result) -> None:
+        start_time = time.perf_counter()
+        self._cursor.execute(
+            "INSERT INTO dat_file (path, mtime_ns, size, sha1) VALUES (?, ?, ?, ?)",
+            (path, dat_stat.st_mtime_ns, dat_stat.st_size, self._file_sha1(path)),
+        )
+        dat_file_id = self._cursor.lastrowid
+
+        rows = []
+        for position, (game_name, rom) in enumerate(iter_dat_roms(path)):
+            size = rom.get("size")
+            rows.append(
+                (
+                    dat_file_id,
+                    position,
+                    game_name,
+                    rom.get("name"),
+                    None if size is None else int(size),
+                    (rom.get("crc") or "").upper() or None,
+                    (rom.get("md5") or "").upper() or None,
+                    (rom.get("sha1") or "").upper() or None,
+                )
+            )
+        self._cursor.executemany(
+            f"""
+            INSERT INTO rom_hash ({", ".join(ROM_HASH_COLUMNS)})
+            VALUES ({", ".join("?" * len(ROM_HASH_COLUMNS))})
+            """,
+            rows,
+        )
+        elapsed = time.perf_counter() - start_time
+        print(
+            f"No-Intro hash index: {os.path.basename(path)} - {len(rows):,} roms in {elapsed:.1f}s"
+        )
+        return
+
+    def _get_matches(self, where: str, values: tuple) -> list[dict[str, Any]]:
+        with self._lock:
+            rows = self._cursor.execute(
+                f"""
+                SELECT dat_file.path, rom_hash.game_name, rom_hash.rom_name,
+                    rom_hash.size, rom_hash.crc, rom_hash.md5, rom_hash.sha1
+                FROM rom_hash
+                JOIN dat_file ON dat_file.dat_file_id = rom_hash.dat_file_id
+                WHERE {where}
+                ORDER BY dat_file.path, rom_hash.position
+                """,
+                values,
+            ).fetchall()
+
+        matches = []
+        for path, game_name, rom_name, size, crc, md5, sha1 in rows:
+            matches.append(
+                {
+                    "platforms": self.dat_platforms.get(path, []),
+                    "dat_file": path,
+                    "game_name": game_name,
+                    "rom_name": rom_name,
+                    "size": size,
+                    "crc": crc,
+                    "md5": md5,
+                    "sha1": sha1,
+                }
+            )
+        return matches
+
+    def find(
+        self,
+        md5: Union[str, None] = None,
+        sha1: Union[str, None] = None,
+        crc: Union[str, None] = None,
+        size: Union[int, None] = None,
+    ) -> list[dict[str, Any]]:
+        # Every rom (in any DAT) with these hashes. A CRC on its own is only used
+        # together with the size.
+        if md5 is not None:
+            matches = self._get_matches("rom_hash.md5 = ?", (md5.upper(),))
+            if len(matches) > 0:
+                return matches
+        if sha1 is not None:
+            matches = self._get_matches("rom_hash.sha1 = ?", (sha1.upper(),))
+            if len(matches) > 0:
+                return matches
+        if crc is not None and size is not None:
+            return self._get_matches(
+                "rom_hash.crc = ? AND rom_hash.size = ?", (crc.upper(), size)
+            )
+        return []
+
+    def size_available(self, size: int) -> bool:
+        # Whether any rom (in any DAT) could have this size, roms without a size in
+        # their DAT could be any. Saves hashing files that can't match anything.
+        with self._lock:
+            row = self._cursor.execute(
+                "SELECT 1 FROM rom_hash WHERE size = ? OR size IS NULL LIMIT 1",
+                (size,),
+            ).fetchone()
+        return row is not None
+
+    @staticmethod
+    def _prefer_platform(
+        matches: list[dict[str, Any]], platform: Union[str, None]
+    ) -> Union[dict[str, Any], None]:
+        if len(matches) == 0:
+            return None
+        for match in matches:
+            if platform in match["platforms"]:
+                return match
+        return matches[0]
+
+    def identify_file(
+        self, full_filename_path: str, platform: Union[str, None] = None
+    ) -> Union[dict[str, Any], None]:
+        # Best match for a ROM file (or the first member of a zip that matches) in any
+        # DAT, the given platform's DAT wins when the ROM is in a few of them
+        if zipfile.is_zipfile(full_filename_path):
+            with zipfile.ZipFile(full_filename_path, "r") as zip_ref:
+                for member in zip_ref.infolist():
+                    if member.is_dir():
+                        continue
+                    match = self._identify_zip_member(zip_ref, member, platform)
+                    if match is not None:
+                        return match
+            return None
+
+        header_platform = HEADER_PLATFORMS.get(
+            os.path.splitext(full_filename_path)[1].lower()
+        )
+        offset = 0
+        if header_platform is not None:
+            offset = get_file_header_size(header_platform, full_filename_path)
+        rom_size = max(os.path.getsize(full_filename_path) - offset, 0)
+        if not self.size_available(rom_size):
+            return None
+        hashes = get_rom_fingerprint_cache().hash_file(
+            full_filename_path, offset=offset
+        )
+        return self._prefer_platform(
+            self.find(md5=hashes["md5"], sha1=hashes["sha1"]), platform
+        )
+
+    def _identify_zip_member(
+        self,
+        zip_ref: zipfile.ZipFile,
+        member: zipfile.ZipInfo,
+        platform: Union[str, None],
+    ) -> Union[dict[str, Any], None]:
+        header_platform = HEADER_PLATFORMS.get(
+            os.path.splitext(member.filename)[1].lower()
+        )
+        offset = 0
+        if header_platform is not None:
+            with zip_ref.open(member) as rom:
+                first_bytes = rom.read(len(INES_MAGIC))
+            offset = get_header_size(header_platform, first_bytes, member.file_size)
+
+        fingerprint_cache = get_rom_fingerprint_cache()
+        hashes = fingerprint_cache.get(
+            zip_ref.filename, offset=offset, member=member.filename
+        )
+        if hashes is None:
+            rom_size = max(member.file_size - offset, 0)
+            if not self.size_available(rom_size):
+                return None
+
+            # The CRC in the zip is enough when it only matches one rom
+            if offset == 0:
+                matches = self.find(crc=f"{member.CRC:08X}", size=member.file_size)
+                if len(matches) == 0:
+                    return None
+                if len({match["md5"] for match in matches}) == 1:
+                    return self._prefer_platform(matches, platform)
+
+            with zip_ref.open(member) as rom:
+                hashes = hash_stream(rom, offset=offset)
+            fingerprint_cache.put(
+                zip_ref.filename, hashes, offset=offset, member=member.filename
+            )
+
+        return self._prefer_platform(
+            self.find(md5=hashes["md5"], sha1=hashes["sha1"]), platform
+        )
+
+
+_no_intro_hash_index: Union[NoIntroHashIndex, None] = None
+_no_intro_hash_index_pid = None
+_no_intro_hash_index_lock = threading.Lock()
+
+# See rom_fingerprint_cache, a forked worker mustn't touch its parent's connection
+_inherited_no_intro_hash_indexes = []
+
+
+def get_no_intro_hash_index() -> NoIntroHashIndex:
+    # One index (and sqlite connection) per process, brought up to date when opened
+    global _no_intro_hash_index, _no_intro_hash_index_pid
+    with _no_intro_hash_index_lock:
+        if _no_intro_hash_index_pid != os.getpid():
+            if _no_intro_hash_index is not None:
+                _inherited_no_intro_hash_indexes.append(_no_intro_hash_index)
+            _no_intro_hash_index = NoIntroHashIndex()
+            _no_intro_hash_index.update()
+            _no_intro_hash_index_pid = os.getpid()
+        return _no_intro_hash_index
@@ -0,0 +1,158 @@
+import os
+import sqlite3
+import threading
+from typing import Any, Union
+
+from game_db.rom_hasher import ALL_DIGESTS, hash_file
+
+FINGERPRINT_DB_FILE = f"{os.path.dirname(__file__)}/../database/rom_fingerprints.db"
+
+
+class RomFingerprintCache:
+    # Remembers the digests of every ROM we've hashed, so a re-run over an unchanged
+    # library doesn't have to read the files again.
+    #
+    # Entries are keyed on the path (and the member, for files inside a zip) and are
+    # only used while the file's size, mtime and inode are still the same, anything
+    # else means the file changed and it gets hashed (and stored) again.
+    def __init__(self, db_file: str = FINGERPRINT_DB_FILE) -> None:
+        # Used from the identification threads and shared with other processes
+        self.engine = sqlite3.connect(db_file, timeout=60, check_same_thread=False)
+        self._cursor = self.engine.cursor()
+        self._lock = threading.Lock()
+        self._cursor.execute("PRAGMA journal_mode = WAL")
+        self._cursor.execute("PRAGMA synchronous = NORMAL")
+        self._create_tables()
+        return
+
+    def __del__(self) -> None:
+        self.engine.commit()
+        self._cursor.close()
+        self.engine.close()
+        return
+
+    def _create_tables(self) -> None:
+        self._cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS rom_fingerprint (
+                path TEXT NOT NULL,
+                member TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                header_offset INTEGER NOT NULL,
+                rom_size INTEGER NOT NULL,
+                crc TEXT NOT NULL,
+                md5 TEXT NOT NULL,
+                sha1 TEXT NOT NULL,
+                PRIMARY KEY (path, member)
+            )
+            """
+        )
+        self.engine.commit()
+        return
+
+    @staticmethod
+    def _file_key(path: str) -> tuple[str, int, int, int]:
+        path_stat = os.stat(path)
+        return (
+            os.path.abspath(path),
+            path_stat.st_size,
+            path_stat.st_mtime_ns,
+            path_stat.st_ino,
+        )
+
+    def get(
+        self, path: str, offset: int = 0, member: str = ""
+    ) -> Union[dict[str, Any], None]:
+        # The stored digests, as long as the file hasn't changed since and they were
+        # hashed from the same header offset
+        path, size, mtime_ns, inode = self._file_key(path)
+        with self._lock:
+            row = self._cursor.execute(
+                """
+                SELECT header_offset, rom_size, crc, md5, sha1
+                FROM rom_fingerprint
+                WHERE path = ? AND member = ? AND size = ? AND mtime_ns = ?
+                    AND inode = ? AND header_offset = ?
+                """,
+                (path, member, size, mtime_ns, inode, offset),
+            ).fetchone()
+        if row is None:
+            return None
+        header_offset, rom_size, crc, md5, sha1 = row
+        return {
+            "offset": header_offset,
+            "size": rom_size,
+            "crc": crc,
+            "md5": md5,
+            "sha1": sha1,
+        }
+
+    def put(
+        self,
+        path: str,
+        hashes: dict[str, Any],
+        offset: int = 0,
+        member: str = "",
+    ) -> None:
+        # hashes needs all the digests (see rom_hasher.hash_file)
+        path, size, mtime_ns, inode = self._file_key(path)
+        with self._lock:
+            self._cursor.execute(
+                """
+                INSERT OR REPLACE INTO rom_fingerprint (
+                    path, member, size, mtime_ns, inode, header_offset, rom_size,
+                    crc, md5, sha1
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    path,
+                    member,
+                    size,
+                    mtime_ns,
+                    inode,
+                    offset,
+                    hashes["size"],
+                    hashes["crc"],
+                    hashes["md5"],
+                    hashes["sha1"],
+                ),
+            )
+            # Commit right away, worker processes don't get to run any cleanup
+            self.engine.commit()
+        return
+
+    def hash_file(
+        self, path: str, offset: int = 0, report: bool = False
+    ) -> dict[str, Any]:
+        # rom_hasher.hash_file, but only reading the file if it changed
+        hashes = self.get(path, offset=offset)
+        if hashes is not None:
+            return hashes
+
+        hashes = hash_file(path, offset=offset, digests=ALL_DIGESTS, report=report)
+        self.put(path, hashes, offset=offset)
+        hashes["offset"] = offset
+        return hashes
+
+
+_rom_fingerprint_cache: Union[RomFingerprintCache, None] = None
+_rom_fingerprint_cache_pid = None
+_rom_fingerprint_cache_lock = threading.Lock()
+
+# A forked worker must neither use nor close the connection it inherited from its
+# parent (closing it could checkpoint the parent's WAL), so it's just kept alive here
+_inherited_rom_fingerprint_caches = []
+
+
+def get_rom_fingerprint_cache() -> RomFingerprintCache:
+    # One cache (and sqlite connection) per process
+    global _rom_fingerprint_cache, _rom_fingerprint_cache_pid
+    with _rom_fingerprint_cache_lock:
+        if _rom_fingerprint_cache_pid != os.getpid():
+            if _rom_fingerprint_cache is not None:
+                _inherited_rom_fingerprint_caches.append(_rom_fingerprint_cache)
+            _rom_fingerprint_cache = RomFingerprintCache()
+            _rom_fingerprint_cache_pid = os.getpid()
+        return _rom_fingerprint_cache
@@ -0,0 +1,175 @@
+import hashlib
+import os
+import threading
+import time
+import zipfile
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import IO, Iterator, Union
+
+# Read size for hashing, big enough to keep the disk busy and the per read overhead low
+BUFFER_SIZE = 8 * 1024 * 1024
+
+ALL_DIGESTS = ("crc", "md5", "sha1")
+
+# Headers that aren't part of the ROM data the DATs are checksummed against
+INES_MAGIC = b"NES\x1a"
+INES_HEADER_SIZE = 16
+SMC_HEADER_SIZE = 512
+
+# One read buffer per thread, reused for every file that thread hashes
+_buffers = threading.local()
+
+
+def _get_buffer() -> memoryview:
+    buffer = getattr(_buffers, "buffer", None)
+    if buffer is None:
+        buffer = memoryview(bytearray(BUFFER_SIZE))
+        _buffers.buffer = buffer
+    return buffer
+
+
+def get_header_size(platform: str, first_bytes: bytes, size: int) -> int:
+    # iNES roms start with "NES<EOF>" followed by the rest of the 16 byte header
+    if platform == "nes" and first_bytes[: len(INES_MAGIC)] == INES_MAGIC:
+        return INES_HEADER_SIZE
+
+    # Copier headers make SNES roms 512 bytes longer than a multiple of 1 KiB
+    if platform == "snes" and size % 1024 == SMC_HEADER_SIZE:
+        return SMC_HEADER_SIZE
+    return 0
+
+
+def get_file_header_size(platform: str, filename: str) -> int:
+    with open(filename, "rb") as file:
+        first_bytes = file.read(len(INES_MAGIC))
+    return get_header_size(platform, first_bytes, os.path.getsize(filename))
+
+
+def hash_stream(
+    stream: IO[bytes],
+    offset: int = 0,
+    digests: tuple[str, ...] = ALL_DIGESTS,
+) -> dict[str, Union[str, int]]:
+    # CRC32, MD5 and SHA1 (or any of them) of everything after the offset, in a
+    # single pass over the data
+    crc = 0 if "crc" in digests else None
+    md5 = hashlib.md5() if "md5" in digests else None
+    sha1 = hashlib.sha1() if "sha1" in digests else None
+
+    if offset > 0:
+        stream.read(offset)  # read files with an offset, for iNES roms etc
+
+    buffer = _get_buffer()
+    size = 0
+    while True:
+        bytes_read = stream.readinto(buffer)
+        if not bytes_read:
+            break
+        chunk = buffer[:bytes_read]
+        size += bytes_read
+        if crc is not None:
+            crc = zlib.crc32(chunk, crc)
+        if md5 is not None:
+            md5.update(chunk)
+        if sha1 is not None:
+            sha1.update(chunk)
+
+    hashes = {"size": size}
+    if crc is not None:
+        hashes["crc"] = f"{crc:08x}"
+    if md5 is not None:
+        hashes["md5"] = md5.hexdigest()
+    if sha1 is not None:
+        hashes["sha1"] = sha1.hexdigest()
+    return hashes
+
+
+def hash_file(
+    filename: str,
+    offset: int = 0,
+    digests: tuple[str, ...] = ALL_DIGESTS,
+    report: bool = False,
+) -> dict[str, Union[str, int]]:
+    start_time = time.perf_counter()
+    with open(filename, "rb", buffering=0) as file:
+        hashes = hash_stream(file, offset=offset, digests=digests)
+
+    if report:
+        report_hash_rate(filename, hashes["size"], start_time)
+    return hashes
+
+
+def report_hash_rate(filename: str, size: int, start_time: float) -> None:
+    elapsed = time.perf_counter() - start_time
+    megabytes = size / 1_000_000
+    rate = megabytes / elapsed if elapsed > 0 else 0.0
+    print(
+        f"\tHashed {os.path.basename(filename)}: {megabytes:,.1f} MB @ {rate:,.1f} MB/s"
+    )
+    return
+
+
+def hash_rom(
+    path: str, member: str = "", offset: int = 0
+) -> dict[str, Union[str, int]]:
+    # A file, or a member of a zip file (hashed without extracting it)
+    if member == "":
+        return hash_file(path, offset=offset)
+    with zipfile.ZipFile(path, "r") as zip_ref:
+        with zip_ref.open(member) as rom:
+            return hash_stream(rom, offset=offset)
+
+
+def _hash_rom_job(job: tuple[str, str, int, int]):
+    # Runs in the worker processes
+    path, member, offset, _ = job
+    start_time = time.perf_counter()
+    hashes = hash_rom(path, member=member, offset=offset)
+    return job, hashes, os.getpid(), time.perf_counter() - start_time
+
+
+def hash_roms_in_parallel(
+    jobs: list[tuple[str, str, int, int]], max_workers: int
+) -> Iterator[tuple[tuple[str, str, int, int], dict[str, Union[str, int]]]]:
+    # jobs: (path, zip member or "", header offset, size). Yields (job, hashes) as
+    # they finish. The biggest files go first so one huge file doesn't end up
+    # running alone at the end, and only a few jobs per worker are queued at once
+    # so memory stays flat however many ROMs there are.
+    jobs = sorted(jobs, key=lambda job: job[3], reverse=True)
+    max_in_flight = max_workers * 2
+    worker_stats = {}
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        pending_jobs = iter(jobs)
+        in_flight = set()
+        while True:
+            for job in pending_jobs:
+                in_flight.add(executor.submit(_hash_rom_job, job))
+                if len(in_flight) >= max_in_flight:
+                    break
+            if len(in_flight) == 0:
+                break
+
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                job, hashes, pid, elapsed = future.result()
+                stats = worker_stats.setdefault(pid, [0, 0, 0.0])
+                stats[0] += 1
+                stats[1] += hashes["size"]
+                stats[2] += elapsed
+                yield job, hashes
+
+    report_worker_hash_rates(worker_stats)
+    return
+
+
+def report_worker_hash_rates(worker_stats: dict[int, list]) -> None:
+    for pid, (files, size, elapsed) in sorted(worker_stats.items()):
+        megabytes = size / 1_000_000
+        rate = megabytes / elapsed if elapsed > 0 else 0.0
+        print(
+            f"\tHash worker {pid}: {files:,} files, {megabytes:,.1f} MB "
+            f"@ {rate:,.1f} MB/s"
+        )
+    return
@@ -4,7 +4,8 @@ import zipfile
 
 import requests
 import yaml
-from fuzzywuzzy import fuzz
+
+from game_db.title_matcher import TitleMatcher
 
 
 class ScummVmDB:
@@ -27,11 +28,13 @@ class ScummVmDB:
 
         with open(db_file, "r") as file:
             self.game_list = yaml.safe_load(file)
+
+        self.title_matcher = TitleMatcher(
+            [game.get("name") for game in self.game_list], threshold=50
+        )
         return
 
     def get_scummvm_from_game_name(self, game_name):
-        best_fuzz_score = 0
-        best_fuzz_location = None
         best_match = None
 
         # Clean the game_name
@@ -44,13 +47,8 @@ class ScummVmDB:
 
         game_name = game_name.strip()
 
-        # Loop through every game in the DB and see which one is the best
-        for idx, game in enumerate(self.game_list):
-            # Fix the game name stuff
-            fuzz_score = fuzz.ratio(game_name, game.get("name"))
-            if fuzz_score > 50 and fuzz_score > best_fuzz_score:
-                best_fuzz_score = fuzz_score
-                best_fuzz_location = idx
+        # Score every game in the DB at once and see which one is the best
+        best_fuzz_location = self.title_matcher.best_match(game_name)
 
         if best_fuzz_location is not None:
             best_match = self.game_list[best_fuzz_location]
@@ -2,26 +2,32 @@ import base64
 import os
 import pickle
 import sqlite3
+import threading
 import time
 from pathlib import Path
 from typing import List
 
 import pandas
-import requests
-from fuzzywuzzy import fuzz
 from steamgrid import ImageType, MimeType, SteamGridDB, StyleType
 
+from game_db.artwork_downloader import get_artwork_downloader
+from game_db.title_matcher import TitleMatcher
+
 API_KEY = os.getenv("STEAM_GRID_DB_API_KEY")
 
 
 class SteamGridDb:
-    def __init__(self, platform) -> None:
+    def __init__(self, platform=None) -> None:
+        # Nothing here depends on the platform, so one can be shared by all of them
         self.sgdb = SteamGridDB(API_KEY)
         self.platform = platform
 
+        # The local cache is used from the lookup threads (see RomProcessor), the
+        # requests themselves can run at the same time
         db_file = f"{os.path.dirname(__file__)}/../database/steamgriddb.db"
-        self.engine = sqlite3.connect(db_file)
+        self.engine = sqlite3.connect(db_file, check_same_thread=False)
         self._cursor = self.engine.cursor()
+        self._lock = threading.Lock()
 
         # Create local caching tables
         self._create_tables()
@@ -59,16 +65,10 @@ class SteamGridDb:
     def get_game_id_by_name(self, game_name: str):
         games = self._search_game(game_name)
 
-        best_fuzz_score = 0
-        best_match_id = None
-
-        for game in games:
-            fuzz_score = fuzz.ratio(game_name, game.name)
-            if fuzz_score > 90 and fuzz_score > best_fuzz_score:
-                best_fuzz_score = fuzz_score
-                best_match_id = game.id
-            if best_fuzz_score == 100:
-                break
+        title_matcher = TitleMatcher([game.name for game in games], threshold=90)
+        best_match_id = title_matcher.best_match_value(
+            game_name, [game.id for game in games]
+        )
         return best_match_id
 
     def _get_result_from_local_db(self, endpoint, query):
@@ -76,13 +76,14 @@ class SteamGridDb:
         query_encoded = base64.b64encode(pickle.dumps(query)).decode("ascii")
 
         # check if value is cached in local sqlite first
-        df = pandas.read_sql(
-            f"""
-                SELECT * FROM requests
-                WHERE endpoint='{endpoint}' AND query='{query_encoded}'
-            """,
-            self.engine,
-        )
+        with self._lock:
+            df = pandas.read_sql(
+                f"""
+                    SELECT * FROM requests
+                    WHERE endpoint='{endpoint}' AND query='{query_encoded}'
+                """,
+                self.engine,
+            )
         results_decoded = None
         if df.shape[0] > 0:
             result_encoded = df["result"][0]
@@ -95,13 +96,14 @@ class SteamGridDb:
         query_encoded = base64.b64encode(pickle.dumps(query)).decode("ascii")
         grids_encoded = base64.b64encode(pickle.dumps(grids)).decode("ascii")
 
-        self._cursor.execute(
-            f"""
-                INSERT INTO requests (endpoint, query, result)
-                VALUES('{endpoint}', '{query_encoded}', '{grids_encoded}')
-            """
-        )
-        self.engine.commit()
+        with self._lock:
+            self._cursor.execute(
+                f"""
+                    INSERT OR REPLACE INTO requests (endpoint, query, result)
+                    VALUES('{endpoint}', '{query_encoded}', '{grids_encoded}')
+                """
+            )
+            self.engine.commit()
         return
 
     def _search_game(
@@ -259,37 +261,22 @@ class SteamGridDb:
             grids = None
         return grids
 
-    def _download_image(self, grid, art_path, image_type, filename_links):
+    def _image_job(self, grid, art_path, image_type):
         image_url = grid.url
         extension = Path(image_url).suffix
         image_filename = str(grid.id) + extension
-
         image_path = os.path.join(art_path, image_type, image_filename)
-        if not os.path.exists(os.path.dirname(image_path)):
-            os.makedirs(os.path.dirname(image_path))
-
-        have_image = False
-        if not os.path.isfile(image_path):
-            image_web = requests.get(image_url)
-            if image_web.status_code == 200:
-                with open(image_path, "wb") as output:
-                    output.write(image_web.content)
-                    have_image = True
-        else:  # already downloaded
-            have_image = True
-
-        if have_image:
-            filename_links[image_type].append(image_path)
-        return
+        return image_type, image_url, image_path
 
-    def download_all_art(self, game_id: int, art_path_root: str):
+    def get_artwork_jobs(self, game_id: int, art_path_root: str):
         art_path = art_path_root + "steamgriddb/"
         if game_id is None:
-            return {}
+            return {}, []
 
         grids = self._get_grids_by_gameid([game_id])
 
-        # loop and download
+        # loop and queue the downloads
+        jobs = []
         filename_links = {
             "poster": [],
             "poster_no_logo": [],
@@ -312,8 +299,7 @@ class SteamGridDb:
                 else:
                     continue
 
-                # Download
-                self._download_image(grid, art_path, image_type, filename_links)
+                jobs.append(self._image_job(grid, art_path, image_type))
 
         logos = self._get_logos_by_gameid([game_id])
         if logos is not None:
@@ -322,16 +308,17 @@ class SteamGridDb:
                     image_type = "clearlogo"
                 else:
                     continue
-                # Download
-                self._download_image(logo, art_path, image_type, filename_links)
+                jobs.append(self._image_job(logo, art_path, image_type))
 
         heroes = self._get_heroes_by_gameid([game_id])
         if heroes is not None:
             for hero in heroes:
-                # Download
-                self._download_image(hero, art_path, "fanart", filename_links)
+                jobs.append(self._image_job(hero, art_path, "fanart"))
+        return filename_links, jobs
 
-        return filename_links
+    def download_all_art(self, game_id: int, art_path_root: str):
+        filename_links, jobs = self.get_artwork_jobs(game_id, art_path_root)
+        return get_artwork_downloader().download_links(filename_links, jobs)
 
 
 def main():
@@ -2,7 +2,9 @@ import json
 import os
 
 import requests
-from fuzzywuzzy import fuzz
+
+from game_db.artwork_downloader import get_artwork_downloader
+from game_db.title_matcher import TitleMatcher
 
 THEGAMESDB_JSON_LOCAL = "./database/games-db-database-latest.json"
 THEGAMESDB_JSON_URL = "https://cdn.thegamesdb.net/json/database-latest.json"
@@ -17,21 +19,32 @@ class TheGamesDb:
         with open(json_local, "r") as file:
             self.the_games_db_json = json.loads(file.read())
 
+        # Title matchers are built once per platform and reused
+        self.title_matchers = {}
+
     ALIAS_TO_RCB_PLATFORM = {"super-nintendo-snes": "SNES"}
 
+    def _get_title_matcher(self, platform_id):
+        if platform_id not in self.title_matchers:
+            locations = []
+            titles = []
+            for i, game in enumerate(self.the_games_db_json["data"]["games"]):
+                if game["platform"] == platform_id:
+                    locations.append(i)
+                    titles.append(game["game_title"])
+            self.title_matchers[platform_id] = (
+                TitleMatcher(titles, threshold=90),
+                locations,
+            )
+        return self.title_matchers[platform_id]
+
     def get_games_db_from_game_name(self, game_name, platform_alias):
         platform_id = self.get_platform_id_from_alias(platform_alias)
-        best_fuzz_score = 0
-        best_fuzz_location = None
         best_match = None
 
-        # Loop through every game in the DB and see which one is the best
-        for i, game in enumerate(self.the_games_db_json["data"]["games"]):
-            if game["platform"] == platform_id:
-                fuzz_score = fuzz.ratio(game_name, game["game_title"])
-                if fuzz_score > 90 and fuzz_score > best_fuzz_score:
-                    best_fuzz_score = fuzz_score
-                    best_fuzz_location = i
+        # Score every game on the platform at once and see which one is the best
+        title_matcher, locations = self._get_title_matcher(platform_id)
+        best_fuzz_location = title_matcher.best_match_value(game_name, locations)
 
         if best_fuzz_location is not None:
             best_match = self.the_games_db_json["data"]["games"][best_fuzz_location]
@@ -76,42 +89,32 @@ class TheGamesDb:
             "graphical": [],
         }
 
+        jobs = []
         for image in game_images:
             image_filename: str = image["filename"]
             image_path = os.path.join(art_path, image_filename)
-            if not os.path.exists(os.path.dirname(image_path)):
-                os.makedirs(os.path.dirname(image_path))
             image_url = f"{base_url}{image_filename}"
-            have_image = False
-            if not os.path.isfile(image_path):
-                image_web = requests.get(image_url)
-                if image_web.status_code == 200:
-                    with open(image_path, "wb") as output:
-                        output.write(image_web.content)
-                        have_image = True
-            else:  # already downloaded
-                have_image = True
-
-            if have_image:
-                if image["type"].upper() == "BOXART":
-                    if image["side"].upper() == "FRONT":
-                        key = "boxart_front"
-                    elif image["side"].upper() == "BACK":
-                        key = "boxart_back"
-                    else:
-                        raise ValueError(f"Invalid side: {image['side']}")
-                elif image["type"].upper() == "FANART":
-                    key = "fanart"
-                elif image["type"].upper() == "SCREENSHOT":
-                    key = "screenshot"
-                elif image["type"].upper() == "CLEARLOGO":
-                    key = "clearlogo"
-                elif image["type"].upper() == "TITLESCREEN":
-                    key = "titlescreen"
-                elif image["type"].upper() == "GRAPHICAL":
-                    key = "graphical"
-                else:
-                    raise ValueError(f"Invalid type: {image['type']}")
-                filename_links[key].append(image_path)
 
+            if image["type"].upper() == "BOXART":
+                if image["side"].upper() == "FRONT":
+                    key = "boxart_front"
+                elif image["side"].upper() == "BACK":
+                    key = "boxart_back"
+                else:
+                    raise ValueError(f"Invalid side: {image['side']}")
+            elif image["type"].upper() == "FANART":
+                key = "fanart"
+            elif image["type"].upper() == "SCREENSHOT":
+                key = "screenshot"
+            elif image["type"].upper() == "CLEARLOGO":
+                key = "clearlogo"
+            elif image["type"].upper() == "TITLESCREEN":
+                key = "titlescreen"
+            elif image["type"].upper() == "GRAPHICAL":
+                key = "graphical"
+            else:
+                raise ValueError(f"Invalid type: {image['type']}")
+            jobs.append((key, image_url, image_path))
+
+        get_artwork_downloader().download_links(filename_links, jobs)
         return filename_links
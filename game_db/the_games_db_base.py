@@ -1,8 +1,10 @@
 import os
 
 import pandas
-import requests
-from fuzzywuzzy import fuzz
+
+from game_db.artwork_downloader import get_artwork_downloader
+from game_db.title_matcher import TitleMatcher
+from game_db.title_normalizer import normalize_title
 
 THEGAMESDB_JSON_LOCAL = "./database/games-db-database-latest.json"
 THEGAMESDB_JSON_URL = "https://cdn.thegamesdb.net/json/database-latest.json"
@@ -77,6 +79,68 @@ PLATFORM_TO_DB_NAME = {
     "xboxseriesx": "microsoft-xbox-series-x",
 }
 
+# Relation queries that fetch developers/publishers/genres for many games at once.
+# {games_filter} is either a list of game ids or a sub-query on the games table
+RELATION_QUERIES = {
+    "developers": """
+        SELECT
+            gd.games_id
+            , gd.dev_id AS id
+            , dl.name AS developer_name
+            FROM games_devs gd
+            JOIN devs_list dl ON gd.dev_id = dl.id
+        WHERE gd.games_id IN ({games_filter})
+        """,
+    "publishers": """
+        SELECT
+            gp.games_id
+            , gp.pub_id AS id
+            , pl.name AS publisher_name
+            FROM games_pubs gp
+            JOIN pubs_list pl ON gp.pub_id = pl.id
+        WHERE gp.games_id IN ({games_filter})
+        """,
+    "genres": """
+        SELECT
+            gg.games_id
+            , gg.genres_id AS id
+            , g.genre
+            FROM games_genre gg
+            JOIN genres g ON gg.genres_id = g.id
+        WHERE gg.games_id IN ({games_filter})
+        """,
+}
+
+# Every games column the lookups return, {games_filter} is the WHERE clause
+GAMES_QUERY = """
+    SELECT
+        id
+        , game_title
+        , SOUNDEX
+        , COALESCE(players, 1) AS players
+        , release_date
+        , COALESCE(overview, '') AS overview
+        , last_updated
+        , COALESCE(rating, '') AS rating
+        , COALESCE(hits, 0) AS hits
+        , disabled
+        , platform AS platform_id
+        , COALESCE(coop, 'no') AS coop
+        , youtube
+        , os
+        , processor
+        , ram
+        , hdd
+        , video
+        , sound
+        , region_id
+        , country_id
+    FROM games WHERE {games_filter}
+    """
+
+# Max number of game ids to put in a single IN (...) clause
+RELATION_BATCH_SIZE = 500
+
 
 class TheGamesDbBase:
     def __init__(
@@ -91,6 +155,10 @@ class TheGamesDbBase:
         self._load_publishers()
         self._load_genres()
 
+        # The platform's games (and their relations) get loaded on the first lookup
+        self.platform_games = None
+        self.platform_relations = None
+
         # Load the platform
         self.platform = platform
         self.platform_id = self.get_platform_id_by_alias(PLATFORM_TO_DB_NAME[platform])
@@ -152,37 +220,61 @@ class TheGamesDbBase:
             self._load_genres()
         return self.genres.get(id)
 
-    def get_games_by_platform_id(self, platform_id: int):
+    def _read_games_by_platform_id(self, platform_id: int):
         df = pandas.read_sql(
-            f"""SELECT
-                id
-                , game_title
-                , SOUNDEX
-                , COALESCE(players, 1) AS players
-                , release_date
-                , COALESCE(overview, '') AS overview
-                , last_updated
-                , COALESCE(rating, '') AS rating
-                , COALESCE(hits, 0) AS hits
-                , disabled
-                , platform AS platform_id
-                , COALESCE(coop, 'no') AS coop
-                , youtube
-                , os
-                , processor
-                , ram
-                , hdd
-                , video
-                , sound
-                , region_id
-                , country_id
-            FROM games WHERE platform = {platform_id}""",
+            GAMES_QUERY.format(games_filter=f"platform = {platform_id} ORDER BY id"),
             self.engine,
         )
+        return df
+
+    def get_games_by_platform_id(self, platform_id: int):
+        df = self._read_games_by_platform_id(platform_id)
         df["index"] = df["id"]
         games = df.set_index("index").T.to_dict("dict")
         return games
 
+    def _load_platform_games(self):
+        # Load every game on the platform once and keep it around for all the
+        # lookups as plain tuples (in id order), with the titles/overviews already
+        # fixed up. Every lookup is then served from here.
+        df = self._read_games_by_platform_id(self.platform_id)
+        columns = list(df.columns)
+        games = [self._fix_game_data(game) for game in df.to_dict("records")]
+        rows = [tuple(game.values()) for game in games]
+
+        # Positions of the games by id and by normalized title
+        id_positions = {}
+        title_key_positions = {}
+        for position, (game, title_key) in enumerate(
+            zip(games, self._get_title_keys(games))
+        ):
+            id_positions[int(game["id"])] = position
+            if title_key != "":
+                title_key_positions.setdefault(title_key, []).append(position)
+
+        title_idx = columns.index("game_title")
+        self.platform_games = {
+            "columns": columns,
+            "rows": rows,
+            "id_positions": id_positions,
+            "title_key_positions": title_key_positions,
+            "title_matcher": TitleMatcher(
+                [row[title_idx] for row in rows], threshold=50
+            ),
+        }
+        return
+
+    def _get_title_keys(self, games: list[dict]) -> list[str]:
+        # Normalized title of each game, DBs that store them can read them instead
+        # (see TheGamesDbSqlite)
+        return [normalize_title(game["game_title"]) for game in games]
+
+    def invalidate_platform_games(self):
+        # Force the platform's games to be reloaded on the next lookup
+        self.platform_games = None
+        self.platform_relations = None
+        return
+
     def get_genres_by_game_id(self, game_id: int):
         df = pandas.read_sql(
             f"""
@@ -231,6 +323,65 @@ class TheGamesDbBase:
         publishers = df.set_index("index").T.to_dict("dict")
         return publishers
 
+    def _read_relations(self, relation: str, games_filter: str):
+        # Group the relation rows by game, each game gets the same
+        # {id: {...}} dict the get_*_by_game_id functions return
+        df = pandas.read_sql(
+            RELATION_QUERIES[relation].format(games_filter=games_filter),
+            self.engine,
+        )
+        relations = {}
+        for row in df.to_dict("records"):
+            game_id = row.pop("games_id")
+            relations.setdefault(game_id, {})[row["id"]] = row
+        return relations
+
+    def _get_relations_by_game_ids(self, relation: str, game_ids: list[int]):
+        game_ids = list(dict.fromkeys(int(game_id) for game_id in game_ids))
+        relations = {}
+        for start in range(0, len(game_ids), RELATION_BATCH_SIZE):
+            end = start + RELATION_BATCH_SIZE
+            games_filter = ", ".join(str(game_id) for game_id in game_ids[start:end])
+            relations.update(self._read_relations(relation, games_filter))
+
+        # Games without any rows still get an (empty) entry
+        return {game_id: relations.get(game_id, {}) for game_id in game_ids}
+
+    def get_developers_by_game_ids(self, game_ids: list[int]):
+        return self._get_relations_by_game_ids("developers", game_ids)
+
+    def get_publishers_by_game_ids(self, game_ids: list[int]):
+        return self._get_relations_by_game_ids("publishers", game_ids)
+
+    def get_genres_by_game_ids(self, game_ids: list[int]):
+        return self._get_relations_by_game_ids("genres", game_ids)
+
+    def _load_platform_relations(self):
+        # One query per relation for every game on the platform. Games without any
+        # rows still get an (empty) entry, so they never have to be looked up again
+        games_filter = f"SELECT id FROM games WHERE platform = {self.platform_id}"
+        platform_game_ids = pandas.read_sql(games_filter, self.engine)["id"].tolist()
+        self.platform_relations = {}
+        for relation in RELATION_QUERIES.keys():
+            relations = self._read_relations(relation, games_filter)
+            self.platform_relations[relation] = {
+                game_id: relations.get(game_id, {}) for game_id in platform_game_ids
+            }
+        return
+
+    def get_game_relations(self, game_id: int):
+        # Developers, publishers and genres of a game, served from the platform cache
+        if self.platform_relations is None:
+            self._load_platform_relations()
+
+        game_relations = {}
+        for relation, relations in self.platform_relations.items():
+            if game_id not in relations:
+                # Not on this platform, ask the DB
+                relations.update(self._get_relations_by_game_ids(relation, [game_id]))
+            game_relations[relation] = relations[game_id]
+        return game_relations
+
     def get_tables(self):
         df = pandas.read_sql(
             "SELECT name FROM sqlite_master WHERE type='table';", self.engine
@@ -262,24 +413,56 @@ class TheGamesDbBase:
         )
         return game
 
-    def get_games_db_from_game_name(self, game_name):
-        best_fuzz_score = 0
-        best_fuzz_location = None
-        best_match = None
+    def _get_platform_game(self, position: int):
+        return dict(
+            zip(self.platform_games["columns"], self.platform_games["rows"][position])
+        )
 
-        all_games = self.get_games_by_platform_id(self.platform_id)
+    def _get_game_by_title_key(self, game_name):
+        # Exact match on the normalized title, the exact title wins if there is one
+        # (same as the fuzzy match), otherwise the lowest id
+        title_key = normalize_title(game_name)
+        positions = self.platform_games["title_key_positions"].get(title_key)
+        if positions is None:
+            return None
+
+        title_idx = self.platform_games["columns"].index("game_title")
+        for position in positions:
+            if self.platform_games["rows"][position][title_idx] == game_name:
+                return self._get_platform_game(position)
+        return self._get_platform_game(positions[0])
+
+    def _get_candidate_game_ids(self, game_name):
+        # Ids of the few games worth scoring against game_name, for the DBs that can
+        # find them (see TheGamesDbSqlite). None means every game on the platform.
+        return None
 
-        # Loop through every game in the DB and see which one is the best
-        for key, game in all_games.items():
-            # Fix the game name stuff
-            game = self._fix_game_data(game)
-            fuzz_score = fuzz.ratio(game_name, game["game_title"])
-            if fuzz_score > 50 and fuzz_score > best_fuzz_score:
-                best_fuzz_score = fuzz_score
-                best_fuzz_location = key
+    def get_games_db_from_game_name(self, game_name):
+        if self.platform_games is None:
+            self._load_platform_games()
+
+        best_match = self._get_game_by_title_key(game_name)
+        if best_match is not None:
+            return best_match
+
+        # Only score the candidates when the DB can pick them, in id order so ties
+        # go the same way as scoring every game
+        candidate_positions = None
+        candidate_game_ids = self._get_candidate_game_ids(game_name)
+        if candidate_game_ids is not None:
+            id_positions = self.platform_games["id_positions"]
+            candidate_positions = sorted(
+                id_positions[game_id]
+                for game_id in candidate_game_ids
+                if game_id in id_positions
+            )
+
+        # Score the games at once and see which one is the best
+        title_matcher = self.platform_games["title_matcher"]
+        best_fuzz_location = title_matcher.best_match(game_name, candidate_positions)
 
         if best_fuzz_location is not None:
-            best_match = all_games.get(best_fuzz_location)
+            best_match = self._get_platform_game(best_fuzz_location)
         return best_match
 
     def get_platform_alias_from_id(self, platform_id):
@@ -296,7 +479,7 @@ class TheGamesDbBase:
         platform_alias = self.get_platform_by_id(platform_id)["alias"]
         return self.get_rcb_platform_from_alias(platform_alias)
 
-    def download_all_art(self, game_db, art_path_root: str):
+    def get_artwork_jobs(self, game_db, art_path_root: str):
         art_path = art_path_root + "thegamedb/"
         game_db_id = game_db.get("id", None)
 
@@ -315,44 +498,36 @@ class TheGamesDbBase:
             "graphical": [],
         }
 
-        for key, image in game_images.items():
+        jobs = []
+        for image in game_images.values():
             image_filename: str = image["filename"]
             image_path = os.path.join(art_path, image_filename)
-            if not os.path.exists(os.path.dirname(image_path)):
-                os.makedirs(os.path.dirname(image_path))
             image_url = f"{base_url}{image_filename}"
-            have_image = False
-            if not os.path.isfile(image_path):
-                image_web = requests.get(image_url)
-                if image_web.status_code == 200:
-                    with open(image_path, "wb") as output:
-                        output.write(image_web.content)
-                        have_image = True
-            else:  # already downloaded
-                have_image = True
-
-            if have_image:
-                if image["type"].upper() == "BOXART":
-                    if image["side"].upper() == "FRONT":
-                        key = "boxart_front"
-                    elif image["side"].upper() == "BACK":
-                        key = "boxart_back"
-                    else:
-                        raise ValueError(f"Invalid side: {image['side']}")
-                elif image["type"].upper() == "FANART":
-                    key = "fanart"
-                elif image["type"].upper() == "SCREENSHOT":
-                    key = "screenshot"
-                elif image["type"].upper() == "CLEARLOGO":
-                    key = "clearlogo"
-                elif image["type"].upper() == "TITLESCREEN":
-                    key = "titlescreen"
-                elif image["type"].upper() == "GRAPHICAL":
-                    key = "graphical"
-                elif image["type"].upper() == "BANNER":
-                    key = "banner"
+
+            if image["type"].upper() == "BOXART":
+                if image["side"].upper() == "FRONT":
+                    key = "boxart_front"
+                elif image["side"].upper() == "BACK":
+                    key = "boxart_back"
                 else:
-                    raise ValueError(f"Invalid type: {image['type']}")
-                filename_links[key].append(image_path)
+                    raise ValueError(f"Invalid side: {image['side']}")
+            elif image["type"].upper() == "FANART":
+                key = "fanart"
+            elif image["type"].upper() == "SCREENSHOT":
+                key = "screenshot"
+            elif image["type"].upper() == "CLEARLOGO":
+                key = "clearlogo"
+            elif image["type"].upper() == "TITLESCREEN":
+                key = "titlescreen"
+            elif image["type"].upper() == "GRAPHICAL":
+                key = "graphical"
+            elif image["type"].upper() == "BANNER":
+                key = "banner"
+            else:
+                raise ValueError(f"Invalid type: {image['type']}")
+            jobs.append((key, image_url, image_path))
+        return filename_links, jobs
 
-        return filename_links
+    def download_all_art(self, game_db, art_path_root: str):
+        filename_links, jobs = self.get_artwork_jobs(game_db, art_path_root)
+        return get_artwork_downloader().download_links(filename_links, jobs)
@@ -1,24 +1,111 @@
 import os
 import sqlite3
+from typing import Union
+
+import pandas
 
 from game_db.the_games_db_base import TheGamesDbBase
+from game_db.title_normalizer import TITLE_KEY_VERSION, normalize_title
+from game_db.title_search import (
+    create_title_search,
+    get_title_search_candidates,
+    rebuild_title_search,
+)
+
+TGDB_DB_FILE = f"{os.path.dirname(__file__)}/../database/tgdb.db"
+
+
+def update_title_indexes(engine: sqlite3.Connection) -> None:
+    # tgdb.db comes straight from the MySQL dump (see setup.sh), so the normalized
+    # title column, its index and the title search get added here. Only games
+    # without a key yet get one, which is nothing at all once a dump has been done.
+    cursor = engine.cursor()
+    cursor.execute("PRAGMA table_info(games)")
+    if "title_key" not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute("ALTER TABLE games ADD COLUMN title_key TEXT NULL")
+    cursor.execute(
+        """
+        CREATE INDEX IF NOT EXISTS games_platform_title_key_idx ON
+            games (platform, title_key)
+        """
+    )
+
+    # Keys made by an older normalize_title have to be made again
+    cursor.execute("PRAGMA user_version")
+    if cursor.fetchone()[0] < TITLE_KEY_VERSION:
+        cursor.execute("UPDATE games SET title_key = NULL")
+
+    cursor.execute("SELECT id, game_title FROM games WHERE title_key IS NULL")
+    title_keys = [
+        (normalize_title(game_title), game_id)
+        for game_id, game_title in cursor.fetchall()
+    ]
+    if len(title_keys) > 0:
+        print(f"TheGamesDB: adding title keys to {len(title_keys):,} games")
+        cursor.executemany("UPDATE games SET title_key = ? WHERE id = ?", title_keys)
+
+    # New games (a new dump) need to be searchable too
+    created = create_title_search(
+        cursor, "games_title_fts", "games", "game_title", "id", "platform"
+    )
+    if len(title_keys) > 0 and not created:
+        rebuild_title_search(cursor, "games_title_fts")
+    cursor.execute(f"PRAGMA user_version = {TITLE_KEY_VERSION}")
+    engine.commit()
+    cursor.close()
+    return
 
 
 class TheGamesDbSqlite(TheGamesDbBase):
     def __init__(
         self,
         platform: str,
+        engine: Union[sqlite3.Connection, None] = None,
     ):
-        # Load the sqlite3 DB
-        db_file = f"{os.path.dirname(__file__)}/../database/tgdb.db"
-        self.engine = sqlite3.connect(db_file)
+        # Load the sqlite3 DB (or share an open connection to it). The title keys
+        # and title search have to be there already, adding them is a write so it's
+        # done once up front (see main)
+        self.engine = sqlite3.connect(TGDB_DB_FILE) if engine is None else engine
+        cursor = self.engine.cursor()
+        cursor.execute("PRAGMA user_version")
+        title_key_version = cursor.fetchone()[0]
+        cursor.close()
+        if title_key_version < TITLE_KEY_VERSION:
+            raise Exception(
+                f"TheGamesDB title keys are out of date, run update_title_indexes "
+                f"first: {TGDB_DB_FILE}"
+            )
 
         # Call the base constructor
         super().__init__(platform=platform)
         return
 
+    def _get_title_keys(self, games):
+        # update_title_indexes has already stored them
+        df = pandas.read_sql(
+            "SELECT id, title_key FROM games WHERE platform = ?",
+            self.engine,
+            params=(int(self.platform_id),),
+        )
+        title_keys = dict(zip(df["id"].tolist(), df["title_key"].tolist()))
+        return [title_keys.get(int(game["id"])) or "" for game in games]
+
+    def _get_candidate_game_ids(self, game_name):
+        # The platform's best full text matches, the games themselves come from
+        # the platform's cached games
+        cursor = self.engine.cursor()
+        game_ids = get_title_search_candidates(
+            cursor, "games_title_fts", game_name, self.platform_id
+        )
+        cursor.close()
+        return game_ids
+
 
 def main():
+    engine = sqlite3.connect(TGDB_DB_FILE)
+    update_title_indexes(engine)
+    engine.close()
+
     games_db = TheGamesDbSqlite(platform="gc")
 
     game = games_db.get_games_db_from_game_name("Skies of Arcadia Legends")
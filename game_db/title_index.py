@@ -0,0 +1,89 @@
+from typing import Union
+
+import numpy
+
+from game_db.title_matcher import TitleMatcher
+
+# Characters are folded into this many buckets for the histogram filter
+HISTOGRAM_BUCKETS = 64
+
+
+class TitleIndex:
+    # Prebuilt candidate index over a list of titles so a fuzzy lookup only has to
+    # score the handful of titles that could possibly beat the threshold. The scoring
+    # itself is TitleMatcher's (fuzz.ratio), only run on those candidates.
+    #
+    # fuzz.ratio is 100 * (1 - d / (len1 + len2)) where d is the insert/delete edit
+    # distance. Two cheap lower bounds on d are used to throw titles away without
+    # scoring them:
+    #   - the difference in length
+    #   - the L1 distance between the character histograms
+    # Both can only under-estimate d, so no title that fuzz.ratio would have scored
+    # above the threshold is ever dropped and the results match a linear scan.
+    def __init__(self, titles: list[str], threshold: int = 80) -> None:
+        self.titles = list(titles)
+        self.threshold = threshold
+        self.title_matcher = TitleMatcher(self.titles, threshold=threshold)
+
+        # Title positions grouped by length
+        self._lengths = numpy.array([len(title) for title in self.titles])
+        self._by_length = {}
+        for length in numpy.unique(self._lengths):
+            self._by_length[int(length)] = numpy.flatnonzero(self._lengths == length)
+
+        # Bucketed character histogram of every title
+        self._histograms = numpy.zeros(
+            (len(self.titles), HISTOGRAM_BUCKETS), dtype=numpy.int32
+        )
+        codes = [self._char_buckets(title) for title in self.titles]
+        if len(codes) > 0:
+            rows = numpy.repeat(numpy.arange(len(self.titles)), self._lengths)
+            numpy.add.at(self._histograms, (rows, numpy.concatenate(codes)), 1)
+        return
+
+    @staticmethod
+    def _char_buckets(title: str) -> numpy.ndarray:
+        code_points = numpy.frombuffer(title.encode("utf-32-le"), dtype=numpy.uint32)
+        return (code_points % HISTOGRAM_BUCKETS).astype(numpy.intp)
+
+    @staticmethod
+    def _can_beat(upper_bound: numpy.ndarray, threshold: int) -> numpy.ndarray:
+        # fuzz.ratio rounds to an int and we need it to be strictly above the
+        # threshold, so anything below threshold + 0.5 can never make it
+        return upper_bound >= threshold + 0.5 - 1e-9
+
+    def get_candidates(self, query: str, threshold: int) -> numpy.ndarray:
+        query_length = len(query)
+
+        # Length filter
+        positions = []
+        for length, length_positions in self._by_length.items():
+            total_length = query_length + length
+            if total_length == 0:
+                continue
+            upper_bound = 100 * (total_length - abs(query_length - length))
+            if self._can_beat(numpy.array(upper_bound / total_length), threshold):
+                positions.append(length_positions)
+        if len(positions) == 0:
+            return numpy.array([], dtype=numpy.intp)
+        positions = numpy.concatenate(positions)
+
+        # Character histogram filter
+        query_histogram = numpy.bincount(
+            self._char_buckets(query), minlength=HISTOGRAM_BUCKETS
+        )
+        distance = numpy.abs(self._histograms[positions] - query_histogram).sum(axis=1)
+        total_length = query_length + self._lengths[positions]
+        upper_bound = 100 * (total_length - distance) / total_length
+        positions = positions[self._can_beat(upper_bound, threshold)]
+
+        # Keep the original title order so ties resolve exactly like a linear scan
+        return numpy.sort(positions)
+
+    def best_match(self, query: str) -> Union[int, None]:
+        # fuzzywuzzy scored an empty query as 0 against everything, so nothing matches
+        if len(query) == 0:
+            return None
+
+        candidates = self.get_candidates(query, self.threshold).tolist()
+        return self.title_matcher.best_match(query, candidates)
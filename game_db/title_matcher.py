@@ -0,0 +1,101 @@
+from typing import Any, Callable, Union
+
+import numpy
+from rapidfuzz import fuzz, process
+
+# Scores of a query can only round to 100 without an exact match once the strings
+# get longer than this, so the exact-match shortcut is only taken below it
+EXACT_MATCH_MAX_LENGTH = 99
+
+
+class TitleMatcher:
+    # Shared "best title above a threshold" matcher for all the game DBs.
+    #
+    # The titles are handed to rapidfuzz once and every query is scored against all
+    # of them with a single process.cdist call (C speed) instead of a Python loop of
+    # fuzz.ratio calls. Scores are rounded the same way fuzzywuzzy does, and the first
+    # title with the highest score wins, so the results are the same as the loops
+    # this replaces.
+    def __init__(
+        self,
+        titles: list[Union[str, None]],
+        scorer: Callable[..., float] = fuzz.ratio,
+        threshold: int = 80,
+        early_exit: bool = True,
+    ) -> None:
+        self.scorer = scorer
+        self.threshold = threshold
+        self.early_exit = early_exit
+
+        # fuzzywuzzy scores a missing title as 0, keep track of those
+        self.titles = ["" if title is None else title for title in titles]
+        self._missing = numpy.array([title is None for title in titles], dtype=bool)
+
+        # First position of every title, for the exact match early exit
+        self._exact_positions = {}
+        for position, title in enumerate(titles):
+            if title is not None:
+                self._exact_positions.setdefault(title, position)
+        return
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def get_scores(
+        self, query: str, positions: Union[list[int], None] = None
+    ) -> numpy.ndarray:
+        # Scores of every title, or only of the titles at positions (in that order)
+        titles = self.titles
+        missing = self._missing
+        if positions is not None:
+            titles = [self.titles[position] for position in positions]
+            missing = self._missing[numpy.array(positions, dtype=numpy.intp)]
+        if len(titles) == 0:
+            return numpy.zeros(0, dtype=numpy.int64)
+
+        # Anything that can't round above the threshold is zeroed out by rapidfuzz
+        scores = process.cdist(
+            [query],
+            titles,
+            scorer=self.scorer,
+            dtype=numpy.float64,
+            score_cutoff=self.threshold + 0.5 - 1e-9,
+            workers=1,
+        )[0]
+
+        # fuzzywuzzy rounds half to even, so does rint
+        scores = numpy.rint(scores).astype(numpy.int64)
+        scores[missing] = 0
+        return scores
+
+    def best_match(
+        self, query: Union[str, None], positions: Union[list[int], None] = None
+    ) -> Union[int, None]:
+        # Position of the best title, only looking at the titles at positions (and
+        # breaking ties in their order) when given
+        if query is None:
+            return None
+
+        # A perfect score can't be beaten, and for short names only an exact match
+        # scores 100, so the first exact match is what a full scan would return
+        if (
+            self.early_exit
+            and positions is None
+            and len(query) <= EXACT_MATCH_MAX_LENGTH
+        ):
+            position = self._exact_positions.get(query)
+            if position is not None and 100 > self.threshold:
+                return position
+
+        scores = self.get_scores(query, positions)
+        if len(scores) == 0:
+            return None
+        best = int(numpy.argmax(scores))
+        if scores[best] > self.threshold:
+            return best if positions is None else positions[best]
+        return None
+
+    def best_match_value(self, query: Union[str, None], values: list[Any]) -> Any:
+        # Helper for the common case of having a value per title
+        position = self.best_match(query)
+        return None if position is None else values[position]
@@ -0,0 +1,75 @@
+import html
+import re
+import unicodedata
+from typing import Union
+
+# Bump whenever normalize_title or the title search changes, so the keys and the
+# title search stored in the DBs get redone
+TITLE_KEY_VERSION = 3
+
+# Anything in brackets, ie: "(USA)", "[!]"
+REG_EX_BRACKETS = re.compile(r"\([^)]*\)|\[[^\]]*\]")
+
+# ", The" moved to the end of the title (or of the part before the subtitle)
+REG_EX_TRAILING_THE = re.compile(r",\s*the\b(?=\s*(?:$|[:\-~]))")
+REG_EX_LEADING_THE = re.compile(r"^the\s+")
+REG_EX_NOT_ALPHANUMERIC = re.compile(r"[^a-z0-9]+")
+
+# Roman numerals up to 39, as separate words (but not the first one, "X-Men",
+# "I Love Golf")
+REG_EX_ROMAN_NUMERAL = re.compile(r"^x{0,3}(ix|iv|v?i{0,3})$")
+ROMAN_NUMERAL_VALUES = {"i": 1, "v": 5, "x": 10}
+
+# Single letters are as often a name as a number ("Mega Man X" isn't "Mega Man 10"),
+# so they're left alone
+UNFOLDED_ROMAN_NUMERALS = {"i", "v", "x"}
+
+
+def _roman_to_int(numeral: str) -> int:
+    value = 0
+    for position, char in enumerate(numeral):
+        char_value = ROMAN_NUMERAL_VALUES[char]
+        next_position = position + 1
+        if (
+            next_position < len(numeral)
+            and ROMAN_NUMERAL_VALUES[numeral[next_position]] > char_value
+        ):
+            value -= char_value
+        else:
+            value += char_value
+    return value
+
+
+def normalize_title(title: Union[str, None]) -> str:
+    # Canonical key for a game title, so the same game named slightly differently
+    # by each DB (or by the ROM) still ends up with the same key:
+    #   "Legend of Zelda, The - A Link to the Past (USA)"
+    #   "The Legend of Zelda: A Link To The Past"
+    # both become "legend of zelda a link to the past". Case, accents, punctuation,
+    # the subtitle separator, "The", "&" / "and" and roman numerals (from "ii" up) are
+    # all folded.
+    if title is None:
+        return ""
+
+    title = html.unescape(title)
+    title = unicodedata.normalize("NFKD", title)
+    title = "".join(char for char in title if not unicodedata.combining(char))
+    title = title.lower()
+
+    title = REG_EX_BRACKETS.sub(" ", title)
+    title = REG_EX_TRAILING_THE.sub("", title)
+    title = REG_EX_LEADING_THE.sub("", title.strip())
+    title = title.replace("&", " and ")
+
+    words = []
+    for word in REG_EX_NOT_ALPHANUMERIC.split(title):
+        if word == "":
+            continue
+        if (
+            len(words) > 0
+            and word not in UNFOLDED_ROMAN_NUMERALS
+            and REG_EX_ROMAN_NUMERAL.match(word)
+        ):
+            word = str(_roman_to_int(word))
+        words.append(word)
+    return " ".join(words)
@@ -0,0 +1,104 @@
+import sqlite3
+from typing import Union
+
+# How many titles the full text search hands back to be scored. Scoring only these
+# finds what scoring every title on the platform would, except for names sharing
+# no trigram with their best title (a typo in a short name, "Wold" for "World") and
+# best titles ranked below the cut on a crowded platform. Those get no match, for
+# about 1% of names (see tests/test_title_search.py).
+TRIGRAM_CANDIDATES = 100
+
+
+def create_title_search(
+    cursor: sqlite3.Cursor,
+    fts_table: str,
+    table: str,
+    title_column: str,
+    id_column: str,
+    platform_column: str,
+) -> bool:
+    # Trigram full text index over a table's titles and platforms, stored as an
+    # external content table (over a view) so the titles themselves aren't
+    # duplicated. The platform goes in as "<id>" so it has trigrams of its own and a
+    # search only ever looks at one platform's titles. Returns True when it had to
+    # be created (and built from what's in the table already).
+    cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name = ?",
+        (fts_table,),
+    )
+    if cursor.fetchone() is not None:
+        cursor.execute(f"PRAGMA table_info({fts_table})")
+        if "platform" in [row[1] for row in cursor.fetchall()]:
+            return False
+        # Made before the platform was part of it
+        cursor.execute(f"DROP TABLE {fts_table}")
+    cursor.execute(
+        f"""
+        CREATE VIEW IF NOT EXISTS {fts_table}_content AS
+            SELECT {id_column} AS id
+                , {title_column} AS title
+                , '<' || {platform_column} || '>' AS platform
+            FROM {table}
+        """
+    )
+    cursor.execute(
+        f"""
+        CREATE VIRTUAL TABLE {fts_table} USING fts5(
+            title,
+            platform,
+            content='{fts_table}_content',
+            content_rowid='id',
+            tokenize='trigram'
+        )
+        """
+    )
+    rebuild_title_search(cursor, fts_table)
+    return True
+
+
+def rebuild_title_search(cursor: sqlite3.Cursor, fts_table: str) -> None:
+    # Re-read every title from the content table, after the table got (re)loaded
+    cursor.execute(f"INSERT INTO {fts_table} ({fts_table}) VALUES ('rebuild')")
+    return
+
+
+def get_trigram_match_query(title: Union[str, None]) -> Union[str, None]:
+    # FTS5 query matching any title sharing at least one trigram with this one, the
+    # titles sharing the most (and rarest) trigrams rank first. None when the title
+    # is too short to have any.
+    if title is None:
+        return None
+    title = title.strip().lower()
+    trigrams = dict.fromkeys(
+        "".join(chars) for chars in zip(title, title[1:], title[2:])
+    )
+    if len(trigrams) == 0:
+        return None
+    return " OR ".join(
+        '"' + trigram.replace('"', '""') + '"' for trigram in trigrams.keys()
+    )
+
+
+def get_title_search_candidates(
+    cursor: sqlite3.Cursor,
+    fts_table: str,
+    title: Union[str, None],
+    platform_id: int,
+    limit: int = TRIGRAM_CANDIDATES,
+) -> Union[list[int], None]:
+    # Ids of the platform's titles sharing the most (and rarest) trigrams with title,
+    # best first. The platform is part of the match, so only that platform's titles
+    # get ranked. None when the title is too short to search for.
+    match_query = get_trigram_match_query(title)
+    if match_query is None:
+        return None
+    cursor.execute(
+        f"""
+        SELECT rowid FROM {fts_table}
+        WHERE {fts_table} MATCH ?
+        ORDER BY rank
+        LIMIT ?
+        """,
+        (f'platform : "<{int(platform_id)}>" AND title : ({match_query})', limit),
+    )
+    return [row[0] for row in cursor.fetchall()]
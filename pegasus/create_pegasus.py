@@ -1,19 +1,44 @@
-import hashlib
+import argparse
+import collections
+import itertools
 import os
+import sqlite3
 import sys
-import tempfile
-import zipfile
+import time
+from concurrent.futures import (
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+)
 from pathlib import Path
+from typing import Any, Callable, Union
 
 from game_db.arcade_db import ArcadeDb
-from game_db.internet_game_db import InternetGameDb
+from game_db.artwork_downloader import get_artwork_downloader
+from game_db.internet_game_db import IgdbClient, InternetGameDb
 from game_db.launchbox_db import LaunchBoxDB
-from game_db.no_intro_db import NoIntroDb
+from game_db.no_intro_dat_diff import (
+    diff_dat_files,
+    find_previous_dat_file,
+    get_affected_rom_crcs,
+    is_affected_rom,
+)
+from game_db.no_intro_db import PLATFORM_LOOKUP, NoIntroDb
+from game_db.no_intro_hash_index import NoIntroHashIndex, get_no_intro_hash_index
 from game_db.scummvm_db import ScummVmDB
 from game_db.steam_grid_db import SteamGridDb
-from game_db.the_games_db_sqlite import TheGamesDbSqlite
+from game_db.the_games_db_sqlite import (
+    TGDB_DB_FILE,
+    TheGamesDbSqlite,
+    update_title_indexes,
+)
 from pegasus.local_files import LocalFiles
-from pegasus.pegasus_text_builder import PegasusTextBuilder
+from pegasus.pegasus_text_builder import (
+    PegasusTextBuilder,
+    get_entry_filename,
+    split_pegasus_text,
+)
 
 # Using the same system names found here:
 #   https://gitlab.com/es-de/emulationstation-de/-/blob/master/USERGUIDE.md#game-system-customizations
@@ -72,6 +97,19 @@ USES_SCHUMMVM = ["scummvm"]
 # USES_FOLDERS = ["ps3", "wiiu"]
 USES_FOLDERS = ["wiiu"]
 
+# Pipeline mode: how many ROMs get identified (hashed) at once, how many get looked
+# up on the web DBs (IGDB, SteamGridDB) at once, and how many ROMs each stage can run
+# ahead of the next one
+IDENTIFY_WORKERS = 4
+LOOKUP_WORKERS = 4
+PIPELINE_DEPTH = 32
+
+# Processes hashing the ROMs of a platform (No-Intro platforms only)
+HASH_WORKERS = os.cpu_count() or 1
+
+# Reference data shared by all the platforms of a process (see get_shared_db)
+_shared_dbs = {}
+
 # Where to put the steamgriddb & thegamesdb images
 ARTWORK_FOLDER_PATH = "/ROMs/.assets/"
 VALID_EXTENSIONS = [
@@ -109,16 +147,12 @@ VALID_EXTENSIONS = [
 ]
 
 
-def md5sum(filename, offset):
-    h = hashlib.md5()
-    with open(filename, "rb") as file:
-        if offset > 0:
-            file.read(offset)  # read files with an offset, for iNES roms etc
-        chunk = 0
-        while chunk != b"":
-            chunk = file.read(1024)
-            h.update(chunk)
-    return h.hexdigest()
+def get_shared_db(name: str, factory: Callable[[], Any]) -> Any:
+    # Platform independent reference data only gets loaded once per process, and is
+    # then shared by every platform that process works on
+    if name not in _shared_dbs:
+        _shared_dbs[name] = factory()
+    return _shared_dbs[name]
 
 
 def dict_merge(*dicts_list):
@@ -132,13 +166,16 @@ def dict_merge(*dicts_list):
 
 
 class RomProcessor:
-    def __init__(self, platform: str, rom_folder: str) -> None:
+    def __init__(
+        self, platform: str, rom_folder: str, hash_workers: int = HASH_WORKERS
+    ) -> None:
         self.platform = platform
         self.rom_folder_path = rom_folder
+        self.hash_workers = hash_workers
 
         # Setup SCUMM VM
         if platform == "scummvm":
-            self.scumm_vm = ScummVmDB()
+            self.scumm_vm = get_shared_db("scummvm", ScummVmDB)
 
         # Setup the NoIntroDB
         if NoIntroDb.platform_available(self.platform):
@@ -146,14 +183,20 @@ class RomProcessor:
 
         # Setup the ArcadeDB
         if platform in (USES_ARCADE_DB):
-            self.arcade_db = ArcadeDb()
+            self.arcade_db = get_shared_db("arcade", ArcadeDb)
 
-        # Setup LaunchBoxDB
-        self.launch_box_db = LaunchBoxDB(platform)
+        # Setup LaunchBoxDB (main() has already downloaded and loaded it)
+        self.launch_box_db = LaunchBoxDB(platform, read_only=True)
 
-        self.internet_game_db = InternetGameDb(platform)
-        self.the_game_db = TheGamesDbSqlite(platform)
-        self.steam_grid_db = SteamGridDb(platform)
+        # One connection / client per process, whatever the platform
+        self.internet_game_db = InternetGameDb(
+            platform, client=get_shared_db("igdb", IgdbClient)
+        )
+        self.the_game_db = TheGamesDbSqlite(
+            platform,
+            engine=get_shared_db("tgdb", lambda: sqlite3.connect(TGDB_DB_FILE)),
+        )
+        self.steam_grid_db = get_shared_db("steamgriddb", SteamGridDb)
         self.local_files = LocalFiles(rom_folder)
         self.pegasus_text_builder = PegasusTextBuilder(
             the_games_db=self.the_game_db,
@@ -161,7 +204,8 @@ class RomProcessor:
         )
         return
 
-    def process_roms(self):
+    def get_rom_files(self) -> list[tuple[str, str]]:
+        rom_files = []
         all_files = sorted(os.listdir(self.rom_folder_path), reverse=False)
 
         # Loop on files in folder
@@ -186,35 +230,168 @@ class RomProcessor:
             if filename == "metadata.pegasus.txt":
                 continue
 
+            rom_files.append((full_filename_path, filename))
+        return rom_files
+
+    def process_roms(self, pipeline: bool = False):
+        rom_files = self.get_rom_files()
+
+        # Hash all the ROMs up front on a pool of processes, identifying them later
+        # on then only has to look the hashes up
+        if NoIntroDb.platform_available(self.platform) and self.hash_workers > 1:
+            self.no_intro_db.prehash_files(
+                [
+                    full_filename_path
+                    for full_filename_path, filename in rom_files
+                    if self.has_valid_extension(filename)
+                ],
+                max_workers=self.hash_workers,
+            )
+        if pipeline:
+            self._process_roms_pipelined(rom_files)
+            return
+
+        for full_filename_path, filename in rom_files:
             self.process_rom(full_filename_path, filename)
+        return
+
+    def _process_roms_pipelined(self, rom_files: list[tuple[str, str]]) -> None:
+        # Same stages as process_rom, but overlapped:
+        #   - identifying (hashing) runs on a thread pool, PIPELINE_DEPTH ROMs ahead
+        #   - the sqlite backed lookups (TheGamesDB, LaunchBox) run here, on the
+        #     thread that owns their connections
+        #   - the web lookups and artwork listings (IGDB, SteamGridDB) run on their
+        #     own thread pool, up to PIPELINE_DEPTH ROMs at a time
+        #   - the artwork downloads run on the shared artwork downloader pool
+        # ROMs leave every stage in the same order they came in, so the entries are
+        # added to the pegasus file in the same (sorted) order as process_rom.
+        rom_files = iter(rom_files)
+        identifying = collections.deque()
+        looking_up = collections.deque()
+        downloading = collections.deque()
+
+        with ThreadPoolExecutor(
+            max_workers=IDENTIFY_WORKERS, thread_name_prefix="identify"
+        ) as identify_pool, ThreadPoolExecutor(
+            max_workers=LOOKUP_WORKERS, thread_name_prefix="lookup"
+        ) as lookup_pool:
+            for full_filename_path, filename in itertools.islice(
+                rom_files, PIPELINE_DEPTH
+            ):
+                identifying.append(
+                    identify_pool.submit(
+                        self.identify_rom, full_filename_path, filename
+                    )
+                )
+
+            while len(identifying) > 0:
+                rom = identifying.popleft().result()
+                next_rom_file = next(rom_files, None)
+                if next_rom_file is not None:
+                    identifying.append(
+                        identify_pool.submit(self.identify_rom, *next_rom_file)
+                    )
+                if rom is None:
+                    continue
+
+                rom = self.lookup_local_rom(rom)
+                if rom["game_db"] is None:
+                    print("\tUnable to find game ")
+                    continue
+
+                # Start the web lookups and move on to the next ROM. ROMs whose web
+                # lookups are back get their downloads started, only waiting on them
+                # when too many are outstanding.
+                looking_up.append(
+                    (rom, lookup_pool.submit(self.lookup_remote_rom, rom))
+                )
+                while len(looking_up) > 0 and (
+                    len(looking_up) > PIPELINE_DEPTH or looking_up[0][1].done()
+                ):
+                    downloading.append(
+                        self._download_pipelined_rom(*looking_up.popleft())
+                    )
+                    if len(downloading) > PIPELINE_DEPTH:
+                        self._finish_pipelined_rom(*downloading.popleft())
+
+            while len(looking_up) > 0:
+                downloading.append(self._download_pipelined_rom(*looking_up.popleft()))
+                if len(downloading) > PIPELINE_DEPTH:
+                    self._finish_pipelined_rom(*downloading.popleft())
+
+        while len(downloading) > 0:
+            self._finish_pipelined_rom(*downloading.popleft())
+        return
 
+    def _download_pipelined_rom(self, rom: dict[str, Any], remote_lookup: Future):
+        # Once the web lookups are back, start the ROM's artwork downloads
+        artwork_downloader = get_artwork_downloader()
+        steam_grid_artwork_jobs = remote_lookup.result()
+        artwork = []
+        for filename_links, jobs in self.get_artwork_jobs(rom, steam_grid_artwork_jobs):
+            futures = artwork_downloader.submit(jobs)
+            artwork.append((filename_links, jobs, futures))
+        return rom, artwork
+
+    def _finish_pipelined_rom(self, rom: dict[str, Any], artwork: list) -> None:
+        # Wait on the ROM's artwork downloads, then add its pegasus entry
+        artwork_downloader = get_artwork_downloader()
+        artwork_assets = [
+            artwork_downloader.collect(filename_links, jobs, futures)
+            for filename_links, jobs, futures in artwork
+        ]
+        self.finish_rom(rom, artwork_assets)
         return
 
-    def process_rom(self, full_filename_path: str, filename: str) -> None:
+    def process_rom(self, full_filename_path: str, filename: str) -> Union[str, None]:
+        # The ROM's pegasus entry, None if it doesn't get one
+        rom = self.identify_rom(full_filename_path, filename)
+        if rom is None:
+            return None
+
+        rom = self.lookup_local_rom(rom)
+        if rom["game_db"] is None:
+            print("\tUnable to find game ")
+            return None
+        steam_grid_artwork_jobs = self.lookup_remote_rom(rom)
+
+        # Download images
+        artwork_downloader = get_artwork_downloader()
+        artwork_assets = [
+            artwork_downloader.download_links(filename_links, jobs)
+            for filename_links, jobs in self.get_artwork_jobs(
+                rom, steam_grid_artwork_jobs
+            )
+        ]
+        return self.finish_rom(rom, artwork_assets)
+
+    def has_valid_extension(self, filename: str) -> bool:
+        # Some game emulators use folders instead of files
+        if self.platform in USES_FOLDERS:
+            return True
+        return Path(filename).suffix.replace(".", "") in VALID_EXTENSIONS
+
+    def identify_rom(
+        self, full_filename_path: str, filename: str
+    ) -> Union[dict[str, Any], None]:
+        # Work out the game from the file itself (hashing it if needed). Only touches
+        # the sqlite DBs that are safe to use from a worker thread (the No-Intro hash
+        # index and the ROM fingerprint cache), never the game DBs.
         game_name_clean = None
         game_title = None
 
-        # Some game emulators use folders instead of files
-        if self.platform not in USES_FOLDERS:
-            # If the file doesn't have a valid extension skip it
-            if Path(filename).suffix.replace(".", "") not in VALID_EXTENSIONS:
-                return
+        # If the file doesn't have a valid extension skip it
+        if not self.has_valid_extension(filename):
+            return None
 
         if NoIntroDb.platform_available(self.platform):
-            rom_file_name = full_filename_path
-            # Check if it's a zip file
-            if zipfile.is_zipfile(full_filename_path):
-                temp_rom_file = tempfile.mktemp()
-                with zipfile.ZipFile(full_filename_path, "r") as zip_ref:
-                    # Can only process if it's one ROM per file
-                    if len(zip_ref.filelist) == 1:
-                        rom_file_name = zip_ref.extract(
-                            member=zip_ref.filelist[0], path=temp_rom_file
-                        )
-                    else:
-                        return
-
-            game_no_intro = self.no_intro_db.get_game_info_from_filename(rom_file_name)
+            # Zip files get identified straight from the archive
+            game_no_intro = self.no_intro_db.get_game_info_from_filename(
+                full_filename_path
+            )
+            if game_no_intro is None:
+                # Maybe it's in the wrong folder, try every other DAT
+                game_no_intro = self.identify_misfiled_rom(full_filename_path)
             game_name_clean = NoIntroDb.get_regular_name_from_no_intro(game_no_intro)
 
         elif self.platform in USES_SCHUMMVM:
@@ -235,7 +412,7 @@ class RomProcessor:
             )
             # If we don't have a clean name for it, skip the game
             if game_name_clean is None:
-                return
+                return None
 
         if game_name_clean is None:
             game_no_intro = {}
@@ -243,24 +420,82 @@ class RomProcessor:
                 {"@name": Path(filename).stem}
             )
 
-        print(f"{game_name_clean}\t|\t{game_title}")
+        return {
+            "full_filename_path": full_filename_path,
+            "filename": filename,
+            "game_name_clean": game_name_clean,
+            "game_title": game_title,
+            "game_no_intro": game_no_intro,
+        }
+
+    def identify_misfiled_rom(
+        self, full_filename_path: str
+    ) -> Union[dict[str, Any], None]:
+        match = get_no_intro_hash_index().identify_file(
+            full_filename_path, platform=self.platform
+        )
+        if match is None:
+            return None
+        print(
+            f"\t{Path(full_filename_path).name} found in the "
+            f"{', '.join(match['platforms'])} DAT: {match['game_name']}"
+        )
+        return {"@name": match["game_name"]}
+
+    def lookup_local_rom(self, rom: dict[str, Any]) -> dict[str, Any]:
+        # The lookups in the local sqlite DBs, these have to run on the main thread
+        game_name_clean = rom["game_name_clean"]
+        print(f"{game_name_clean}\t|\t{rom['game_title']}")
 
         # Get Games DB entry
         game_db = self.the_game_db.get_games_db_from_game_name(game_name_clean)
         if game_db is not None:
             print(f'\tBest Match: {game_db["game_title"]}')
+        rom["game_db"] = game_db
+
+        # Get launch box DB game_id
+        rom["launch_box_game"] = self.launch_box_db.get_game_by_name(game_name_clean)
+        return rom
+
+    def lookup_remote_rom(self, rom: dict[str, Any]) -> tuple[dict, list]:
+        # The web lookups (IGDB, SteamGridDB), safe to run on a worker thread. Fills
+        # in the ROM's IGDB game and SteamGridDB id and returns the SteamGridDB
+        # artwork to download.
+        game_name_clean = rom["game_name_clean"]
 
         # Get Internet Game Database ID
-        internet_game_db = self.internet_game_db.get_game_from_game_name(
+        rom["internet_game_db"] = self.internet_game_db.get_game_from_game_name(
             game_name=game_name_clean,
         )
 
         # Get Steam Grid DB ID
-        steam_grid_id = self.steam_grid_db.get_game_id_by_name(game_name_clean)
+        rom["steam_grid_id"] = self.steam_grid_db.get_game_id_by_name(game_name_clean)
+        return self.steam_grid_db.get_artwork_jobs(
+            game_id=rom["steam_grid_id"],
+            art_path_root=ARTWORK_FOLDER_PATH,
+        )
 
-        # Get launch box DB game_id
-        launch_box_game = self.launch_box_db.get_game_by_name(game_name_clean)
+    def get_artwork_jobs(
+        self, rom: dict[str, Any], steam_grid_artwork_jobs: tuple[dict, list]
+    ) -> list[tuple[dict, list]]:
+        # Work out what to download from every DB (the sqlite ones run on the main
+        # thread, the downloads themselves don't have to)
+        return [
+            self.the_game_db.get_artwork_jobs(
+                game_db=rom["game_db"], art_path_root=ARTWORK_FOLDER_PATH
+            ),
+            steam_grid_artwork_jobs,
+            # launchbox
+            self.launch_box_db.get_artwork_jobs(
+                launchbox_game=rom["launch_box_game"],
+                filename=rom["filename"],
+                art_path_root=ARTWORK_FOLDER_PATH,
+            ),
+        ]
 
+    def finish_rom(
+        self, rom: dict[str, Any], artwork_assets: list[dict]
+    ) -> Union[str, None]:
         assets = {
             "banner": [],
             "boxart_back": [],
@@ -281,69 +516,241 @@ class RomProcessor:
         }
 
         # Get locals assets
-        filename_no_ext = Path(filename).stem
+        filename_no_ext = Path(rom["filename"]).stem
         local_assets = self.local_files.get_assets_from_game_name(filename_no_ext)
 
-        # Download images
-        if game_db is not None:
-            game_db_assets = self.the_game_db.download_all_art(
-                game_db=game_db, art_path_root=ARTWORK_FOLDER_PATH
-            )
-
-            steam_grid_assets = self.steam_grid_db.download_all_art(
-                game_id=steam_grid_id,
-                art_path_root=ARTWORK_FOLDER_PATH,
-            )
-
-            # launchbox
-            launchbox_assets = self.launch_box_db.download_all_art(
-                launchbox_game=launch_box_game,
-                filename=filename,
-                art_path_root=ARTWORK_FOLDER_PATH,
-            )
+        all_assets = dict_merge(assets, local_assets, *artwork_assets)
+
+        # create xml string from game_db
+        return self.pegasus_text_builder.add_entry(
+            filename=rom["filename"],
+            game_db=rom["game_db"],
+            internet_game_db=rom["internet_game_db"],
+            no_intro=rom["game_no_intro"],
+            images=all_assets,
+            game_title=rom["game_title"],
+            full_filename_path=rom["full_filename_path"],
+        )
 
-            all_assets = dict_merge(
-                assets,
-                local_assets,
-                game_db_assets,
-                steam_grid_assets,
-                launchbox_assets,
-            )
-
-            # create xml string from game_db
-            self.pegasus_text_builder.add_entry(
-                filename=filename,
-                game_db=game_db,
-                internet_game_db=internet_game_db,
-                no_intro=game_no_intro,
-                images=all_assets,
-                game_title=game_title,
-                full_filename_path=full_filename_path,
-            )
-        else:
-            print("\tUnable to find game ")
+    def get_pegasus_file_path(self) -> str:
+        return f"{self.rom_folder_path}metadata.pegasus.txt"
 
     def write_pegasus_file(self):
-        with open(f"{self.rom_folder_path}metadata.pegasus.txt", "w") as output:
+        with open(self.get_pegasus_file_path(), "w") as output:
             output.write(self.pegasus_text_builder.text)
         return
 
+    def patch_pegasus_file(self, dat_diff: dict[str, list[dict]]) -> int:
+        # Only re-identify the ROMs that are in the DAT diff and replace just their
+        # entries in the existing pegasus file, returns how many ROMs that was
+        affected = get_affected_rom_crcs(dat_diff)
+        with open(self.get_pegasus_file_path()) as pegasus_file:
+            header, entries = split_pegasus_text(pegasus_file.read())
+        file_entries = {}
+        for entry in entries:
+            file_entries[get_entry_filename(entry)] = entry
+
+        affected_roms = 0
+        rom_files = self.get_rom_files()
+        for full_filename_path, filename in rom_files:
+            if not self.has_valid_extension(filename):
+                continue
+            if not any(
+                is_affected_rom(affected, crc, size)
+                for crc, size in self.no_intro_db.get_rom_crcs(
+                    full_filename_path, set(affected.keys())
+                )
+            ):
+                continue
+
+            affected_roms += 1
+            entry = self.process_rom(full_filename_path, filename)
+            if entry is None:
+                file_entries.pop(filename, None)
+            else:
+                file_entries[filename] = entry
+
+        # Same order as a full run writes them, entries for files that aren't there
+        # anymore are left alone at the end
+        text = header
+        for _, filename in rom_files:
+            text += file_entries.pop(filename, "")
+        text += "".join(file_entries.values())
+        with open(self.get_pegasus_file_path(), "w") as output:
+            output.write(text)
+        return affected_roms
+
+
+def process_platform(
+    platform: str,
+    rom_folder: str,
+    hash_workers: int = HASH_WORKERS,
+    old_no_intro_root: Union[str, None] = None,
+) -> dict[str, Any]:
+    print(80 * "-")
+    print(f"Processing: {platform}")
+    print(80 * "-")
+
+    timings = {"platform": platform}
+    start_time = time.perf_counter()
+    rom_processor = RomProcessor(
+        platform=platform,
+        rom_folder=rom_folder,
+        hash_workers=hash_workers,
+    )
+    timings["setup"] = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    dat_diff = get_platform_dat_diff(rom_processor, old_no_intro_root)
+    if dat_diff is not None:
+        timings["roms"] = rom_processor.patch_pegasus_file(dat_diff)
+        timings["processing"] = time.perf_counter() - start_time
+        return timings
+
+    timings["roms"] = len(rom_processor.get_rom_files())
+    rom_processor.process_roms(pipeline=True)
+    rom_processor.write_pegasus_file()
+    timings["processing"] = time.perf_counter() - start_time
+    return timings
+
+
+def get_platform_dat_diff(
+    rom_processor: RomProcessor, old_no_intro_root: Union[str, None]
+) -> Union[dict[str, list[dict]], None]:
+    # The changes since the platform's DAT in the old No-Intro pack, None when the
+    # platform has to be processed in full instead
+    if old_no_intro_root is None or not NoIntroDb.platform_available(
+        rom_processor.platform
+    ):
+        return None
+    if not os.path.isfile(rom_processor.get_pegasus_file_path()):
+        return None
+
+    new_dat_file = PLATFORM_LOOKUP[rom_processor.platform]
+    old_dat_file = find_previous_dat_file(new_dat_file, old_no_intro_root)
+    if old_dat_file is None:
+        print(f"No previous DAT for {rom_processor.platform}, processing everything")
+        return None
+
+    dat_diff = diff_dat_files(old_dat_file, new_dat_file)
+    print(
+        f"DAT diff: {len(dat_diff['added']):,} added, "
+        f"{len(dat_diff['removed']):,} removed, "
+        f"{len(dat_diff['renamed']):,} renamed"
+    )
+    return dat_diff
+
+
+def print_timing_summary(all_timings: list[dict[str, Any]], elapsed: float) -> None:
+    print(80 * "-")
+    print(
+        f"{'Platform':<20}{'ROMs':>8}{'Setup (s)':>14}{'ROMs (s)':>14}{'Total (s)':>14}"
+    )
+    for timings in sorted(all_timings, key=lambda timings: timings["platform"]):
+        if "error" in timings:
+            print(f"{timings['platform']:<20}  failed: {timings['error']}")
+            continue
+        total = timings["setup"] + timings["processing"]
+        print(
+            f"{timings['platform']:<20}{timings['roms']:>8,}"
+            f"{timings['setup']:>14,.1f}{timings['processing']:>14,.1f}{total:>14,.1f}"
+        )
+    print(f"Wall time: {elapsed:,.1f}s")
+    print(80 * "-")
+    return
 
-def main():
-    for platform in ROM_FOLDER_PATHS.keys():
-        print(80 * "-")
-        print(f"Processing: {platform}")
-        print(80 * "-")
-        rom_folder = ROM_FOLDER_PATHS[platform]
-
-        if os.path.exists(rom_folder):
-            rom_processor = RomProcessor(
-                platform=platform,
-                rom_folder=rom_folder,
-            )
-            rom_processor.process_roms()
-            rom_processor.write_pegasus_file()
 
+def main():
+    parser = argparse.ArgumentParser(description="Create the pegasus metadata files")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of platforms to process at the same time",
+    )
+    parser.add_argument(
+        "--hash-workers",
+        type=int,
+        default=None,
+        help="Number of processes hashing ROMs, per platform (default: split the "
+        "CPUs between the platform workers)",
+    )
+    parser.add_argument(
+        "--dat-diff",
+        metavar="OLD_NO_INTRO_ROOT",
+        default=None,
+        help="Only re-identify the ROMs whose entries changed since this (older) "
+        "No-Intro pack and patch their entries in the existing pegasus files",
+    )
+    parser.add_argument(
+        "--refresh-launchbox",
+        action="store_true",
+        help="Check for a new LaunchBox Metadata.zip and apply only what changed "
+        "to the local DB",
+    )
+    args = parser.parse_args()
+    hash_workers = args.hash_workers
+    if hash_workers is None:
+        hash_workers = max(1, HASH_WORKERS // max(1, args.workers))
+
+    platforms = [
+        platform
+        for platform, rom_folder in ROM_FOLDER_PATHS.items()
+        if os.path.exists(rom_folder)
+    ]
+    start_time = time.perf_counter()
+
+    # Download and load the LaunchBox metadata once, up front, instead of having
+    # every worker race to build the same DB
+    launch_box_db = LaunchBoxDB(platform=None, refresh_metadata=args.refresh_launchbox)
+    del launch_box_db
+
+    # And the title keys and title search in TheGamesDB
+    the_games_db_engine = sqlite3.connect(TGDB_DB_FILE)
+    update_title_indexes(the_games_db_engine)
+    the_games_db_engine.close()
+
+    # Same for the hash index over all the No-Intro DATs
+    no_intro_hash_index = NoIntroHashIndex()
+    no_intro_hash_index.update()
+    del no_intro_hash_index
+
+    all_timings = []
+    if args.workers <= 1:
+        for platform in platforms:
+            try:
+                all_timings.append(
+                    process_platform(
+                        platform,
+                        ROM_FOLDER_PATHS[platform],
+                        hash_workers,
+                        args.dat_diff,
+                    )
+                )
+            except Exception as error:
+                print(f"Failed processing {platform}: {error}")
+                all_timings.append({"platform": platform, "error": str(error)})
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            futures = {
+                executor.submit(
+                    process_platform,
+                    platform,
+                    ROM_FOLDER_PATHS[platform],
+                    hash_workers,
+                    args.dat_diff,
+                ): platform
+                for platform in platforms
+            }
+            for future in as_completed(futures):
+                platform = futures[future]
+                try:
+                    all_timings.append(future.result())
+                except Exception as error:
+                    print(f"Failed processing {platform}: {error}")
+                    all_timings.append({"platform": platform, "error": str(error)})
+
+    print_timing_summary(all_timings, time.perf_counter() - start_time)
     return
 
 
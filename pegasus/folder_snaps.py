@@ -2,7 +2,7 @@ import os
 import re
 from pathlib import Path
 
-from fuzzywuzzy import fuzz
+from game_db.title_matcher import TitleMatcher
 
 COMMON_REGEX_REPLACEMENT = r"\(.* ?\)"
 
@@ -31,10 +31,12 @@ class FolderSnaps:
 
         self.snaps_lookup = snaps_lookup
         self.snaps_lookup_2 = snaps_lookup_2
+        self.snaps_names = list(snaps_lookup.keys())
+        self.snaps_names_2 = list(snaps_lookup_2.keys())
+        self.snaps_matcher = TitleMatcher(self.snaps_names, threshold=90)
+        self.snaps_matcher_2 = TitleMatcher(self.snaps_names_2, threshold=90)
 
     def get_full_filename_path_from_game_name(self, game_name):
-        best_fuzz_score = 0
-        best_fuzz_location = None
         best_match = None
 
         # Check if the key exists for a fast exit
@@ -43,15 +45,16 @@ class FolderSnaps:
 
         game_name_no_extras = re.sub(COMMON_REGEX_REPLACEMENT, "", game_name).strip()
 
-        # Loop through every game in the DB and see which one is the best
-        for curr_game_name, all_games in zip(
-            [game_name, game_name_no_extras], [self.snaps_lookup, self.snaps_lookup_2]
+        # Score every snap at once and see which one is the best
+        for curr_game_name, all_games, all_game_names, title_matcher in zip(
+            [game_name, game_name_no_extras],
+            [self.snaps_lookup, self.snaps_lookup_2],
+            [self.snaps_names, self.snaps_names_2],
+            [self.snaps_matcher, self.snaps_matcher_2],
         ):
-            for key, game in all_games.items():
-                fuzz_score = fuzz.ratio(curr_game_name, key)
-                if fuzz_score > 90 and fuzz_score > best_fuzz_score:
-                    best_fuzz_score = fuzz_score
-                    best_fuzz_location = key
+            best_fuzz_location = title_matcher.best_match_value(
+                curr_game_name, all_game_names
+            )
 
             if best_fuzz_location is not None:
                 best_match = all_games.get(best_fuzz_location)
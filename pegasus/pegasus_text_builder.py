@@ -1,5 +1,6 @@
 import os
 import re
+from typing import Union
 
 from game_db.the_games_db_base import TheGamesDbBase
 
@@ -32,6 +33,10 @@ TYPE_EXPRESSION = (
 )
 ALLOWED_TYPES = ["ARCADE", "REV", "UNL"]  # , "BETA", "PROTO"
 
+# Every game entry starts with this, after the collection header
+ENTRY_SEPARATOR = "\n\ngame: "
+REG_EX_ENTRY_FILE = re.compile(r"^file: (.*)$", re.MULTILINE)
+
 START_OF_TEXT = {
     "3do": """
 collection: Panasonic 3DO
@@ -318,6 +323,20 @@ command: /bin/rom_launcher.sh xbox "{file.path}"
 }
 
 
+def split_pegasus_text(text: str) -> tuple[str, list[str]]:
+    # The collection header and the game entries (each one starting with
+    # ENTRY_SEPARATOR) of a pegasus metadata file
+    header, *entries = text.split(ENTRY_SEPARATOR)
+    return header, [f"{ENTRY_SEPARATOR}{entry}" for entry in entries]
+
+
+def get_entry_filename(entry: str) -> Union[str, None]:
+    file_match = REG_EX_ENTRY_FILE.search(entry)
+    if file_match is None:
+        return None
+    return file_match.group(1)
+
+
 class PegasusTextBuilder:
     def __init__(self, the_games_db: TheGamesDbBase, platform: str) -> None:
         self.the_games_db = the_games_db
@@ -381,12 +400,13 @@ class PegasusTextBuilder:
         if region is None:
             region = self.region_from_game_name(no_intro.get("@name"))
 
-        developers = self.the_games_db.get_developers_by_game_id(game_db["id"])
+        relations = self.the_games_db.get_game_relations(game_db["id"])
+        developers = relations["developers"]
         developers = "\n  ".join([i["developer_name"] for i in developers.values()])
-        publishers = self.the_games_db.get_publishers_by_game_id(game_db["id"])
+        publishers = relations["publishers"]
         publishers = "\n  ".join([i["publisher_name"] for i in publishers.values()])
 
-        genre = self.the_games_db.get_genres_by_game_id(game_db["id"])
+        genre = relations["genres"]
         genre = "\n  ".join([i["genre"] for i in genre.values()])
 
         if game_title is None:
@@ -441,8 +461,7 @@ class PegasusTextBuilder:
                 return
 
         # The complete text
-        self.text += f"""\n
-game: {game_title}
+        entry = f"""{ENTRY_SEPARATOR}{game_title}
 sort-by: {game_title}
 file: {filename}
 description: {filename} {description}
@@ -468,4 +487,5 @@ assets.music: {music}
 assets.poster: {poster}
 
 """
-        return
+        self.text += entry
+        return entry
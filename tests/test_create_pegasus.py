@@ -0,0 +1,101 @@
+from pegasus import create_pegasus
+from pegasus.create_pegasus import RomProcessor
+
+
+class FakeArtworkDownloader:
+    def submit(self, jobs):
+        return [None for _ in jobs]
+
+    def collect(self, filename_links, jobs, futures):
+        for key, _, path in jobs:
+            filename_links[key].append(path)
+        return filename_links
+
+    def download_links(self, filename_links, jobs):
+        return self.collect(filename_links, jobs, self.submit(jobs))
+
+
+class FakeRomProcessor(RomProcessor):
+    # Only the stages, none of the DBs
+    def __init__(self, rom_files):
+        self.platform = "snes"
+        self.hash_workers = 1
+        self.rom_files = rom_files
+        self.finished = []
+        return
+
+    def get_rom_files(self):
+        return self.rom_files
+
+    def identify_rom(self, full_filename_path, filename):
+        if filename.startswith("unknown"):
+            return None
+        return {"filename": filename, "game_name_clean": filename.split(".")[0]}
+
+    def lookup_local_rom(self, rom):
+        if rom["game_name_clean"] == "missing":
+            rom["game_db"] = None
+        else:
+            rom["game_db"] = {"game_title": rom["game_name_clean"]}
+        rom["launch_box_game"] = None
+        return rom
+
+    def lookup_remote_rom(self, rom):
+        rom["internet_game_db"] = None
+        rom["steam_grid_id"] = None
+        return (
+            {"fanart": []},
+            [("fanart", "https://example.com/", f"{rom['game_name_clean']}.png")],
+        )
+
+    def get_artwork_jobs(self, rom, steam_grid_artwork_jobs):
+        return [
+            ({"boxart_front": []}, [("boxart_front", "", f"{rom['filename']}.jpg")]),
+            steam_grid_artwork_jobs,
+        ]
+
+    def finish_rom(self, rom, artwork_assets):
+        self.finished.append((rom["filename"], artwork_assets))
+        return rom["filename"]
+
+
+def get_rom_files(count):
+    rom_files = []
+    for i in range(count):
+        for name in (f"game{i:03}.sfc", f"missing.{i:03}.sfc", f"unknown{i:03}.sfc"):
+            rom_files.append((f"/ROMs/snes/{name}", name))
+    return rom_files
+
+
+def test_pipelined_matches_serial(monkeypatch):
+    monkeypatch.setattr(
+        create_pegasus, "get_artwork_downloader", lambda: FakeArtworkDownloader()
+    )
+
+    # Enough ROMs to fill every stage of the pipeline
+    rom_files = get_rom_files(create_pegasus.PIPELINE_DEPTH * 3)
+    serial = FakeRomProcessor(rom_files)
+    serial.process_roms(pipeline=False)
+    pipelined = FakeRomProcessor(rom_files)
+    pipelined.process_roms(pipeline=True)
+
+    assert len(serial.finished) == create_pegasus.PIPELINE_DEPTH * 3
+    assert pipelined.finished == serial.finished
+    assert pipelined.finished[0] == (
+        "game000.sfc",
+        [
+            {"boxart_front": ["game000.sfc.jpg"]},
+            {"fanart": ["game000.png"]},
+        ],
+    )
+
+
+def test_pipelined_single_rom(monkeypatch):
+    monkeypatch.setattr(
+        create_pegasus, "get_artwork_downloader", lambda: FakeArtworkDownloader()
+    )
+
+    processor = FakeRomProcessor([("/ROMs/snes/game.sfc", "game.sfc")])
+    processor.process_roms(pipeline=True)
+
+    assert [filename for filename, _ in processor.finished] == ["game.sfc"]
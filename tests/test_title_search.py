@@ -0,0 +1,141 @@
+import random
+import sqlite3
+
+from game_db.title_matcher import TitleMatcher
+from game_db.title_search import create_title_search, get_title_search_candidates
+
+WORDS = (
+    "super mario world zelda link awakening sonic hedgehog street fighter mega man "
+    "metroid castlevania final fantasy dragon quest warrior kirby dream land donkey "
+    "kong country racing soccer baseball tennis golf ninja turtles adventure island "
+    "contra double pac galaga tetris puzzle bomberman star fox wars legend battle "
+    "hero knight space invaders night city crystal"
+).split()
+PLATFORMS = 10
+PLATFORM_ID = 3
+NUMBER_OF_LOOKUPS = 500
+
+
+def make_title(rng):
+    title = " ".join(rng.choice(WORDS).title() for _ in range(rng.randint(1, 4)))
+    kind = rng.random()
+    if kind < 0.2:
+        title += f" {rng.randint(2, 5)}"
+    elif kind < 0.35:
+        title += ": " + " ".join(
+            rng.choice(WORDS).title() for _ in range(rng.randint(1, 3))
+        )
+    return title
+
+
+def make_db(rng, number_of_titles):
+    engine = sqlite3.connect(":memory:")
+    cursor = engine.cursor()
+    cursor.execute(
+        "CREATE TABLE games (id INTEGER PRIMARY KEY, game_title TEXT, platform INT)"
+    )
+    cursor.executemany(
+        "INSERT INTO games VALUES (?, ?, ?)",
+        [
+            (game_id, make_title(rng), rng.randrange(PLATFORMS))
+            for game_id in range(1, number_of_titles + 1)
+        ],
+    )
+    create_title_search(
+        cursor, "games_title_fts", "games", "game_title", "id", "platform"
+    )
+    return cursor
+
+
+def get_platform_games(cursor, platform_id):
+    cursor.execute(
+        "SELECT id, game_title FROM games WHERE platform = ? ORDER BY id",
+        (platform_id,),
+    )
+    rows = cursor.fetchall()
+    return [row[0] for row in rows], [row[1] for row in rows]
+
+
+def make_query(rng, titles):
+    # Exact titles, titles with a letter missing, with a region and made up ones
+    title = rng.choice(titles)
+    kind = rng.randrange(4)
+    if kind == 0:
+        return title
+    if kind == 1 and len(title) > 1:
+        position = rng.randrange(len(title))
+        next_position = position + 1
+        return title[:position] + title[next_position:]
+    if kind == 2:
+        return f"{title} (USA)"
+    return make_title(rng)
+
+
+def test_candidates_only_come_from_the_platform():
+    rng = random.Random(0)
+    cursor = make_db(rng, 5000)
+    game_ids, titles = get_platform_games(cursor, PLATFORM_ID)
+
+    for _ in range(50):
+        candidates = get_title_search_candidates(
+            cursor, "games_title_fts", rng.choice(titles), PLATFORM_ID
+        )
+        assert len(candidates) > 0
+        assert set(candidates) <= set(game_ids)
+
+
+def test_old_title_search_gets_replaced():
+    cursor = sqlite3.connect(":memory:").cursor()
+    cursor.execute(
+        "CREATE TABLE games (id INTEGER PRIMARY KEY, game_title TEXT, platform INT)"
+    )
+    cursor.execute("INSERT INTO games VALUES (1, 'Super Mario World', 7)")
+    cursor.execute(
+        """
+        CREATE VIRTUAL TABLE games_title_fts USING fts5(
+            game_title, content='games', content_rowid='id', tokenize='trigram'
+        )
+        """
+    )
+
+    assert create_title_search(
+        cursor, "games_title_fts", "games", "game_title", "id", "platform"
+    )
+    assert get_title_search_candidates(cursor, "games_title_fts", "Mario", 7) == [1]
+    assert get_title_search_candidates(cursor, "games_title_fts", "Mario", 8) == []
+
+
+def test_matches_brute_force_on_sample():
+    # Scoring only the full text search's top candidates against scoring every title
+    # on the platform. The accepted difference: names sharing no trigram with their
+    # best title (a short name with a typo, "Wold" for "World") and best titles that
+    # don't make the top TRIGRAM_CANDIDATES on a crowded platform. Both come out
+    # as no match rather than a different game, for about 1% of lookups.
+    rng = random.Random(1)
+    cursor = make_db(rng, 50000)
+    game_ids, titles = get_platform_games(cursor, PLATFORM_ID)
+    id_positions = {game_id: position for position, game_id in enumerate(game_ids)}
+    title_matcher = TitleMatcher(titles, threshold=80)
+
+    differences = []
+    for _ in range(NUMBER_OF_LOOKUPS):
+        query = make_query(rng, titles)
+        brute_force = title_matcher.best_match(query)
+        candidates = get_title_search_candidates(
+            cursor, "games_title_fts", query, PLATFORM_ID
+        )
+        if candidates is None:
+            # Too short to search for, the DBs score every title for these
+            continue
+        searched = title_matcher.best_match(
+            query, sorted(id_positions[game_id] for game_id in candidates)
+        )
+        if searched != brute_force:
+            differences.append((query, brute_force, searched))
+
+        # An exact title is always found
+        if query in titles:
+            assert searched == brute_force
+
+    assert all(searched is None for _, _, searched in differences), differences
+    assert len(differences) <= NUMBER_OF_LOOKUPS // 50, differences
@@ -0,0 +1,103 @@
+import os
+import re
+import sys
+import time
+
+from game_db.no_intro_db import (
+    PLATFORM_LOOKUP,
+    REG_EX_COUNTRIES,
+    REG_EX_DATE,
+    REG_EX_EXTRAS,
+    REG_EX_LANG,
+    REG_EX_PS3,
+    REG_EX_SWITCH_GAME_ID,
+    REG_EX_SWITCH_GAME_SIZE,
+    REG_EX_SWITCH_GAME_VER,
+    REG_EX_SWITCH_REGION,
+    REG_EX_VERSION,
+    REG_EX_WII_U_ID,
+    clean_no_intro_name,
+)
+from game_db.no_intro_hash_index import iter_dat_roms
+
+# Compares clean_no_intro_name against the original name cleaning on every name in
+# the No-Intro DATs (all of them by default). Run from the repository root:
+#   python -m tools.benchmark_name_cleaner [platform ...]
+
+
+def legacy_clean_name(game_name):
+    # The original get_regular_name_from_no_intro
+    all_reg_ex = [
+        REG_EX_COUNTRIES,
+        REG_EX_LANG,
+        REG_EX_DATE,
+        REG_EX_EXTRAS,
+        REG_EX_PS3,
+        REG_EX_SWITCH_GAME_ID,
+        REG_EX_SWITCH_GAME_VER,
+        REG_EX_SWITCH_GAME_SIZE,
+        REG_EX_SWITCH_REGION,
+        REG_EX_WII_U_ID,
+        REG_EX_VERSION,
+    ]
+
+    for replacement in all_reg_ex:
+        game_name = re.sub(replacement, "", game_name)
+    if ", The" in game_name:
+        game_name = "The " + game_name.replace(", The", "")
+    return game_name
+
+
+def get_dat_names(platforms):
+    # Names of every game and rom in the DATs (each DAT only once)
+    names = []
+    loaded_dats = set()
+    for platform in platforms:
+        dat_file = PLATFORM_LOOKUP[platform]
+        if dat_file in loaded_dats or not os.path.isfile(dat_file):
+            continue
+        loaded_dats.add(dat_file)
+
+        for game_name, rom in iter_dat_roms(dat_file):
+            names.append(game_name)
+            names.append(os.path.splitext(rom["name"])[0])
+    return names
+
+
+def time_names_per_sec(clean_name, names):
+    start_time = time.perf_counter()
+    results = [clean_name(name) for name in names]
+    elapsed = time.perf_counter() - start_time
+    return results, len(names) / elapsed
+
+
+def main():
+    platforms = sys.argv[1:] if len(sys.argv) > 1 else list(PLATFORM_LOOKUP.keys())
+    names = get_dat_names(platforms)
+    print(f"{len(names):,} names ({len(set(names)):,} unique)")
+    if len(names) == 0:
+        return
+
+    legacy_results, legacy_rate = time_names_per_sec(legacy_clean_name, names)
+
+    clean_no_intro_name.cache_clear()
+    cold_results, cold_rate = time_names_per_sec(clean_no_intro_name, names)
+    warm_results, warm_rate = time_names_per_sec(clean_no_intro_name, names)
+
+    mismatches = 0
+    for name, legacy_result, cold_result, warm_result in zip(
+        names, legacy_results, cold_results, warm_results
+    ):
+        if not legacy_result == cold_result == warm_result:
+            mismatches += 1
+            print(f"\tMismatch: {name}")
+
+    print(f"Legacy:           {legacy_rate:,.0f} names/sec")
+    print(f"Compiled (cold):  {cold_rate:,.0f} names/sec")
+    print(f"Compiled (warm):  {warm_rate:,.0f} names/sec")
+    print(f"Mismatches:       {mismatches}")
+    return
+
+
+if __name__ == "__main__":
+    sys.exit(main())
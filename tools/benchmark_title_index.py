@@ -0,0 +1,135 @@
+import collections
+import random
+import sys
+import time
+
+from fuzzywuzzy import fuzz
+
+from game_db.launchbox_db import LaunchBoxDB
+from game_db.title_search import get_trigram_match_query
+
+# Benchmarks LaunchBox title lookups against the old linear scan over every title on
+# the platform. Run from the repository root:
+#   python -m tools.benchmark_title_index arcade
+#
+# Two things get measured:
+#   - TitleIndex on its own, at LaunchBox's threshold of 80. It has to pick exactly
+#     what the linear scan picks, the script exits with 1 when it doesn't.
+#   - LaunchBoxDB.get_game_by_name, which tries the title key first, then scores the
+#     full text search's top candidates and only uses TitleIndex for names too short
+#     to search for. The title keys and the candidate cutoff can pick a different
+#     game than the linear scan, so those differences are only reported.
+PLATFORM = "arcade"
+NUMBER_OF_LOOKUPS = 500
+THRESHOLD = 80
+
+
+def linear_scan(titles, game_name):
+    # The original get_game_by_name, returning the position of the title
+    game_name = game_name.strip()
+    best_fuzz_score = 0
+    best_position = None
+
+    for position, db_game_name in enumerate(titles):
+        fuzz_score = fuzz.ratio(game_name, db_game_name)
+        if fuzz_score > THRESHOLD and fuzz_score > best_fuzz_score:
+            best_fuzz_score = fuzz_score
+            best_position = position
+        if best_fuzz_score == 100:
+            break
+    return best_position
+
+
+def get_lookup_stage(launch_box_db, game_name):
+    # Which stage of get_game_by_name answers this name
+    game_name = game_name.strip()
+    if launch_box_db._get_game_id_by_title_key(game_name) is not None:
+        return "Title key"
+    if get_trigram_match_query(game_name) is not None:
+        return "Full text search"
+    return "TitleIndex"
+
+
+def generate_queries(titles, number_of_lookups):
+    # Mix of exact titles, slightly broken titles and titles that won't match
+    rng = random.Random(0)
+    queries = []
+    for _ in range(number_of_lookups):
+        title = rng.choice(titles)
+        kind = rng.randrange(4)
+        if kind == 0:
+            queries.append(title)
+        elif kind == 1 and len(title) > 1:
+            position = rng.randrange(len(title))
+            next_position = position + 1
+            queries.append(title[:position] + title[next_position:])
+        elif kind == 2:
+            queries.append(f"{title} (USA)")
+        else:
+            queries.append(f"{title[::-1]} II")
+    return queries
+
+
+def time_lookups(lookup, queries):
+    start_time = time.perf_counter()
+    results = [lookup(query) for query in queries]
+    elapsed = time.perf_counter() - start_time
+    return results, len(queries) / elapsed
+
+
+def main():
+    platform = sys.argv[1] if len(sys.argv) > 1 else PLATFORM
+    launch_box_db = LaunchBoxDB(platform)
+    title_index = launch_box_db.get_title_index()
+    titles = title_index.titles
+    queries = generate_queries(titles, NUMBER_OF_LOOKUPS)
+    print(f"{platform}: {len(titles):,} titles, {len(queries):,} lookups")
+
+    linear_results, linear_rate = time_lookups(
+        lambda query: linear_scan(titles, query), queries
+    )
+
+    # TitleIndex has to agree with the linear scan
+    index_results, index_rate = time_lookups(
+        lambda query: title_index.best_match(query.strip()), queries
+    )
+    index_mismatches = 0
+    for query, linear_result, index_result in zip(
+        queries, linear_results, index_results
+    ):
+        if linear_result != index_result:
+            index_mismatches += 1
+            print(f"\tTitleIndex mismatch: {query}")
+
+    # The whole lookup, split up by the stage that answered each name
+    lookup_results, lookup_rate = time_lookups(launch_box_db.get_game_by_name, queries)
+    stage_lookups = collections.Counter()
+    stage_differences = collections.Counter()
+    for query, linear_result, lookup_result in zip(
+        queries, linear_results, lookup_results
+    ):
+        stage = get_lookup_stage(launch_box_db, query)
+        stage_lookups[stage] += 1
+        linear_game_id = (
+            None
+            if linear_result is None
+            else int(launch_box_db.platform_game_ids[linear_result])
+        )
+        lookup_game_id = None if lookup_result is None else lookup_result["game_id"]
+        if linear_game_id != lookup_game_id:
+            stage_differences[stage] += 1
+
+    print(f"Linear scan:       {linear_rate:,.1f} lookups/sec")
+    print(f"TitleIndex:        {index_rate:,.1f} lookups/sec")
+    print(f"get_game_by_name:  {lookup_rate:,.1f} lookups/sec")
+    for stage in ["Title key", "Full text search", "TitleIndex"]:
+        print(
+            f"\t{stage + ':':<18}{stage_lookups[stage]:>6,} lookups, "
+            f"{stage_differences[stage]:,} differ from the linear scan"
+        )
+    print(f"TitleIndex mismatches: {index_mismatches}")
+    return 1 if index_mismatches > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,3 @@
-import hashlib
 import os
 import subprocess
 import sys
@@ -8,6 +7,8 @@ from pathlib import Path
 import pandas
 import xmltodict
 
+from game_db.rom_fingerprint_cache import get_rom_fingerprint_cache
+
 # https://myrient.erista.me/files/Redump/Sony%20-%20PlayStation%203/
 
 FOLDER = "/mnt/SnapArray02/Snap2_SSD_8TB_17/Consoles/Sony - Playstation 3/Games/S/"
@@ -24,19 +25,8 @@ PS3_dec_binary = "/home/mrsharky/dev/ps3/PS3Dec/build/Release/PS3Dec"
 
 
 def md5sum(filename):
-    md5 = hashlib.md5()
-    # chunk_size = 4096
-    # chunk_size = 65536
-    chunk_size = 1_048_576
-    with open(filename, "rb") as f:
-        for chunk in iter(lambda: f.read(chunk_size), b""):
-            md5.update(chunk)
-    return md5.hexdigest()
-
-
-def system_md5sum(filename):
-    result = subprocess.run(["md5sum", filename], capture_output=True, text=True)
-    return result.stdout.split()[0]
+    # Only reads the ISO if it's changed since the last time it got hashed
+    return get_rom_fingerprint_cache().hash_file(filename, report=True)["md5"]
 
 
 def generate_disc_keys_lookup():
@@ -161,7 +151,7 @@ def main():
         ):
             # Get the MD5
             print(f"Name invalid, calculating MD5: {filename}")
-            actual_md5 = system_md5sum(full_path_filename).upper().strip()
+            actual_md5 = md5sum(full_path_filename).upper().strip()
 
             # Check the MD5 is in our other lookup
             matched_md5 = md5_to_data.get(actual_md5)
@@ -206,7 +196,7 @@ def main():
         # Get the actual MD5 of the file
         if actual_md5 is None:
             print(f"Calculating MD5: {filename}")
-            actual_md5 = system_md5sum(full_path_filename).upper().strip()
+            actual_md5 = md5sum(full_path_filename).upper().strip()
 
         # If the md5s don't match, don't process this file
         if game_md5 != actual_md5: